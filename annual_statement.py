@@ -2,6 +2,7 @@ import pprint
 from shared_def import CRYPTOS, LOCALE_FIAT
 from portfolio import Portfolio
 from gain_loss import GainLoss
+from event_sink import NullSink
 
 pp = pprint.PrettyPrinter(indent=2, width=100, compact=True)
 
@@ -10,15 +11,19 @@ class AnnualStatement(dict):
   """ 
   Annual statement for a financial year, the end result for tax return of the year
   Contains portfolio at the end of the year, all gains and losses during the year
+  Gain/loss events are written to sink as they happen, and only added up
+  without being kept in gains/losses and transactions when not retain
   """
-  def __init__(self, financial_year, portfolio=None, losses=None):
+  def __init__(self, financial_year, portfolio=None, losses=None, sink=None, retain=True):
     super(AnnualStatement, self).__init__()
+    self.sink = sink if sink else NullSink()
+    self.retain = retain
     self.financial_year = financial_year
     self.portfolio = portfolio if portfolio else Portfolio()
     self.gains = []
     self.losses = []
     if losses:
-      self.losses.extend(losses)
+      self.add_losses(losses)
       self.previous_year_loss = losses[0]
     else:
       self.previous_year_loss = None
@@ -55,7 +60,11 @@ class AnnualStatement(dict):
 
   @gains.setter
   def gains(self, value):
-    self['gains'] = value
+    self['gains'] = []
+    self._gross_gains_sum = 0
+    self._discountable_gains_sum = 0
+    self._non_discountable_gains_sum = 0
+    self.add_gains(value)
 
   @property
   def losses(self):
@@ -63,37 +72,68 @@ class AnnualStatement(dict):
 
   @losses.setter
   def losses(self, value):
-    self['losses'] = value
+    self['losses'] = []
+    self._losses_sum = 0
+    self.add_losses(value)
+
+  def add_gains(self, gains):
+    """ append gains, keeping the running sums in the same order a sum() over the list would """
+    for item in gains:
+      self._add_gain(item)
+
+  def add_losses(self, losses):
+    """ append losses, keeping the running sum """
+    for item in losses:
+      self._add_loss(item)
+
+  def _add_gain(self, item):
+    if self.retain:
+      self['gains'].append(item)
+    self._gross_gains_sum += item.fiat
+    if item.discountable:
+      self._discountable_gains_sum += item.fiat
+    else:
+      self._non_discountable_gains_sum += item.fiat
+
+  def _add_loss(self, item):
+    if self.retain:
+      self['losses'].append(item)
+    self._losses_sum += item.fiat
+
+  def record_events(self, events, kind=None):
+    """
+    write gain/loss events to the sink in the order they happened, and add them up
+    as kind ('gain' or 'loss') when given, otherwise by the sign of each event
+    """
+    sink = self.sink
+    for item in events:
+      sink.write(item)
+      if kind == 'gain' or (kind is None and item.gain):
+        self._add_gain(item)
+      else:
+        self._add_loss(item)
 
   def process_transaction(self, tran):
-    self.transactions.append(tran)
+    if self.retain:
+      self.transactions.append(tran)
     if tran.operation in ['buy', 'sell']:
-      gains, losses = self.portfolio.process_buy_sell_transaction(tran)
-      if gains:
-        self.gains.extend(gains)
-      if losses:
-        self.losses.extend(losses)
+      self.record_events(self.portfolio.process_buy_sell_transaction(tran))
     elif tran.operation in ['deposit', 'withdrawal']:
-      gains, losses = self.portfolio.process_deposit_withdrawal_transaction(tran)
-      if gains:
-        self.gains.extend(gains)
-      if losses:
-        self.losses.extend(losses)
+      self.record_events(self.portfolio.process_deposit_withdrawal_transaction(tran))
     elif tran.operation == 'gain':
       gain = GainLoss()
       locale_fiat_lower = LOCALE_FIAT.lower()
       gain.fiat = abs(tran[locale_fiat_lower])
       gain.description = tran.comments
       gain.left_date = gain.right_date = tran.datetime
-      print(gain.brief_csv)
-      self.gains.append(gain)
+      self.record_events([gain], kind='gain')
     elif tran.operation == 'loss':
       for crypto in CRYPTOS:
         cryptofield = crypto.lower()
         if hasattr(tran, cryptofield):
           volume = getattr(tran, cryptofield)
           if volume > 0:
-            self.losses.extend(self.portfolio.dispose_as_loss(crypto, tran))
+            self.record_events(self.portfolio.dispose_as_loss(crypto, tran), kind='loss')
             break
       else:
         # Arbitrary locale fiat loss
@@ -102,22 +142,21 @@ class AnnualStatement(dict):
         loss.fiat = -abs(tran[locale_fiat_lower])
         loss.description = 'Arbitrary loss because of: ' + tran.comments
         loss.left_date = loss.right_date = tran.datetime
-        print(loss.brief_csv)
-        self.losses.append(loss)
+        self.record_events([loss], kind='loss')
     else:
       raise Exception('Unexpected transaction')
 
   @property
   def gross_gains_sum(self):
-    return sum([item.fiat for item in self.gains], 0)
+    return self._gross_gains_sum
 
   @property
   def non_discountable_gains_sum(self):
-    return sum([item.fiat for item in self.gains if not item.discountable], 0)
+    return self._non_discountable_gains_sum
 
   @property
   def discountable_gains_sum(self):
-    return sum([item.fiat for item in self.gains if item.discountable], 0)
+    return self._discountable_gains_sum
 
   @property
   def taxable_gains_sum(self):
@@ -130,7 +169,7 @@ class AnnualStatement(dict):
 
   @property
   def losses_sum(self):
-    return sum([item.fiat for item in self.losses], 0)
+    return self._losses_sum
 
   @property
   def net_gain(self):
@@ -145,32 +184,32 @@ class AnnualStatement(dict):
     else:
       return None
 
-  def report(self):
+  def report(self, out=None):
+    """ print the summary of the year to out, stdout by default """
     fiat_currency = LOCALE_FIAT.upper()
-    print('========================================================')
-    print('Tax return report for year: {}(FY{}-{})'.format(self.financial_year, self.financial_year - 1, self.financial_year % 100))
-    print('Gross gains of the year: ${:.2f} {}'.format(self.gross_gains_sum, fiat_currency))
+    print('========================================================', file=out)
+    print('Tax return report for year: {}(FY{}-{})'.format(self.financial_year, self.financial_year - 1, self.financial_year % 100), file=out)
+    print('Gross gains of the year: ${:.2f} {}'.format(self.gross_gains_sum, fiat_currency), file=out)
     print('Discountable gains of the year: ${:.2f} {}'.format(
-        self.discountable_gains_sum, fiat_currency))
+        self.discountable_gains_sum, fiat_currency), file=out)
     print('Non-discountable gains of the year: ${:.2f} {}'.format(
-        self.non_discountable_gains_sum, fiat_currency))
+        self.non_discountable_gains_sum, fiat_currency), file=out)
     print('Taxable gains of the year: ${:.2f} {}'.format(
-        self.taxable_gains_sum, fiat_currency))
+        self.taxable_gains_sum, fiat_currency), file=out)
     print('Losses carried from previous year: - ${:.2f} {}'.format(
-        abs(self.previous_year_loss.fiat if self.previous_year_loss else 0), fiat_currency))
+        abs(self.previous_year_loss.fiat if self.previous_year_loss else 0), fiat_currency), file=out)
     print('Losses of this year only: - ${:.2f} {}'.format(
-        abs(self.this_year_losses), fiat_currency))
+        abs(self.this_year_losses), fiat_currency), file=out)
     print('Total losses at the end of the year: - ${:.2f} {}'.format(
-        abs(self.losses_sum), fiat_currency))
+        abs(self.losses_sum), fiat_currency), file=out)
     print('Net gains of the year: {} ${:.2f} {}'.format(
-        '-' if self.net_gain < 0 else '', abs(self.net_gain), fiat_currency))
-    print('Portfolio of the year:')
+        '-' if self.net_gain < 0 else '', abs(self.net_gain), fiat_currency), file=out)
+    print('Portfolio of the year:', file=out)
     for crypto in CRYPTOS:
       if crypto in self.portfolio:
-        print('  {}: {}'.format(
-            crypto, sum([item.volume for item in self.portfolio[crypto]], 0)))
+        print('  {}: {}'.format(crypto, self.portfolio.holding(crypto)), file=out)
         # for position in self.portfolio[crypto]:
         #   if position.volume > 0:
         #     pp.pprint(position)
-    print('========================================================')
-    print('')
\ No newline at end of file
+    print('========================================================', file=out)
+    print('', file=out)
\ No newline at end of file
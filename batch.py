@@ -0,0 +1,118 @@
+import os
+import logging
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from config_loader import load_config
+from cgt_report import process_cgt_report
+from shared_def import BATCH_WORKERS, CHECKPOINT_DIR
+from logger import logger
+
+# what each ledger gets in its output directory
+EVENTS_FILENAME = 'events.csv'
+REPORT_FILENAME = 'report.txt'
+LOG_FILENAME = 'pycgt.log'
+ERROR_FILENAME = 'error.txt'
+
+
+def load_manifest(manifest_path):
+  """
+  Ledgers listed in a TOML manifest, each a [[ledgers]] table with a unique name,
+  its input files and the output directory of its own, e.g.
+
+    [[ledgers]]
+    name = "client-a"
+    files = ["client-a/2023.csv", "client-a/2024.csv"]
+    output_dir = "out/client-a"
+
+  Relative paths are relative to the manifest. return list of (name, files, output_dir)
+  """
+  manifest = load_config(manifest_path)
+  base_dir = os.path.dirname(os.path.abspath(manifest_path))
+  ledgers = []
+  names = set()
+  output_dirs = set()
+  for entry in manifest.get('ledgers', []):
+    name = entry.get('name')
+    files = entry.get('files')
+    output_dir = entry.get('output_dir')
+    if not name or not files or not output_dir:
+      raise Exception('Every ledger of manifest {} needs a name, files and an output_dir'.format(manifest_path))
+    output_dir = os.path.normpath(os.path.join(base_dir, output_dir))
+    if name in names:
+      raise Exception('Ledger {} is listed twice in manifest {}'.format(name, manifest_path))
+    if output_dir in output_dirs:
+      raise Exception('Ledger {} shares output_dir {} with another ledger'.format(name, output_dir))
+    names.add(name)
+    output_dirs.add(output_dir)
+    ledgers.append((name, [os.path.join(base_dir, item) for item in files], output_dir))
+  if not ledgers:
+    raise Exception('No ledgers in manifest {}'.format(manifest_path))
+  return ledgers
+
+
+def process_ledger(ledger):
+  """
+  Generate the events and report of one ledger into its output directory, with its log alongside.
+  Any failure is kept to the ledger: the traceback goes to its error file instead of the outputs,
+  which are only put in place once complete. return (name, None) or (name, error message)
+  """
+  name, csv_files, output_dir = ledger
+  os.makedirs(output_dir, exist_ok=True)
+  events_path = os.path.join(output_dir, EVENTS_FILENAME)
+  report_path = os.path.join(output_dir, REPORT_FILENAME)
+  error_path = os.path.join(output_dir, ERROR_FILENAME)
+  partial_paths = [events_path + '.partial', report_path + '.partial']
+  handler = logging.FileHandler(os.path.join(output_dir, LOG_FILENAME), mode='w')
+  handler.setFormatter(logging.getLogger().handlers[0].formatter)
+  logger.addHandler(handler)
+  try:
+    if os.path.exists(error_path):
+      os.remove(error_path)
+    # files of one ledger are parsed right here, the pool already keeps all CPUs busy
+    process_cgt_report(
+        csv_files, partial_paths[0], partial_paths[1], workers=1,
+        checkpoint_dir=os.path.join(output_dir, CHECKPOINT_DIR) if CHECKPOINT_DIR else '')
+    os.replace(partial_paths[0], events_path)
+    os.replace(partial_paths[1], report_path)
+    return name, None
+  except Exception as exp:
+    logger.error('Ledger {} failed: {}'.format(name, exp))
+    with open(error_path, 'w') as error_file:
+      error_file.write(traceback.format_exc())
+    # no outputs of an earlier run left looking like the outcome of this one
+    for path in partial_paths + [events_path, report_path]:
+      if os.path.exists(path):
+        os.remove(path)
+    return name, '{}: {}'.format(type(exp).__name__, exp)
+  finally:
+    logger.removeHandler(handler)
+    handler.close()
+
+
+def process_batch(manifest_path, workers=BATCH_WORKERS):
+  """
+  Process all ledgers of a manifest (see load_manifest), concurrently in a pool of workers
+  processes when more than one, so config, field definitions and imports are loaded once per worker
+  rather than once per ledger. return dict of ledger name to error message of the ledgers failed
+  """
+  ledgers = load_manifest(manifest_path)
+  if workers <= 0:
+    workers = os.cpu_count() or 1
+  workers = max(1, min(workers, len(ledgers)))
+  logger.info('Processing {} ledgers with {} processes'.format(len(ledgers), workers))
+  if workers == 1:
+    results = [process_ledger(ledger) for ledger in ledgers]
+  else:
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+      futures = [executor.submit(process_ledger, ledger) for ledger in ledgers]
+      results = []
+      for (name, _, _), future in zip(ledgers, futures):
+        try:
+          results.append(future.result())
+        except Exception as exp:
+          # the worker process itself died, e.g. killed running out of memory
+          logger.error('Ledger {} failed: {}'.format(name, exp))
+          results.append((name, '{}: {}'.format(type(exp).__name__, exp)))
+  failures = {name: error for name, error in results if error}
+  logger.info('{} of {} ledgers processed, {} failed'.format(len(ledgers) - len(failures), len(ledgers), len(failures)))
+  return failures
@@ -0,0 +1,90 @@
+"""
+Time of each phase of transforming a synthetic Nexo export (1M rows by default): converting rows,
+sorting them by datetime, autofilling locale fiat values and fees, and writing the pycgt CSV.
+Rates come from the local stand-in APIs (see standin_server.py) with no latency or rate limit,
+so the time is the transformer's own.
+
+  python benchmarks/bench_autofill.py [--rows N] [--years N] [--fixtures DIR]
+"""
+import os
+import sys
+import csv
+import time
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from standin_server import FRANKFURTER, BITSTAMP, StandInServer, synthesize_fixtures
+from bench_market_data import write_nexo_export, set_option
+
+
+def main():
+  arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  arg_parser.add_argument('--rows', type=int, default=1000000)
+  arg_parser.add_argument('--years', type=int, default=5)
+  arg_parser.add_argument('--fixtures', help='Fixtures directory, synthesized fixtures by default')
+  args = arg_parser.parse_args()
+
+  with tempfile.TemporaryDirectory(prefix='pycgt-bench-') as directory:
+    fixtures_dir = args.fixtures
+    if not fixtures_dir:
+      fixtures_dir = os.path.join(directory, 'fixtures')
+      synthesize_fixtures(fixtures_dir)
+    forex_server = StandInServer(FRANKFURTER, fixtures_dir).start()
+    crypto_server = StandInServer(BITSTAMP, fixtures_dir).start()
+
+    # pycgt loads config.toml from the working directory: the repo's, pointed at the stand-ins
+    with open(os.path.join(ROOT, 'config.toml')) as config_file:
+      config_text = config_file.read()
+    options = {'forex_api_url': forex_server.url, 'crypto_api_url': crypto_server.url, 'rate_cache_path': '',
+               'market_data_source': 'online', 'http_requests_per_second': 0, 'level': 'ERROR'}
+    for key, value in options.items():
+      config_text = set_option(config_text, key, value)
+    with open(os.path.join(directory, 'config.toml'), 'w') as config_file:
+      config_file.write(config_text)
+    os.chdir(directory)
+
+    from transformer import get_transformer
+
+    export_path = os.path.join(directory, 'nexo.csv')
+    write_nexo_export(export_path, args.rows, years=args.years)
+    transformer = get_transformer('nexo', [export_path], os.path.join(directory, 'pycgt.csv'))
+
+    # the phases of NexoTransformer.transform
+    timings = []
+    started = time.perf_counter()
+    transactions = []
+    with open(export_path) as export:
+      for row in csv.DictReader(export):
+        converted = transformer._convert_nexo_row(row, transactions)
+        if isinstance(converted, list):
+          transactions.extend(converted)
+        elif converted:
+          transactions.append(converted)
+    timings.append(('convert', time.perf_counter() - started))
+
+    started = time.perf_counter()
+    transformer.sort_by_datetime(transactions)
+    timings.append(('sort', time.perf_counter() - started))
+
+    started = time.perf_counter()
+    transformer.autofill_locale_fiat_and_fees(transactions)
+    timings.append(('autofill', time.perf_counter() - started))
+
+    started = time.perf_counter()
+    transformer.write_pycgt_csv(transactions)
+    timings.append(('write', time.perf_counter() - started))
+
+    print('rows: {}, transactions: {}, rate requests: {}'.format(
+        args.rows, len(transactions), sum(forex_server.stats.values()) + sum(crypto_server.stats.values())))
+    for phase, elapsed in timings:
+      print('{:<9} {:7.2f}s ({:.0f} transactions/s)'.format(phase, elapsed, len(transactions) / elapsed))
+    total = sum(elapsed for _, elapsed in timings)
+    print('{:<9} {:7.2f}s ({:.0f} rows/s)'.format('total', total, args.rows / total))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,72 @@
+"""
+Rows/sec of datetime parsing before (datetime_parser) and after (DatetimeParser), per datetime format,
+checking both give the same datetimes.
+
+  python benchmarks/bench_datetime_parsing.py [--rows N] [--repeat N]
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT) # config.toml is loaded from the working directory
+sys.path.insert(0, ROOT)
+
+from transaction import datetime_parser, DatetimeParser
+
+
+def _example_iso(dt):
+  # as in example.csv: month/day not zero padded, milliseconds, Z
+  return '{}-{}-{}T{:02d}:{:02d}:{:02d}.{:03d}Z'.format(
+      dt.year, dt.month, dt.day, dt.hour, dt.minute, dt.second, dt.microsecond // 1000)
+
+
+SAMPLES = {
+    'iso_unpadded_z': _example_iso,
+    'iso_offset': lambda dt: dt.astimezone(timezone(timedelta(hours=10))).isoformat(),
+    'ymd_hms': lambda dt: dt.strftime('%Y-%m-%d %H:%M:%S'),
+    'mdy_hms': lambda dt: dt.strftime('%m/%d/%Y %H:%M:%S'),
+    'dmy_hms_z': lambda dt: dt.strftime('%d %b %Y %H:%M:%S %z'),
+}
+
+
+def generate(fmt, rows):
+  """ rows datetime strings in a sorted log, a few seconds to hours apart """
+  start = datetime(2016, 1, 1, tzinfo=timezone.utc)
+  return [SAMPLES[fmt](start + timedelta(seconds=index * 3917, milliseconds=index % 1000)) for index in range(rows)]
+
+
+def rows_per_sec(parse, values, repeat):
+  best = None
+  for _ in range(repeat):
+    started = time.perf_counter()
+    for value in values:
+      parse(value)
+    elapsed = time.perf_counter() - started
+    best = elapsed if best is None else min(best, elapsed)
+  return len(values) / best
+
+
+def main():
+  arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  arg_parser.add_argument('--rows', type=int, default=20000)
+  arg_parser.add_argument('--repeat', type=int, default=3)
+  args = arg_parser.parse_args()
+
+  print('{:<16} {:>14} {:>14} {:>9}'.format('format', 'before rows/s', 'after rows/s', 'speedup'))
+  for fmt in SAMPLES:
+    values = generate(fmt, args.rows)
+    for value in values[:1000]:
+      before, after = datetime_parser(value), DatetimeParser()(value)
+      if before != after or before.utcoffset() != after.utcoffset() or str(before) != str(after):
+        raise Exception('Mismatch parsing {}: {} != {}'.format(value, before, after))
+    before = rows_per_sec(datetime_parser, values, args.repeat)
+    # a new parser per run, as per file in main.py, so detection and memo start cold
+    after = min(rows_per_sec(DatetimeParser(), values, 1) for _ in range(args.repeat))
+    print('{:<16} {:>14.0f} {:>14.0f} {:>8.1f}x'.format(fmt, before, after, after / before))
+
+
+if __name__ == '__main__':
+  main()
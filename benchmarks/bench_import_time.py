@@ -0,0 +1,108 @@
+"""
+Import time of the CLI's report and transform paths, from `python -X importtime`, against a startup budget.
+
+Each path runs main.py for real on an input small enough that what's left is startup: the report of
+example.csv, and the transform of an empty Bitstamp export (no rates to fetch). Interpreter startup
+(site) is left out of the totals, it doesn't depend on pycgt. The report path must also not load
+the transformers, the market data providers or their heavy dependencies.
+
+  python benchmarks/bench_import_time.py [--runs N] [--report-budget-ms MS] [--transform-budget-ms MS] [--top N]
+
+Exits with status 1 if a path is over its budget or loads modules it mustn't.
+"""
+import os
+import sys
+import shutil
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_market_data import set_option
+
+BITSTAMP_HEADER = 'ID,Account,Type,Subtype,Datetime,Amount,Amount currency,Value,Value currency,Rate,Rate currency,Fee,Fee currency,Order ID\n'
+
+# modules the report path is expected to do without, by top level package
+NOT_ON_REPORT_PATH = ['transformer', 'market_data_provider', 'requests', 'urllib3', 'dateutil', 'multiprocessing']
+
+
+def parse_importtime(stderr):
+  """ (module, self us, cumulative us, top level) of each import -X importtime logged, in order """
+  imports = []
+  for line in stderr.splitlines():
+    if not line.startswith('import time:') or 'imported package' in line:
+      continue
+    self_us, cumulative_us, name = line[len('import time:'):].split('|')
+    imports.append((name.strip(), int(self_us), int(cumulative_us), not name[1:].startswith(' ')))
+  return imports
+
+
+def after_startup(imports):
+  """ imports after interpreter startup, i.e. after the top level import of site """
+  for index, (name, _, _, top_level) in enumerate(imports):
+    if top_level and name == 'site':
+      return imports[index + 1:]
+  return imports
+
+
+def run_path(args, directory):
+  """ imports after startup of one run of main.py with args, in directory """
+  completed = subprocess.run([sys.executable, '-X', 'importtime', os.path.join(ROOT, 'main.py')] + args,
+                             cwd=directory, capture_output=True, text=True)
+  if completed.returncode:
+    raise Exception('main.py {} failed:\n{}'.format(' '.join(args), completed.stderr[-2000:]))
+  return after_startup(parse_importtime(completed.stderr))
+
+
+def main():
+  arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  arg_parser.add_argument('--runs', type=int, default=7, help='Runs of each path, the median is checked')
+  arg_parser.add_argument('--report-budget-ms', type=float, default=100)
+  arg_parser.add_argument('--transform-budget-ms', type=float, default=250)
+  arg_parser.add_argument('--top', type=int, default=8, help='Slowest imports to list of each path')
+  args = arg_parser.parse_args()
+
+  with tempfile.TemporaryDirectory(prefix='pycgt-bench-') as directory:
+    # pycgt loads config.toml from the working directory: the repo's, with nothing left behind between runs
+    with open(os.path.join(ROOT, 'config.toml')) as config_file:
+      config_text = config_file.read()
+    options = {'checkpoint_dir': '', 'parse_cache_dir': '', 'rate_cache_path': '', 'match_workers': 1, 'level': 'ERROR'}
+    for key, value in options.items():
+      config_text = set_option(config_text, key, value)
+    with open(os.path.join(directory, 'config.toml'), 'w') as config_file:
+      config_file.write(config_text)
+    shutil.copy(os.path.join(ROOT, 'example.csv'), directory)
+    with open(os.path.join(directory, 'bitstamp.csv'), 'w') as export:
+      export.write(BITSTAMP_HEADER)
+
+    paths = [
+        ('report', ['--events', 'none', '--report', 'report.txt', 'example.csv'], args.report_budget_ms, NOT_ON_REPORT_PATH),
+        ('transform', ['-t', '-x', 'bitstamp', '-o', 'transformed.csv', 'bitstamp.csv'], args.transform_budget_ms, []),
+    ]
+    failures = []
+    for name, path_args, budget_ms, unexpected in paths:
+      runs = [run_path(path_args, directory) for _ in range(args.runs)]
+      totals = [sum(self_us for _, self_us, _, _ in imports) / 1000 for imports in runs]
+      median = statistics.median(totals)
+      print('{:<10} {:7.1f}ms median, {:.1f}ms min, {} modules, budget {:.0f}ms'.format(
+          name, median, min(totals), len(runs[0]), budget_ms))
+      for module, _, cumulative_us, _ in sorted(
+          (item for item in runs[0] if item[3]), key=lambda item: -item[2])[:args.top]:
+        print('  {:<40} {:7.1f}ms'.format(module, cumulative_us / 1000))
+
+      if median > budget_ms:
+        failures.append('{} path imports take {:.1f}ms, over its {:.0f}ms budget'.format(name, median, budget_ms))
+      loaded = sorted({module.split('.')[0] for module, _, _, _ in runs[0]} & set(unexpected))
+      if loaded:
+        failures.append('{} path loads {}'.format(name, ', '.join(loaded)))
+
+  for failure in failures:
+    print(failure)
+  sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,126 @@
+"""
+End-to-end time and request counts of transforming a synthetic Nexo export, rates fetched from
+the local stand-in APIs (see standin_server.py) under injected latency, throttling and failures.
+
+  python benchmarks/bench_market_data.py [--rows N] [--years N] [--fixtures DIR] [--scenario NAME ...]
+      [--requests-per-second N] [--concurrency N]
+
+The rate cache is off, so every scenario fetches all rates; outputs of all scenarios must match.
+"""
+import os
+import re
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from standin_server import FRANKFURTER, BITSTAMP, StandInServer, synthesize_fixtures
+
+SCENARIOS = {
+    'clean': {},
+    'latency': dict(latency=0.1, jitter=0.05),
+    'throttled': dict(latency=0.05, error_rate=0.2, error_status=429, retry_after=0.2),
+    'flaky': dict(latency=0.05, error_rate=0.1, error_status=503, drop_rate=0.05),
+}
+
+NEXO_HEADER = ['Transaction', 'Type', 'Input Currency', 'Input Amount', 'Output Currency', 'Output Amount',
+               'USD Equivalent', 'Fee', 'Fee Currency', 'Details', 'Date / Time (UTC)']
+NEXO_CRYPTOS = ['BTC', 'ETH', 'LTC', 'SOL']
+
+
+def write_nexo_export(path, rows, start=datetime(2021, 1, 1), years=3, seed=1):
+  """ top ups paying fees in crypto (crypto prices queried) and interest in USD (forex rates queried), spread over years """
+  rng = random.Random(seed)
+  span = years * 365 * 86400
+  with open(path, 'w', newline='') as export:
+    writer = csv.writer(export)
+    writer.writerow(NEXO_HEADER)
+    for index in range(rows):
+      when = (start + timedelta(seconds=span * index // rows)).strftime('%Y-%m-%d %H:%M:%S')
+      crypto = rng.choice(NEXO_CRYPTOS)
+      amount = '{:.8f}'.format(rng.uniform(0.01, 2))
+      if index % 3:
+        writer.writerow(['NXT{:08d}'.format(index), 'Top up Crypto', crypto, amount, crypto, amount, '$0.00',
+                         '{:.8f}'.format(rng.uniform(0.00001, 0.001)), crypto, 'approved / Deposit', when])
+      else:
+        writer.writerow(['NXT{:08d}'.format(index), 'Interest', crypto, amount, crypto, amount,
+                         '${:,.2f}'.format(rng.uniform(1, 500)), '-', '-', 'approved / Interest', when])
+
+
+def set_option(text, key, value):
+  """ config.toml text with key set to value, the first key of that name, added to [options] if missing """
+  line = '{} = {}'.format(key, json.dumps(value))
+  pattern = re.compile(r'^{}\s*=.*$'.format(re.escape(key)), re.MULTILINE)
+  if pattern.search(text):
+    return pattern.sub(lambda _: line, text, count=1)
+  return text.replace('[options]\n', '[options]\n{}\n'.format(line), 1)
+
+
+def main():
+  arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  arg_parser.add_argument('--rows', type=int, default=5000)
+  arg_parser.add_argument('--years', type=int, default=3, help='Years the export spans, longer means more chunks')
+  arg_parser.add_argument('--fixtures', help='Fixtures directory, synthesized fixtures by default')
+  arg_parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='Scenarios to run, all by default')
+  arg_parser.add_argument('--requests-per-second', type=float, help='http_requests_per_second, config.toml value by default')
+  arg_parser.add_argument('--concurrency', type=int, help='http_max_concurrency, config.toml value by default')
+  args = arg_parser.parse_args()
+
+  with tempfile.TemporaryDirectory(prefix='pycgt-bench-') as directory:
+    fixtures_dir = args.fixtures
+    if not fixtures_dir:
+      fixtures_dir = os.path.join(directory, 'fixtures')
+      synthesize_fixtures(fixtures_dir)
+    forex_server = StandInServer(FRANKFURTER, fixtures_dir).start()
+    crypto_server = StandInServer(BITSTAMP, fixtures_dir).start()
+
+    # pycgt loads config.toml from the working directory: the repo's, pointed at the stand-ins
+    with open(os.path.join(ROOT, 'config.toml')) as config_file:
+      config_text = config_file.read()
+    options = {'forex_api_url': forex_server.url, 'crypto_api_url': crypto_server.url,
+               'rate_cache_path': '', 'market_data_source': 'online', 'level': 'ERROR'}
+    if args.requests_per_second is not None:
+      options['http_requests_per_second'] = args.requests_per_second
+    if args.concurrency is not None:
+      options['http_max_concurrency'] = args.concurrency
+    for key, value in options.items():
+      config_text = set_option(config_text, key, value)
+    with open(os.path.join(directory, 'config.toml'), 'w') as config_file:
+      config_file.write(config_text)
+    os.chdir(directory)
+
+    from shared_def import HTTP_REQUESTS_PER_SECOND, HTTP_MAX_CONCURRENCY
+    from transformer import get_transformer
+
+    export_path = os.path.join(directory, 'nexo.csv')
+    write_nexo_export(export_path, args.rows, years=args.years)
+    print('rows: {}, years: {}, requests/s per host: {}, concurrency: {}'.format(
+        args.rows, args.years, HTTP_REQUESTS_PER_SECOND, HTTP_MAX_CONCURRENCY))
+
+    outputs = {}
+    for name in args.scenario or list(SCENARIOS):
+      forex_server.configure(**SCENARIOS[name])
+      crypto_server.configure(**SCENARIOS[name])
+      output_path = os.path.join(directory, name + '.csv')
+      started = time.perf_counter()
+      get_transformer('nexo', [export_path], output_path).transform()
+      elapsed = time.perf_counter() - started
+      with open(output_path) as output:
+        outputs[name] = output.read()
+      print('{:<10} {:6.2f}s  frankfurter {:<32} bitstamp {}'.format(
+          name, elapsed, json.dumps(dict(forex_server.stats)), json.dumps(dict(crypto_server.stats))))
+
+    if len(set(outputs.values())) > 1:
+      raise Exception('Outputs of scenarios differ')
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,69 @@
+"""
+Time parsing a synthetic pycgt CSV against loading it back from the parse cache.
+
+  python benchmarks/bench_parse_cache.py [--rows N]
+"""
+import os
+import sys
+import csv
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT) # config.toml is loaded from the working directory
+sys.path.insert(0, ROOT)
+
+from ingest import parse_csv_file
+from parse_cache import ParseCache
+
+
+def write_ledger(path, rows):
+  """ buys and sells of btc for aud, a minute apart """
+  random.seed(1)
+  start = datetime(2018, 1, 1)
+  with open(path, 'w', newline='') as ledger:
+    writer = csv.writer(ledger)
+    writer.writerow(['Type', 'Exchange', 'Datetime', 'Operation', 'Pair', 'BTC', 'AUD', 'Fee(AUD)', 'BTCAUD', 'Comments'])
+    for index in range(rows):
+      volume = round(random.uniform(0.001, 0.1), 8)
+      price = round(random.uniform(5000, 90000), 2)
+      writer.writerow([
+          'Market', 'Bench', (start + timedelta(minutes=index)).strftime('%Y-%m-%d %H:%M:%S'),
+          'buy' if index % 3 else 'sell', 'btcaud', volume, round(volume * price, 2),
+          round(volume * price * 0.002, 4), price, ''])
+
+
+def main():
+  arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  arg_parser.add_argument('--rows', type=int, default=200000)
+  args = arg_parser.parse_args()
+
+  with tempfile.TemporaryDirectory(prefix='pycgt-bench-') as directory:
+    path = os.path.join(directory, 'ledger.csv')
+    write_ledger(path, args.rows)
+    cache = ParseCache(os.path.join(directory, 'cache'))
+
+    started = time.perf_counter()
+    parsed = parse_csv_file(path)
+    parse_time = time.perf_counter() - started
+
+    cache_path = cache.path_of(path)
+    cache.store(cache_path, parsed)
+
+    started = time.perf_counter()
+    loaded = cache.load(cache.path_of(path)) # including hashing the file
+    load_time = time.perf_counter() - started
+
+    if [dict(tran) for tran in loaded[0]] != [dict(tran) for tran in parsed[0]]:
+      raise Exception('Cached transactions differ from parsed ones')
+    print('rows: {}, cache size: {:.1f} MB, csv size: {:.1f} MB'.format(
+        args.rows, os.path.getsize(cache_path) / 1e6, os.path.getsize(path) / 1e6))
+    print('parse: {:.2f}s ({:.0f} rows/s)'.format(parse_time, args.rows / parse_time))
+    print('cache: {:.2f}s ({:.0f} rows/s), {:.1f}x faster'.format(load_time, args.rows / load_time, parse_time / load_time))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,335 @@
+"""
+Local stand-in for the Frankfurter and Bitstamp OHLC APIs, replaying rates from fixtures,
+with injected latency, errors and dropped connections, so market data fetching can be measured offline.
+
+  # fixtures synthesized (deterministic random walks), or recorded from the real APIs
+  python benchmarks/standin_server.py synthesize benchmarks/fixtures
+  python benchmarks/standin_server.py record benchmarks/fixtures --start 2020-01-01 --end 2024-12-31
+
+  # both APIs, each on its own port as they are different hosts
+  python benchmarks/standin_server.py serve benchmarks/fixtures --latency 0.1 --error-rate 0.1 --error-status 429
+
+then point pycgt at them with forex_api_url = "http://127.0.0.1:8081" and crypto_api_url = "http://127.0.0.1:8082".
+
+Fixtures are kept in the shape of the API responses:
+  frankfurter/<BASE>.json   {"base": "AUD", "rates": {"2024-01-02": {"USD": 0.68}, ...}}, business days only
+  bitstamp/<pair>.json      {"data": {"pair": "BTC/USD", "ohlc": [{"timestamp": "1704153600", "close": "44000", ...}]}}
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+FRANKFURTER = 'frankfurter'
+BITSTAMP = 'bitstamp'
+
+# synthesized fixtures: pair -> (first rate, daily volatility)
+SYNTHETIC_FOREX = {'AUD': {'USD': (0.72, 0.004)}}
+SYNTHETIC_CRYPTO = {'btcusd': (9000.0, 0.03), 'ethusd': (180.0, 0.04), 'ltcusd': (60.0, 0.04), 'solusd': (2.0, 0.05)}
+SYNTHETIC_START = date(2016, 1, 1)
+SYNTHETIC_END = date(2025, 12, 31)
+
+
+def _utc_timestamp(day):
+  return int(datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp())
+
+
+def _write_json(path, data):
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path, 'w') as fixture:
+    json.dump(data, fixture, separators=(',', ':'))
+
+
+def synthesize_fixtures(fixtures_dir, start=SYNTHETIC_START, end=SYNTHETIC_END, seed=1):
+  """ deterministic random walk rates, forex on business days only as the ECB publishes them """
+  rng = random.Random(seed)
+  for base, targets in SYNTHETIC_FOREX.items():
+    rates = {}
+    walks = {target: first for target, (first, _) in targets.items()}
+    day = start
+    while day <= end:
+      if day.weekday() < 5:
+        for target, (_, volatility) in targets.items():
+          walks[target] *= 1 + rng.gauss(0, volatility)
+          rates.setdefault(day.isoformat(), {})[target] = round(walks[target], 5)
+      day += timedelta(days=1)
+    _write_json(os.path.join(fixtures_dir, FRANKFURTER, base + '.json'), {'base': base, 'rates': rates})
+  for pair, (price, volatility) in SYNTHETIC_CRYPTO.items():
+    ohlc = []
+    day = start
+    while day <= end:
+      open_price = price
+      price *= 1 + rng.gauss(0, volatility)
+      ohlc.append({
+          'timestamp': str(_utc_timestamp(day)), 'open': '{:.2f}'.format(open_price),
+          'high': '{:.2f}'.format(max(open_price, price)), 'low': '{:.2f}'.format(min(open_price, price)),
+          'close': '{:.2f}'.format(price), 'volume': '{:.4f}'.format(rng.uniform(100, 10000))})
+      day += timedelta(days=1)
+    _write_json(os.path.join(fixtures_dir, BITSTAMP, pair + '.json'),
+                {'data': {'pair': '{}/{}'.format(pair[:-3].upper(), pair[-3:].upper()), 'ohlc': ohlc}})
+
+
+def record_fixtures(fixtures_dir, forex_pairs, crypto_pairs, start, end):
+  """ fetch fixtures from the real APIs, in chunks the APIs answer in full """
+  ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+  os.chdir(ROOT) # config.toml is loaded from the working directory
+  sys.path.insert(0, ROOT)
+  from market_data_provider.http_session import HttpSession
+  http = HttpSession()
+
+  for pair in forex_pairs:
+    base, target = pair[:3].upper(), pair[3:].upper()
+    path = os.path.join(fixtures_dir, FRANKFURTER, base + '.json')
+    fixture = json.load(open(path)) if os.path.exists(path) else {'base': base, 'rates': {}}
+    chunk_start = start
+    while chunk_start <= end:
+      # longer ranges are sampled weekly by Frankfurter
+      chunk_end = min(end, chunk_start + timedelta(days=180))
+      data = http.get('https://api.frankfurter.app/{}..{}'.format(chunk_start, chunk_end),
+                      params={'from': base, 'to': target}).json()
+      for day, rates in data.get('rates', {}).items():
+        fixture['rates'].setdefault(day, {}).update(rates)
+      chunk_start = chunk_end + timedelta(days=1)
+    fixture['rates'] = dict(sorted(fixture['rates'].items()))
+    _write_json(path, fixture)
+
+  for pair in crypto_pairs:
+    path = os.path.join(fixtures_dir, BITSTAMP, pair + '.json')
+    candles = {}
+    if os.path.exists(path):
+      candles = {candle['timestamp']: candle for candle in json.load(open(path))['data']['ohlc']}
+    chunk_start = start
+    while chunk_start <= end:
+      chunk_end = min(end, chunk_start + timedelta(days=999))
+      data = http.get('https://www.bitstamp.net/api/v2/ohlc/{}/'.format(pair), params={
+          'step': 86400, 'limit': 1000, 'start': _utc_timestamp(chunk_start), 'end': _utc_timestamp(chunk_end)}).json()
+      for candle in data['data']['ohlc']:
+        candles[candle['timestamp']] = candle
+      chunk_start = chunk_end + timedelta(days=1)
+    ohlc = [candles[key] for key in sorted(candles, key=int)]
+    _write_json(path, {'data': {'pair': '{}/{}'.format(pair[:-3].upper(), pair[-3:].upper()), 'ohlc': ohlc}})
+
+
+def load_fixtures(fixtures_dir, api):
+  """ fixtures of one API: frankfurter base -> sorted [(day, rates)], bitstamp pair -> sorted [(timestamp, candle)] """
+  directory = os.path.join(fixtures_dir, api)
+  fixtures = {}
+  for name in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+    if not name.endswith('.json'):
+      continue
+    with open(os.path.join(directory, name)) as fixture:
+      data = json.load(fixture)
+    if api == FRANKFURTER:
+      fixtures[data['base']] = sorted(data['rates'].items())
+    else:
+      fixtures[name[:-len('.json')]] = sorted((int(candle['timestamp']), candle) for candle in data['data']['ohlc'])
+  if not fixtures:
+    raise Exception('No {} fixtures in {}'.format(api, directory))
+  return fixtures
+
+
+class StandInServer(ThreadingHTTPServer):
+  """
+  One API replayed from fixtures. Every request waits latency plus up to jitter seconds, then
+  with probability error_rate gets error_status (with Retry-After of retry_after seconds for 429/503)
+  or with probability drop_rate has its connection closed with no response at all.
+  Injection settings can be changed while serving (configure); stats counts requests by outcome.
+  """
+  daemon_threads = True
+
+  def __init__(self, api, fixtures_dir, host='127.0.0.1', port=0, latency=0.0, jitter=0.0,
+               error_rate=0.0, error_status=503, retry_after=None, drop_rate=0.0, seed=1):
+    super().__init__((host, port), StandInHandler)
+    self.api = api
+    self.fixtures = load_fixtures(fixtures_dir, api)
+    self._lock = threading.Lock()
+    self.configure(latency, jitter, error_rate, error_status, retry_after, drop_rate, seed)
+
+  def configure(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503, retry_after=None, drop_rate=0.0, seed=1):
+    """ change injection settings, starting stats and the random draws afresh """
+    with self._lock:
+      self.latency = latency
+      self.jitter = jitter
+      self.error_rate = error_rate
+      self.error_status = error_status
+      self.retry_after = retry_after
+      self.drop_rate = drop_rate
+      self.stats = Counter()
+      self._random = random.Random(seed)
+
+  @property
+  def url(self):
+    host, port = self.server_address[:2]
+    return 'http://{}:{}'.format(host, port)
+
+  def start(self):
+    """ serve in a daemon thread, return self """
+    threading.Thread(target=self.serve_forever, name='standin-' + self.api, daemon=True).start()
+    return self
+
+  def count(self, outcome):
+    with self._lock:
+      self.stats[outcome] += 1
+
+  def draw(self):
+    """ (delay, outcome) of the next request, outcome one of 'ok', 'error', 'drop' """
+    with self._lock:
+      delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+      roll = self._random.random()
+    if roll < self.error_rate:
+      return delay, 'error'
+    if roll < self.error_rate + self.drop_rate:
+      return delay, 'drop'
+    return delay, 'ok'
+
+
+def frankfurter_response(fixtures, path, query):
+  """ (status, body) of a Frankfurter /<date> or /<start>..<end> request """
+  base = query.get('from', ['EUR'])[0].upper()
+  if base not in fixtures:
+    return 404, {'message': 'not found'}
+  days = fixtures[base]
+  targets = query['to'][0].upper().split(',') if 'to' in query else None
+
+  def pick(rates):
+    return {target: rate for target, rate in rates.items() if targets is None or target in targets}
+
+  if '..' in path:
+    start, end = path.split('..', 1)
+    start = date.fromisoformat(start).isoformat()
+    end = date.fromisoformat(end).isoformat() if end else days[-1][0]
+    # starts at the last business day up to start, as Frankfurter does
+    earlier = [day for day, _ in days if day <= start]
+    first = earlier[-1] if earlier else start
+    rates = {day: pick(rates) for day, rates in days if first <= day <= end}
+    if not rates:
+      return 404, {'message': 'not found'}
+    return 200, {'amount': 1.0, 'base': base, 'start_date': min(rates), 'end_date': max(rates), 'rates': rates}
+  day = date.fromisoformat(path).isoformat()
+  earlier = [(each, rates) for each, rates in days if each <= day]
+  if not earlier:
+    return 404, {'message': 'not found'}
+  return 200, {'amount': 1.0, 'base': base, 'date': earlier[-1][0], 'rates': pick(earlier[-1][1])}
+
+
+def bitstamp_response(fixtures, path, query):
+  """ (status, body) of a Bitstamp /ohlc/<pair>/ request """
+  parts = [part for part in path.split('/') if part]
+  if len(parts) != 2 or parts[0] != 'ohlc' or parts[1] not in fixtures:
+    return 404, {'code': 'not_found', 'errors': [{'message': 'Not found'}]}
+  step = int(query.get('step', ['86400'])[0])
+  if step != 86400:
+    return 400, {'code': 'bad_request', 'errors': [{'message': 'Only daily candles are recorded'}]}
+  limit = min(1000, int(query.get('limit', ['1000'])[0]))
+  start = int(query['start'][0]) if 'start' in query else None
+  end = int(query['end'][0]) if 'end' in query else None
+  candles = [candle for timestamp, candle in fixtures[parts[1]]
+             if (start is None or timestamp >= start) and (end is None or timestamp <= end)]
+  candles = candles[:limit] if start is not None or end is None else candles[-limit:]
+  pair = '{}/{}'.format(parts[1][:-3].upper(), parts[1][-3:].upper())
+  return 200, {'data': {'pair': pair, 'ohlc': candles}}
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+  protocol_version = 'HTTP/1.1' # keep-alive, as the real APIs
+
+  def do_GET(self):
+    server = self.server
+    delay, outcome = server.draw()
+    if delay:
+      time.sleep(delay)
+    if outcome == 'drop':
+      server.count('dropped')
+      self.close_connection = True
+      return
+    if outcome == 'error':
+      server.count(str(server.error_status))
+      headers = {}
+      if server.retry_after is not None and server.error_status in (429, 503):
+        headers['Retry-After'] = str(server.retry_after)
+      self._send(server.error_status, {'message': 'injected error'}, headers)
+      return
+
+    url = urlsplit(self.path)
+    query = parse_qs(url.query)
+    try:
+      if server.api == FRANKFURTER:
+        status, body = frankfurter_response(server.fixtures, url.path.strip('/'), query)
+      else:
+        path = url.path[len('/api/v2'):] if url.path.startswith('/api/v2/') else url.path
+        status, body = bitstamp_response(server.fixtures, path, query)
+    except (KeyError, ValueError) as exp:
+      status, body = 400, {'message': str(exp)}
+    server.count(str(status))
+    self._send(status, body)
+
+  def _send(self, status, body, headers=None):
+    payload = json.dumps(body).encode()
+    self.send_response(status)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(payload)))
+    for name, value in (headers or {}).items():
+      self.send_header(name, value)
+    self.end_headers()
+    self.wfile.write(payload)
+
+  def log_message(self, format, *args):
+    pass
+
+
+def main():
+  arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  commands = arg_parser.add_subparsers(dest='command', required=True)
+
+  serve = commands.add_parser('serve', help='Serve both APIs from fixtures')
+  serve.add_argument('fixtures_dir')
+  serve.add_argument('--host', default='127.0.0.1')
+  serve.add_argument('--forex-port', type=int, default=8081)
+  serve.add_argument('--crypto-port', type=int, default=8082)
+  serve.add_argument('--latency', type=float, default=0.0, help='Seconds every request waits')
+  serve.add_argument('--jitter', type=float, default=0.0, help='Up to this many seconds more, at random')
+  serve.add_argument('--error-rate', type=float, default=0.0, help='Share of requests failing with --error-status')
+  serve.add_argument('--error-status', type=int, default=503)
+  serve.add_argument('--retry-after', type=float, help='Retry-After seconds of injected 429/503 responses')
+  serve.add_argument('--drop-rate', type=float, default=0.0, help='Share of requests dropped with no response')
+  serve.add_argument('--seed', type=int, default=1)
+
+  synthesize = commands.add_parser('synthesize', help='Write deterministic synthetic fixtures')
+  synthesize.add_argument('fixtures_dir')
+
+  record = commands.add_parser('record', help='Record fixtures from the real APIs, merged into existing ones')
+  record.add_argument('fixtures_dir')
+  record.add_argument('--start', type=date.fromisoformat, required=True)
+  record.add_argument('--end', type=date.fromisoformat, required=True)
+  record.add_argument('--forex', nargs='*', default=['audusd'])
+  record.add_argument('--crypto', nargs='*', default=sorted(SYNTHETIC_CRYPTO))
+  args = arg_parser.parse_args()
+
+  if args.command == 'synthesize':
+    synthesize_fixtures(args.fixtures_dir)
+  elif args.command == 'record':
+    record_fixtures(os.path.abspath(args.fixtures_dir), args.forex, args.crypto, args.start, args.end)
+  else:
+    injection = dict(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, error_status=args.error_status,
+                     retry_after=args.retry_after, drop_rate=args.drop_rate, seed=args.seed)
+    servers = [StandInServer(FRANKFURTER, args.fixtures_dir, args.host, args.forex_port, **injection).start(),
+               StandInServer(BITSTAMP, args.fixtures_dir, args.host, args.crypto_port, **injection).start()]
+    print('forex_api_url = "{}"\ncrypto_api_url = "{}"'.format(servers[0].url, servers[1].url))
+    try:
+      while True:
+        time.sleep(5)
+    except KeyboardInterrupt:
+      for server in servers:
+        print('{}: {}'.format(server.api, dict(server.stats)))
+        server.shutdown()
+
+
+if __name__ == '__main__':
+  main()
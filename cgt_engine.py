@@ -0,0 +1,252 @@
+import os
+from annual_statement import AnnualStatement
+from portfolio import Portfolio
+from shared_def import CRYPTOS, MATCH_WORKERS
+from logger import logger
+
+
+def open_statements(previous_statement, financial_year, sink=None, retain=True):
+  """
+  Statements to open for a transaction of financial_year after previous_statement,
+  the years in between (with no transaction at all) first and the statement of financial_year last.
+  Each year starts with the portfolio and carried losses at the end of the year before,
+  the portfolio as a snapshot when retain, otherwise handed over as is.
+  """
+  previous_financial_year = previous_statement.financial_year if previous_statement else None
+  if previous_financial_year and financial_year - previous_financial_year > 1:
+    years = range(previous_financial_year + 1, financial_year + 1)
+  else:
+    years = [financial_year]
+  statements = []
+  for year in years:
+    portfolio = None
+    if previous_statement:
+      portfolio = previous_statement.portfolio.snapshot() if retain else previous_statement.portfolio
+    statement = AnnualStatement(
+        financial_year=year,
+        portfolio=portfolio,
+        losses=previous_statement.carried_losses
+        if previous_statement else None,
+        sink=sink,
+        retain=retain)
+    statements.append(statement)
+    previous_statement = statement
+  return statements
+
+
+def build_statements(transactions, sink=None, previous=None, on_close=None):
+  """
+  Process transactions into statements of all financial years, in the order they're opened.
+  A transaction goes to the statement of its financial year if there is one already,
+  so transactions don't have to be in datetime order.
+  previous, e.g. a Checkpoint, has financial_year, portfolio and carried_losses of the year to carry on from.
+  on_close is called with each statement a statement of a later year is opened after,
+  which for transactions in datetime order means the year is complete,
+  and the number of transactions processed by then.
+  """
+  statements = []
+  statements_dict = {}
+  for processed, tran in enumerate(transactions):
+    statement = statements_dict.get(tran.financial_year)
+    if not statement:
+      # new financial year, create new statement
+      last = statements[-1] if statements else previous
+      opened = open_statements(last, tran.financial_year, sink)
+      if on_close and statements and opened[0].financial_year > last.financial_year:
+        on_close(last, processed)
+      for statement in opened:
+        if on_close and statement is not opened[-1]:
+          on_close(statement, processed)
+        statements.append(statement)
+        statements_dict[statement.financial_year] = statement
+    statement.process_transaction(tran)
+  return statements
+
+
+def stream_statements(transactions, sink=None):
+  """
+  Process transactions in datetime order one at a time, yielding the statement of each
+  financial year as soon as it's closed, i.e. when a transaction of a later year comes, and the last one at the end.
+  Statements keep only their sums, no transactions or gains/losses, and hand their portfolio on
+  to the next year, so a statement must be reported before going on with the iteration.
+  """
+  statement = None
+  for tran in transactions:
+    if statement is None or tran.financial_year != statement.financial_year:
+      if statement and tran.financial_year < statement.financial_year:
+        raise Exception('Transaction of financial year {} after financial year {} is closed, streaming needs transactions in datetime order'.format(
+            tran.financial_year, statement.financial_year))
+      opened = open_statements(statement, tran.financial_year, sink, retain=False)
+      if statement:
+        yield statement
+      for missing_statement in opened[:-1]:
+        yield missing_statement
+      statement = opened[-1]
+    statement.process_transaction(tran)
+  if statement:
+    yield statement
+
+
+def matching_cryptos(tran):
+  """
+  (crypto tran acquires, crypto tran disposes of), either None when it doesn't,
+  the same cryptos whose open lots Portfolio and AnnualStatement would touch processing tran
+  """
+  if tran.operation in ['buy', 'sell']:
+    acquired = tran.left2right[1] if tran.left2right[1] in CRYPTOS else None
+    disposed = tran.left2right[0] if tran.left2right[0] in CRYPTOS else None
+    return acquired, disposed
+  if tran.operation in ['deposit', 'withdrawal']:
+    for crypto in CRYPTOS:
+      crypto_fee_field = 'fee_{}'.format(crypto.lower())
+      if crypto_fee_field in tran and tran[crypto_fee_field] > 0:
+        return None, crypto
+  elif tran.operation == 'loss':
+    for crypto in CRYPTOS:
+      cryptofield = crypto.lower()
+      if hasattr(tran, cryptofield) and getattr(tran, cryptofield) > 0:
+        return None, crypto
+  return None, None
+
+
+def match_partition(partition):
+  """
+  Match the transactions of one crypto against its open lots, in a worker process of build_statements_partitioned.
+  partition is (crypto, open lots to start from or None, [(index, tran, acquires)], financial years).
+  A transaction acquiring the crypto opens a position, any other disposes of it.
+  Stops at the first transaction failing, whose exception is given as its result.
+  return ({index: gain/loss events or exception}, open lots at the end of each financial year so far)
+  """
+  crypto, open_lots, items, years = partition
+  portfolio = Portfolio.from_open_lots(Portfolio(), {crypto: open_lots}) if open_lots is not None else Portfolio()
+  results = {}
+  year_ends = []
+  for index, tran, acquires in items:
+    while tran.financial_year > years[len(year_ends)]:
+      # year closed, its portfolio stays as it is and the next year goes on with a snapshot
+      year_ends.append(portfolio[crypto])
+      portfolio = portfolio.snapshot()
+    try:
+      if acquires:
+        portfolio.process_acquisition(tran)
+      elif tran.operation in ['buy', 'sell']:
+        results[index] = portfolio.process_disposal(tran)
+      elif tran.operation in ['deposit', 'withdrawal']:
+        results[index] = portfolio.process_deposit_withdrawal_transaction(tran)
+      else:
+        results[index] = portfolio.dispose_as_loss(crypto, tran)
+    except Exception as exp:
+      results[index] = exp
+      return results, year_ends
+  while len(year_ends) < len(years):
+    year_ends.append(portfolio[crypto])
+  return results, year_ends
+
+
+class MatchedPortfolio(object):
+  """
+  Stands in for the portfolio of a statement while build_statements_partitioned processes its transactions,
+  giving out the gain/loss events matched in the partitions, or raising the exception matching failed with.
+  Transactions touching no open lots (fiat fees, trades of no crypto) are processed by an empty portfolio.
+  """
+  def __init__(self, matched):
+    self._matched = matched
+    self._unmatched = Portfolio()
+
+  def _events(self, tran, unmatched):
+    result = self._matched.pop(id(tran), None)
+    if result is None:
+      return unmatched(tran)
+    if isinstance(result, Exception):
+      raise result
+    return result
+
+  def process_buy_sell_transaction(self, tran):
+    return self._events(tran, self._unmatched.process_buy_sell_transaction)
+
+  def process_deposit_withdrawal_transaction(self, tran):
+    return self._events(tran, self._unmatched.process_deposit_withdrawal_transaction)
+
+  def dispose_as_loss(self, crypto, tran):
+    return self._events(tran, lambda tran: self._unmatched.dispose_as_loss(crypto, tran))
+
+
+def match_workers(workers=MATCH_WORKERS):
+  """ number of processes to match open lots with, 1 means the serial engine """
+  if workers <= 0:
+    workers = os.cpu_count() or 1
+  return workers
+
+
+def build_statements_partitioned(transactions, sink=None, previous=None, on_close=None, workers=MATCH_WORKERS):
+  """
+  Same statements and events, in the same order, as build_statements for transactions in datetime order,
+  with open lots matched in a pool of workers processes, each crypto a partition of its own.
+  Matching of one crypto only depends on the transactions acquiring or disposing of it, so a crypto to crypto
+  trade goes to both partitions, opening a position in one and disposing in the other.
+  Events are then added up into statements in transaction order, and every statement gets the portfolio
+  of its year end put together from the partitions.
+  """
+  transactions = list(transactions)
+  if not transactions:
+    return []
+  first_year = previous.financial_year + 1 if previous else transactions[0].financial_year
+  years = list(range(first_year, transactions[-1].financial_year + 1))
+
+  items_of = {}
+  matched = {}
+  closed_year = previous.financial_year if previous else None
+  for index, tran in enumerate(transactions):
+    if closed_year is not None and tran.financial_year <= closed_year:
+      raise Exception('Transaction of financial year {} after financial year {} is closed, partitioned matching needs transactions in datetime order'.format(
+          tran.financial_year, closed_year))
+    closed_year = tran.financial_year - 1
+    acquired, disposed = matching_cryptos(tran)
+    if acquired or disposed:
+      # no events unless disposing, see below
+      matched[id(tran)] = []
+    if acquired:
+      items_of.setdefault(acquired, []).append((index, tran, True))
+    if disposed:
+      items_of.setdefault(disposed, []).append((index, tran, False))
+  base = previous.portfolio if previous else Portfolio()
+  # the biggest partitions first, so they don't end up waiting for a free worker last
+  cryptos = sorted(items_of, key=lambda crypto: len(items_of[crypto]), reverse=True)
+  partitions = [(crypto, base[crypto] if previous else None, items_of[crypto], years) for crypto in cryptos]
+
+  workers = max(1, min(match_workers(workers), len(partitions)))
+  logger.info('Matching {} cryptos with {} processes'.format(len(partitions), workers))
+  if workers == 1:
+    results = [match_partition(partition) for partition in partitions]
+  else:
+    from concurrent.futures import ProcessPoolExecutor # multiprocessing, only loaded when needed
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+      results = list(executor.map(match_partition, partitions))
+
+  for crypto, (events_of, _) in zip(cryptos, results):
+    for index, result in events_of.items():
+      # acquiring comes first, if it fails that's the failure processing the transaction raises
+      if not isinstance(matched[id(transactions[index])], Exception) or transactions[index].left2right[1] == crypto:
+        matched[id(transactions[index])] = result
+  stand_in = MatchedPortfolio(matched)
+
+  statements = []
+  last = previous
+  tran_iter = iter(enumerate(transactions))
+  pending = next(tran_iter, None)
+  for year_index, year in enumerate(years):
+    statement = AnnualStatement(
+        financial_year=year,
+        portfolio=stand_in,
+        losses=last.carried_losses if last else None,
+        sink=sink)
+    while pending and pending[1].financial_year == year:
+      statement.process_transaction(pending[1])
+      pending = next(tran_iter, None)
+    statement.portfolio = Portfolio.from_open_lots(
+        base, {crypto: year_ends[year_index] for crypto, (_, year_ends) in zip(cryptos, results)})
+    if on_close and pending:
+      on_close(statement, pending[0])
+    statements.append(statement)
+    last = statement
+  return statements
@@ -0,0 +1,74 @@
+import os
+from ingest import read_transactions, stream_transactions, known_operations, merge_transactions
+from parse_cache import create_parse_cache
+from checkpoint import create_checkpoint_store
+from cgt_engine import build_statements, build_statements_partitioned, stream_statements, match_workers
+from event_sink import create_event_sink
+from shared_def import SORT_BY_DATETIME_ASC, INGEST_WORKERS, CHECKPOINT_DIR
+
+
+def open_report_file(destination=None):
+  """
+  Open the file of a report destination given on the command line, as create_event_sink takes them:
+  '-' or None for stdout (None returned), 'none' to discard the summaries, anything else is a file path
+  """
+  if destination in (None, '-'):
+    return None
+  if destination == 'none':
+    return open(os.devnull, 'w')
+  return open(destination, 'w')
+
+
+def process_cgt_report(csv_files, events_destination=None, report_destination=None, stream=False,
+                       workers=INGEST_WORKERS, checkpoint_dir=CHECKPOINT_DIR, transactions=None):
+  """Process CSV files and generate CGT reports
+
+  Gain/loss events go to events_destination and the annual summaries to report_destination,
+  see create_event_sink and open_report_file, both default to stdout with all events ahead of the summaries.
+  Events written before a failure are still written out, the sink is closed either way.
+  With stream, transactions are read and processed one at a time and each financial year
+  is written out as soon as it's closed, its events ahead of its summary.
+  Otherwise financial years closed are checkpointed when a checkpoint directory is configured,
+  and a later run over the same transactions plus newer ones carries on from the last checkpoint.
+  workers is the number of processes to parse the files with, see ingest_workers.
+  With match_workers above 1, open lots are matched per crypto in parallel, see build_statements_partitioned.
+  transactions, e.g. transformed from exchange logs by transform_exchange_logs, are processed along with
+  the files' without going through a CSV file; they're in datetime order and come after the files' at the same datetime.
+  """
+  in_memory = [known_operations(transactions)] if transactions else []
+  sink = create_event_sink(events_destination)
+  report_file = None
+  try:
+    sink.write_header()
+    report_file = open_report_file(report_destination)
+    if stream:
+      source = stream_transactions(csv_files)
+      if in_memory:
+        source = merge_transactions([source] + in_memory)
+      for statement in stream_statements(source, sink):
+        # year closed, its events then its summary
+        sink.flush()
+        statement.report(report_file)
+    else:
+      transactions = read_transactions(csv_files, workers, cache=create_parse_cache())
+      if in_memory:
+        transactions = merge_transactions([transactions] + in_memory)
+      build = build_statements
+      if SORT_BY_DATETIME_ASC and match_workers() > 1:
+        build = build_statements_partitioned
+      store = create_checkpoint_store(checkpoint_dir) if SORT_BY_DATETIME_ASC else None
+      checkpoints = []
+      if store:
+        checkpoints, statements = store.run(transactions, sink, build)
+      else:
+        statements = build(transactions, sink)
+      # events ahead of the summaries
+      sink.flush()
+      for checkpoint in checkpoints:
+        print(checkpoint.report, end='', file=report_file)
+      for statement in statements:
+        statement.report(report_file)
+  finally:
+    sink.close()
+    if report_file:
+      report_file.close()
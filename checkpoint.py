@@ -0,0 +1,155 @@
+import io
+import os
+import json
+import pickle
+import hashlib
+import tempfile
+from collections import namedtuple
+from config_loader import get_config
+from shared_def import CHECKPOINT_DIR
+from logger import logger
+
+# bump when what's pickled in a checkpoint changes shape, so older checkpoints are no longer picked up
+CHECKPOINT_VERSION = 1
+
+# digest of no transaction at all, where the rolling digest of the input starts from
+INITIAL_DIGEST = hashlib.sha256(b'pycgt').hexdigest()
+
+
+class Checkpoint(namedtuple('Checkpoint', [
+    'financial_year', 'watermark', 'digest', 'portfolio', 'carried_losses', 'rows', 'report'])):
+  """
+  State at the close of a financial year: its open lots (portfolio) and carried losses to carry on from,
+  the input watermark, i.e. number of transactions (in datetime order) processed up to the close,
+  and the rolling digest of those transactions, plus the event rows and report of the year to replay.
+  It can stand in for the closed AnnualStatement when opening the next one, see open_statements.
+  """
+  __slots__ = ()
+
+
+def roll_digest(digest, tran):
+  """ rolling digest of the transactions so far followed by tran """
+  state = tran.__getstate__()
+  return hashlib.sha256(
+      digest.encode('ascii') + repr(state[:-1]).encode('utf-8') + state[-1]).hexdigest()
+
+
+def config_digest():
+  """ hash of the whole config, anything in it may change results """
+  relevant = {'version': CHECKPOINT_VERSION, 'config': get_config()}
+  return hashlib.sha256(json.dumps(relevant, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class CheckpointStore(object):
+  """
+  Checkpoints pickled in a directory of their own for every config, one file per financial year
+  """
+  def __init__(self, directory=CHECKPOINT_DIR):
+    self.directory = os.path.join(directory, config_digest()[:16])
+
+  def _path_of(self, financial_year):
+    return os.path.join(self.directory, 'fy{}.pickle'.format(financial_year))
+
+  def load_all(self):
+    """ all checkpoints saved, by financial year """
+    if not os.path.isdir(self.directory):
+      return []
+    checkpoints = []
+    for name in os.listdir(self.directory):
+      if not (name.startswith('fy') and name.endswith('.pickle')):
+        continue
+      try:
+        with open(os.path.join(self.directory, name), 'rb') as saved:
+          checkpoints.append(pickle.load(saved))
+      except Exception as exp:
+        logger.warning('Ignored unreadable checkpoint {}: {}'.format(name, exp))
+    return sorted(checkpoints, key=lambda item: item.financial_year)
+
+  def save(self, checkpoint):
+    """ written to a temp file first so a run killed meanwhile leaves no half written checkpoint """
+    os.makedirs(self.directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix='.fy-', dir=self.directory)
+    try:
+      with os.fdopen(fd, 'wb') as temp_file:
+        pickle.dump(checkpoint, temp_file, pickle.HIGHEST_PROTOCOL)
+      os.replace(temp_path, self._path_of(checkpoint.financial_year))
+    except BaseException:
+      os.remove(temp_path)
+      raise
+
+  def invalidate(self, checkpoints):
+    for checkpoint in checkpoints:
+      logger.info('Invalidated checkpoint of financial year {}'.format(checkpoint.financial_year))
+      os.remove(self._path_of(checkpoint.financial_year))
+
+  def resume(self, transactions):
+    """
+    Checkpoints the transactions (in datetime order) can carry on from, i.e. whose watermark and digest
+    match the transactions and after which only transactions of later years come,
+    the others are invalidated. return (checkpoints, rest of transactions)
+    """
+    checkpoints = self.load_all()
+    valid = []
+    digest = INITIAL_DIGEST
+    index = 0
+    for checkpoint in checkpoints:
+      if checkpoint.watermark > len(transactions):
+        break
+      while index < checkpoint.watermark:
+        digest = roll_digest(digest, transactions[index])
+        index += 1
+      if digest != checkpoint.digest:
+        break
+      if index < len(transactions) and transactions[index].financial_year <= checkpoint.financial_year:
+        # a transaction came into the year after it was closed
+        break
+      valid.append(checkpoint)
+    self.invalidate(checkpoints[len(valid):])
+    if valid:
+      logger.info('Resuming from checkpoint of financial year {} at transaction {}'.format(
+          valid[-1].financial_year, valid[-1].watermark))
+    return valid, transactions[valid[-1].watermark if valid else 0:]
+
+  def run(self, transactions, sink, build=None):
+    """
+    Process transactions (in datetime order) into statements by build (build_statements by default),
+    carrying on from the checkpoints still valid and checkpointing every financial year closed on the way.
+    Events of the checkpointed years are replayed to sink first.
+    return (checkpoints carried on from, statements of the years processed)
+    """
+    from cgt_engine import build_statements
+    from event_sink import RecordingSink
+
+    transactions = list(transactions)
+    checkpoints, rest = self.resume(transactions)
+    for checkpoint in checkpoints:
+      sink.write_rows(checkpoint.rows)
+    previous = checkpoints[-1] if checkpoints else None
+    recording = RecordingSink(sink)
+    start = previous.watermark if previous else 0
+    # watermark and digest of the last checkpoint saved, rolled on to each one next
+    rolled = [start, previous.digest if previous else INITIAL_DIGEST]
+
+    def on_close(statement, processed):
+      watermark = start + processed
+      for tran in transactions[rolled[0]:watermark]:
+        rolled[1] = roll_digest(rolled[1], tran)
+      rolled[0] = watermark
+      report = io.StringIO()
+      statement.report(report)
+      self.save(Checkpoint(
+          financial_year=statement.financial_year,
+          watermark=watermark,
+          digest=rolled[1],
+          portfolio=statement.portfolio,
+          carried_losses=statement.carried_losses,
+          rows=recording.pop_rows(statement.financial_year),
+          report=report.getvalue()))
+
+    statements = (build or build_statements)(rest, recording, previous=previous, on_close=on_close)
+    return checkpoints, statements
+
+
+def create_checkpoint_store(directory=CHECKPOINT_DIR):
+  """ CheckpointStore of directory, None when checkpoints are off (no directory configured) """
+  return CheckpointStore(directory) if directory else None
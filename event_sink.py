@@ -0,0 +1,145 @@
+import sys
+from gain_loss import CSV_HEADER
+from transaction import financial_year_of
+
+
+class EventSink(object):
+  """
+  Destination of gain/loss event rows.
+  Rows may be buffered, they're only guaranteed to be written out after flush or close.
+  """
+  def write_header(self):
+    pass
+
+  def write(self, event):
+    raise NotImplementedError
+
+  def write_rows(self, rows):
+    """ write CSV rows serialized before, e.g. events of a run resumed from a checkpoint """
+    raise NotImplementedError
+
+  def flush(self):
+    pass
+
+  def close(self):
+    self.flush()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+    return False
+
+
+class NullSink(EventSink):
+  """ Discard all events, e.g. when only the summary report is wanted """
+  def write(self, event):
+    pass
+
+  def write_rows(self, rows):
+    pass
+
+
+class ListSink(EventSink):
+  """ Keep events in memory, in the order they're written """
+  def __init__(self):
+    self.events = []
+    self._written_rows = []
+
+  def write(self, event):
+    self.events.append(event)
+
+  def write_rows(self, rows):
+    self._written_rows.extend(rows)
+
+  @property
+  def rows(self):
+    """ rows written as is, then rows of the events """
+    return self._written_rows + [event.csv_row for event in self.events]
+
+
+class StreamSink(EventSink):
+  """ Write CSV rows to a text stream, buffer_rows rows at a time """
+  def __init__(self, stream, buffer_rows=4096):
+    self.stream = stream
+    self.buffer_rows = buffer_rows
+    self._rows = []
+
+  def write_header(self):
+    self._rows.append(CSV_HEADER)
+
+  def write(self, event):
+    rows = self._rows
+    rows.append(event.csv_row)
+    if len(rows) >= self.buffer_rows:
+      self.flush()
+
+  def write_rows(self, rows):
+    self._rows.extend(rows)
+    if len(self._rows) >= self.buffer_rows:
+      self.flush()
+
+  def flush(self):
+    if self._rows:
+      self._rows.append('')
+      self.stream.write('\n'.join(self._rows))
+      self._rows = []
+    self.stream.flush()
+
+
+class StdoutSink(StreamSink):
+  """ Write CSV rows to stdout """
+  def __init__(self, buffer_rows=4096):
+    super(StdoutSink, self).__init__(sys.stdout, buffer_rows)
+
+
+class CsvFileSink(StreamSink):
+  """ Write CSV rows to a file, which is closed with the sink """
+  def __init__(self, path, buffer_rows=4096):
+    super(CsvFileSink, self).__init__(open(path, 'w', newline=''), buffer_rows)
+    self.path = path
+
+  def close(self):
+    self.flush()
+    self.stream.close()
+
+
+class RecordingSink(EventSink):
+  """ Pass events on to sink, keeping their rows by the financial year the event happened in """
+  def __init__(self, sink):
+    self.sink = sink
+    self.rows_by_year = {}
+
+  def write_header(self):
+    self.sink.write_header()
+
+  def write(self, event):
+    row = event.csv_row
+    self.rows_by_year.setdefault(financial_year_of(event.right_date), []).append(row)
+    self.sink.write_rows([row])
+
+  def write_rows(self, rows):
+    self.sink.write_rows(rows)
+
+  def pop_rows(self, financial_year):
+    """ rows recorded for financial_year, no longer kept """
+    return self.rows_by_year.pop(financial_year, [])
+
+  def flush(self):
+    self.sink.flush()
+
+  def close(self):
+    self.sink.close()
+
+
+def create_event_sink(destination=None):
+  """
+  Create the sink of a destination given on the command line:
+  '-' or None for stdout, 'none' to discard events, anything else is a file path
+  """
+  if destination in (None, '-'):
+    return StdoutSink()
+  if destination == 'none':
+    return NullSink()
+  return CsvFileSink(destination)
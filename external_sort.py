@@ -0,0 +1,65 @@
+import os
+import sys
+import heapq
+import pickle
+import tempfile
+from logger import logger
+
+# items pickled together in a run file, so each pickle.load isn't for one item only
+CHUNK_ITEMS = 1024
+
+
+def _write_run(items, directory):
+  """ pickle sorted items into a new temp file of directory, return its path """
+  fd, path = tempfile.mkstemp(prefix='run-', suffix='.pickle', dir=directory)
+  with os.fdopen(fd, 'wb') as run_file:
+    for start in range(0, len(items), CHUNK_ITEMS):
+      pickle.dump(items[start:start + CHUNK_ITEMS], run_file, pickle.HIGHEST_PROTOCOL)
+  return path
+
+
+def _read_run(path):
+  """ items of a run file in order """
+  with open(path, 'rb') as run_file:
+    while True:
+      try:
+        chunk = pickle.load(run_file)
+      except EOFError:
+        break
+      yield from chunk
+
+
+def external_sort(items, key, memory_budget_mb, item_size=sys.getsizeof, directory=None):
+  """
+  Iterate items sorted by key, stable, keeping about memory_budget_mb of them in memory at a time.
+  Items are collected into runs up to the budget, every full run is sorted and pickled to a temp
+  file in directory, then all runs are merged. When all items fit in one run nothing is written.
+  item_size gives the approximate bytes an item takes in memory, it's sampled once per run.
+  """
+  budget = memory_budget_mb * 1024 * 1024
+  temp_dir = None
+  runs = []
+  run = []
+  run_limit = None
+  try:
+    for item in items:
+      if run_limit is None:
+        run_limit = max(1, budget // max(1, item_size(item)))
+      run.append(item)
+      if len(run) >= run_limit:
+        if temp_dir is None:
+          temp_dir = tempfile.TemporaryDirectory(prefix='pycgt-sort-', dir=directory)
+        run.sort(key=key)
+        runs.append(_write_run(run, temp_dir.name))
+        run = []
+        run_limit = None
+    run.sort(key=key)
+    if not runs:
+      yield from run
+      return
+    logger.info('Merging {} sorted runs spilled to {}'.format(len(runs) + (1 if run else 0), temp_dir.name))
+    # runs go to merge in input order, which keeps items of equal keys in input order
+    yield from heapq.merge(*[_read_run(path) for path in runs], run, key=key)
+  finally:
+    if temp_dir is not None:
+      temp_dir.cleanup()
@@ -1,8 +1,27 @@
-import copy
 from position import Position
 from transaction import Transaction
 from shared_def import LOCALE_FIAT
 
+LOCALE_FIAT_LOWER = LOCALE_FIAT.lower()
+
+# columns of a gain/loss event row, in the order brief_csv and csv_row give them
+CSV_COLUMNS = [
+    'gain_or_loss', 'datetime', LOCALE_FIAT_LOWER, 'discountable', 'description',
+    'buy_transaction.{}'.format(LOCALE_FIAT_LOWER),
+    'buy_transaction.volume', 'buy_transaction.datetime',
+    'buy_transaction.operation', 'buy_transaction.pair', 'buy_transaction.usd',
+    'position.asset', 'position.{}'.format(LOCALE_FIAT_LOWER), 'position.initial_volume',
+    'position.price', 'position.volume', 'matched',
+    'sell_transaction.{}'.format(LOCALE_FIAT_LOWER),
+    'sell_transaction.volume', 'sell_transaction.datetime',
+    'sell_transaction.operation', 'sell_transaction.pair',
+    'sell_transaction.usd']
+CSV_HEADER = ','.join(CSV_COLUMNS)
+
+_NA_TRANSACTION = ('N/A',) * 6
+_NA_POSITION = ('N/A',) * 5
+
+
 class GainLoss(dict):
   def __init__(self):
     super(GainLoss, self).__init__()
@@ -15,7 +34,10 @@ class GainLoss(dict):
 
   @property
   def discountable(self):
-    return (self.fiat > 0 and (self.right_date - self.left_date).days > 365)
+    """ computed once and cached until fiat or dates change """
+    if self._discountable is None:
+      self._discountable = (self.fiat > 0 and (self.right_date - self.left_date).days > 365)
+    return self._discountable
 
   @property
   def fiat(self):
@@ -25,6 +47,7 @@ class GainLoss(dict):
   @fiat.setter
   def fiat(self, value):
     self['fiat'] = value
+    self._discountable = None
 
   @property
   def gain(self):
@@ -36,7 +59,8 @@ class GainLoss(dict):
 
   @transaction.setter
   def transaction(self, value):
-    self['transaction'] = copy.deepcopy(value)
+    """ TransactionBrief of the disposal """
+    self['transaction'] = value
 
   @property
   def position(self):
@@ -44,7 +68,8 @@ class GainLoss(dict):
 
   @position.setter
   def position(self, value):
-    self['position'] = copy.deepcopy(value)
+    """ PositionBrief of the matched position before the disposal """
+    self['position'] = value
 
   @property
   def left_date(self):
@@ -53,6 +78,7 @@ class GainLoss(dict):
   @left_date.setter
   def left_date(self, value):
     self['left_date'] = value
+    self._discountable = None
 
   @property
   def right_date(self):
@@ -61,6 +87,7 @@ class GainLoss(dict):
   @right_date.setter
   def right_date(self, value):
     self['right_date'] = value
+    self._discountable = None
 
   @property
   def description(self):
@@ -122,3 +149,22 @@ class GainLoss(dict):
     ]
 
     return ','.join(row)
+
+  @property
+  def csv_row(self):
+    """ the same line as brief_csv, serialized straight from the briefs without building dicts """
+    position = self.position
+    if position:
+      buy = position.transaction
+      buy_fields = (buy.fiat, buy.volume, buy.datetime, buy.operation, buy.pair, buy.usd)
+      position_fields = (position.asset, position.fiat, position.initial_volume, position.price, position.volume)
+    else:
+      buy_fields = _NA_TRANSACTION
+      position_fields = _NA_POSITION
+    sell = self.transaction
+    sell_fields = (sell.fiat, sell.volume, sell.datetime, sell.operation, sell.pair, sell.usd) if sell else _NA_TRANSACTION
+    gain = self.gain
+    return ','.join(map(str, (
+        'gain' if gain else 'loss', self.right_date, self.fiat,
+        'Yes' if self.discountable else 'No' if gain else 'N/A', self.description)
+        + buy_fields + position_fields + (self.matched,) + sell_fields))
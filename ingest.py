@@ -0,0 +1,159 @@
+import os
+import sys
+import csv
+import heapq
+import itertools
+import pprint
+from operator import attrgetter
+from transaction import Transaction, DatetimeParser
+from external_sort import external_sort
+from shared_def import SORT_BY_DATETIME_ASC, OPERATIONS, FIELDS, INGEST_WORKERS, SORT_MEMORY_BUDGET_MB
+from logger import logger
+
+pp = pprint.PrettyPrinter(indent=2, width=100, compact=True)
+
+by_datetime = attrgetter('datetime')
+
+
+def iter_csv_file(path):
+  """ Transactions of a pycgt CSV file in file order, parsed one row at a time """
+  with open(path, 'r') as csvfile:
+    csvcontent = csv.reader(csvfile, delimiter=',', quotechar='"')
+    attrs = None
+    operidx = None
+    parse_datetime = DatetimeParser() # detects the datetime format of this file
+    for index, row in enumerate(csvcontent):
+      if index == 0:
+        # parse header
+        attrs = list(map(lambda x: '' if x not in FIELDS else FIELDS[x], row))
+        operidx = next(i for i, v in enumerate(attrs) if v == 'operation')
+        continue
+      values = list(map(lambda x: x.strip(), row))
+      if str(values[operidx]).lower() not in OPERATIONS:
+        continue
+      try:
+        tran = Transaction.createFrom(attrs=attrs, values=values, parse_datetime=parse_datetime)
+      except BaseException as exp:
+        logger.error(pp.pformat(exp))
+        raise
+      yield tran
+
+
+def known_operations(transactions):
+  """ transactions built in memory, e.g. by transformers, without the ones iter_csv_file would skip """
+  return [tran for tran in transactions if tran.operation in OPERATIONS]
+
+
+def merge_transactions(streams):
+  """ transactions of streams each in datetime order, merged the way read_transactions merges files """
+  if not SORT_BY_DATETIME_ASC:
+    return itertools.chain.from_iterable(streams)
+  return heapq.merge(*streams, key=by_datetime)
+
+
+def parse_csv_file(path):
+  """
+  Parse transactions of a pycgt CSV file in file order
+  return (transactions, ordered), ordered tells whether they're already in datetime order
+  """
+  transactions = []
+  ordered = True
+  last_datetime = None
+  for tran in iter_csv_file(path):
+    if ordered and last_datetime is not None and tran.datetime < last_datetime:
+      ordered = False
+    last_datetime = tran.datetime
+    transactions.append(tran)
+  return transactions, ordered
+
+
+def iter_ordered_csv_file(path):
+  """ iter_csv_file, raising once a transaction comes earlier than the one before """
+  last_datetime = None
+  for tran in iter_csv_file(path):
+    if last_datetime is not None and tran.datetime < last_datetime:
+      raise Exception('{} is not in datetime order at {}, sort it first to stream it'.format(path, tran.datetime))
+    last_datetime = tran.datetime
+    yield tran
+
+
+def ingest_workers(file_count, workers=INGEST_WORKERS):
+  """ number of processes to parse file_count files with, 1 means parsing in this process """
+  if workers <= 0:
+    workers = os.cpu_count() or 1
+  return max(1, min(workers, file_count))
+
+
+def parse_csv_files(csv_files, workers=INGEST_WORKERS, cache=None):
+  """
+  parse each file with parse_csv_file, concurrently in a process pool when more than one worker,
+  files cached by cache (a ParseCache) are loaded instead and the others cached once parsed
+  """
+  parsed = [None] * len(csv_files)
+  cache_paths = [None] * len(csv_files)
+  if cache:
+    for index, item in enumerate(csv_files):
+      cache_paths[index] = cache.path_of(item)
+      parsed[index] = cache.load(cache_paths[index])
+      if parsed[index] is not None:
+        logger.info('Loaded parsed {} from {}'.format(item, cache_paths[index]))
+  missing = [index for index, item in enumerate(parsed) if item is None]
+
+  workers = ingest_workers(len(missing), workers)
+  if workers == 1:
+    results = [parse_csv_file(csv_files[index]) for index in missing]
+  else:
+    logger.info('Parsing {} files with {} processes'.format(len(missing), workers))
+    from concurrent.futures import ProcessPoolExecutor # multiprocessing, only loaded when needed
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+      results = list(executor.map(parse_csv_file, [csv_files[index] for index in missing]))
+
+  for index, result in zip(missing, results):
+    parsed[index] = result
+    if cache:
+      cache.store(cache_paths[index], result)
+  return parsed
+
+
+def read_transactions(csv_files, workers=INGEST_WORKERS, cache=None):
+  """
+  Transactions of all files, in datetime order when SORT_BY_DATETIME_ASC.
+  Files are merged k-way, only a file not in order is sorted first. Transactions at the same
+  datetime keep the order of the files given and then of the rows in a file, the same
+  order a stable sort of all the files concatenated gives.
+  cache, a ParseCache, saves parsing files parsed before.
+  """
+  parsed = parse_csv_files(csv_files, workers, cache)
+  if not SORT_BY_DATETIME_ASC:
+    return [tran for transactions, _ in parsed for tran in transactions]
+  streams = []
+  for path, (transactions, ordered) in zip(csv_files, parsed):
+    if not ordered:
+      logger.info('{} is not in datetime order, sorting it'.format(path))
+      transactions.sort(key=by_datetime)
+    streams.append(transactions)
+  if len(streams) == 1:
+    return streams[0]
+  return heapq.merge(*streams, key=by_datetime)
+
+
+def transaction_size(tran):
+  """ approximate bytes a parsed transaction takes in memory """
+  return sys.getsizeof(tran) + sys.getsizeof(tran._values) + sum(sys.getsizeof(value) for value in (
+      tran._type, tran.exchange, tran.datetime, tran.operation, tran.pair, tran.comments, tran.lot))
+
+
+def stream_transactions(csv_files, memory_budget_mb=SORT_MEMORY_BUDGET_MB):
+  """
+  Transactions of all files one at a time, in the same order read_transactions gives.
+  With a memory budget they're sorted by an external merge sort, spilling sorted runs
+  to temp files once over budget, otherwise each file has to be in datetime order already
+  and files are merged without reading any of them in whole.
+  """
+  if not SORT_BY_DATETIME_ASC:
+    return itertools.chain.from_iterable(iter_csv_file(item) for item in csv_files)
+  if memory_budget_mb > 0:
+    # sorting files in the order given, stable, is the same as merging them sorted
+    transactions = itertools.chain.from_iterable(iter_csv_file(item) for item in csv_files)
+    return external_sort(transactions, by_datetime, memory_budget_mb, item_size=transaction_size)
+  return heapq.merge(*[iter_ordered_csv_file(item) for item in csv_files], key=by_datetime)
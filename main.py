@@ -1,13 +1,11 @@
 import sys
 import pprint
-import csv
-import copy
 import argparse
-from transaction import Transaction
-from annual_statement import AnnualStatement
-from shared_def import SORT_BY_DATETIME_ASC, OPERATIONS, FIELDS, LOCALE_FIAT
+from cgt_report import process_cgt_report
+from shared_def import RATE_BUNDLE_SLOTS_PER_DAY
 
-from transformer import get_transformer
+# transformers, market data providers (and requests) and batch processing are imported
+# by the modes using them, a report run doesn't load them
 from logger import logger
 from utils import generate_default_output_filename
 
@@ -15,89 +13,14 @@ from utils import generate_default_output_filename
 pp = pprint.PrettyPrinter(indent=2, width=100, compact=True)
 
 
-def process_cgt_report(csv_files):
-  """Process CSV files and generate CGT reports"""
-  statements = []
-  statements_dict = {}
-  locale_fiat_lower = LOCALE_FIAT.lower()
-  print('{},{},{},{},{},{},{},{},{},{},{},{},{},{},{},{},{},{},{},{},{},{},{}'.format(
-      'gain_or_loss', 'datetime', locale_fiat_lower, 'discountable', 'description',
-      'buy_transaction.{}'.format(locale_fiat_lower),
-      'buy_transaction.volume', 'buy_transaction.datetime',
-      'buy_transaction.operation', 'buy_transaction.pair', 'buy_transaction.usd',
-      'position.asset', 'position.{}'.format(locale_fiat_lower), 'position.initial_volume',
-      'position.price', 'position.volume', 'matched',
-      'sell_transaction.{}'.format(locale_fiat_lower),
-      'sell_transaction.volume', 'sell_transaction.datetime',
-      'sell_transaction.operation', 'sell_transaction.pair',
-      'sell_transaction.usd'))
-
-  parsed_trans = []
-  for item in csv_files:
-    with open(item, 'r') as csvfile:
-      csvcontent = csv.reader(csvfile, delimiter=',', quotechar='"')
-      attrs = None
-      for index, row in enumerate(csvcontent):
-        if index == 0:
-          # parse header
-          attrs = list(map(lambda x: '' if x not in FIELDS else FIELDS[x], row))
-        else:
-          values = list(map(lambda x: x.strip(), row))
-          operidx = next(i for i, v in enumerate(attrs) if v == 'operation')
-          current_trans = None
-          if str(values[operidx]).lower() in OPERATIONS:
-            try:
-              current_trans = Transaction.createFrom(attrs=attrs, values=values)
-            except BaseException as exp:
-              logger.error(pp.pformat(exp))
-              raise
-            parsed_trans.append(current_trans)
-          else:
-            continue
-
-  if SORT_BY_DATETIME_ASC:
-    parsed_trans.sort(key=lambda x: x.datetime)
-  for tran in parsed_trans:
-    statement = statements_dict.get(tran.financial_year)
-    if statement:
-      statement.process_transaction(tran)
-    else:
-      # new financial year, create new statement
-      previous_financial_year = statements[-1][0] if len(statements) else None 
-      previous_statement = statements[-1][1] if len(statements) else None
-      previous_portfolio = copy.deepcopy(
-          previous_statement.portfolio) if previous_statement else None
-      if previous_financial_year and tran.financial_year - previous_financial_year > 1:
-        for missing_year in range(previous_financial_year + 1, tran.financial_year):
-          missing_statement = AnnualStatement(
-              financial_year=missing_year,
-              portfolio=previous_portfolio,
-              losses=previous_statement.carried_losses
-              if previous_statement else None)
-          statements.append((missing_year, missing_statement))
-          statements_dict[missing_year] = missing_statement
-          previous_statement = statements[-1][1]
-          previous_portfolio = copy.deepcopy(previous_statement.portfolio)
-
-      statement = AnnualStatement(
-          financial_year=tran.financial_year,
-          portfolio=previous_portfolio,
-          losses=previous_statement.carried_losses
-          if previous_statement else None)
-      statement.process_transaction(tran)
-      statements.append((tran.financial_year, statement))
-      statements_dict[tran.financial_year] = statement
-
-  for item in statements:
-    item[1].report()
-
-
 def transform_logs(csv_files, exchange_type, output_file):
   """Transform exchange logs to pycgt format"""
 
   logger.info(f"Transforming {len(csv_files)} file(s) from {exchange_type} format to pycgt format")
   logger.info(f"Output will be written to: {output_file}")
 
+  from transformer import get_transformer
+
   try:
     transformer = get_transformer(exchange_type, csv_files, output_file)
     transformer.transform()
@@ -110,6 +33,43 @@ def transform_logs(csv_files, exchange_type, output_file):
     raise
 
 
+def exchange_inputs(parser, exchanges):
+  """
+  split -x values into the exchange logs given as exchange=file, and the exchanges given bare
+  return (list of (exchange, file), list of exchanges)
+  """
+  inputs = []
+  bare = []
+  for value in exchanges or []:
+    exchange, sep, path = value.partition('=')
+    if not sep:
+      bare.append(value)
+    elif not exchange or not path:
+      parser.error(f'-x/--exchange {value}: expected EXCHANGE=FILE')
+    else:
+      inputs.append((exchange, path))
+  if inputs and bare:
+    parser.error('-x/--exchange takes either one EXCHANGE for the FILE(s) or EXCHANGE=FILE inputs, not both')
+  return inputs, bare
+
+
+def transform_and_report(exchange_files, output_file, csv_files, events_destination, report_destination, stream):
+  """Transform exchange logs in memory and generate the CGT report of them along with pycgt CSV files"""
+
+  logger.info(f"Transforming {len(exchange_files)} exchange log(s) in memory")
+  if output_file:
+    logger.info(f"Transformed transactions will also be written to: {output_file}")
+
+  from transformer import transform_exchange_logs
+
+  try:
+    transactions = transform_exchange_logs(exchange_files, output_file)
+  except ValueError as e:
+    logger.error(str(e))
+    sys.exit(1)
+  process_cgt_report(csv_files, events_destination, report_destination, stream, transactions=transactions)
+
+
 def main():
   """Main entry point with argument parsing"""
   parser = argparse.ArgumentParser(
@@ -125,23 +85,79 @@ Examples:
 
   # Transform with auto-generated output filename:
   python main.py -t -x bitstamp input.csv
+
+  # Transform exchange logs and generate the CGT report in one go, no intermediate CSV:
+  python main.py -x nexo=nexo.csv -x bitstamp=bitstamp.csv
+
+  # Same, also keeping the transformed transactions, and adding a pycgt-formatted CSV file:
+  python main.py -x nexo=nexo.csv -o transformed.csv adjustments.csv
+
+  # Write gain/loss events and annual summaries to separate files:
+  python main.py --events events.csv --report report.txt file1.csv
+
+  # Stream files in bounded memory, sorted within sort_memory_budget_mb, writing out each year as it closes:
+  python main.py --stream file1.csv file2.csv
+
+  # Process all client ledgers of a manifest, each into its own output directory:
+  python main.py --batch manifest.toml
+
+  # Build or update the offline rate bundle from CSV files of pair,datetime,rate:
+  python main.py --build-rate-bundle rate-bundle rates.csv
       """)
 
-  parser.add_argument('files', nargs='+', metavar='FILE',
+  parser.add_argument('files', nargs='*', metavar='FILE',
                       help='CSV file(s) to process')
   parser.add_argument('-t', '--transform', action='store_true',
                       help='Transform exchange logs to pycgt format')
-  parser.add_argument('-x', '--exchange', type=str, metavar='EXCHANGE',
-                      help='Exchange type (e.g., bitstamp) - required with -t')
+  parser.add_argument('-x', '--exchange', type=str, metavar='EXCHANGE[=FILE]', action='append',
+                      help='Exchange type (e.g., bitstamp) - required with -t; EXCHANGE=FILE, repeatable, '
+                           'transforms FILE in memory and generates the CGT report of it')
   parser.add_argument('-o', '--output', type=str, metavar='OUTPUT',
-                      help='Output filename for transformed CSV (default: [first-input]-transformed-[random].csv)')
+                      help='Output filename for transformed CSV (default with -t: [first-input]-transformed-[random].csv, '
+                           'none written with EXCHANGE=FILE inputs)')
+  parser.add_argument('--events', type=str, metavar='DEST',
+                      help="Where to write gain/loss event rows: a CSV file, '-' for stdout (default) or 'none' to discard them")
+  parser.add_argument('--report', type=str, metavar='DEST',
+                      help="Where to write annual summaries: a file, '-' for stdout (default) or 'none' to discard them")
+  parser.add_argument('--stream', action='store_true',
+                      help='Process transactions one at a time in bounded memory, sorted by an external merge sort within '
+                           'sort_memory_budget_mb. Without it, and with --batch, all transactions are held and sorted in memory; '
+                           'exchange logs given with -x are transformed in memory either way')
+  parser.add_argument('--batch', type=str, metavar='MANIFEST',
+                      help='Process the ledgers listed in a TOML manifest in a pool of processes, each into its own output directory')
+  parser.add_argument('--build-rate-bundle', type=str, metavar='BUNDLE_DIR',
+                      help='Build or update the offline rate bundle in BUNDLE_DIR from CSV files of pair,datetime,rate')
 
   args = parser.parse_args()
 
+  if args.batch:
+    if args.files or args.transform or args.exchange or args.output or args.events or args.report or args.stream:
+      parser.error('--batch takes no files or other options, ledgers are listed in the manifest')
+    from batch import process_batch
+    failures = process_batch(args.batch)
+    for name, error in failures.items():
+      logger.error(f"Ledger {name} failed: {error}")
+    sys.exit(1 if failures else 0)
+  if args.build_rate_bundle:
+    if not args.files:
+      parser.error('the following arguments are required: FILE')
+    if args.transform or args.exchange or args.output or args.events or args.report or args.stream:
+      parser.error('--build-rate-bundle takes CSV files of rates only, no other options')
+    from market_data_provider.rate_bundle import build_rate_bundle
+    pairs = build_rate_bundle(args.build_rate_bundle, args.files, RATE_BUNDLE_SLOTS_PER_DAY)
+    logger.info(f"Rate bundle {args.build_rate_bundle} updated with {', '.join(pairs)}")
+    return
+
+  inputs, exchanges = exchange_inputs(parser, args.exchange)
+  if not args.files and not inputs:
+    parser.error('the following arguments are required: FILE')
+
   # Validate transform mode arguments
   if args.transform:
-    if not args.exchange:
-      parser.error('-t/--transform requires -x/--exchange to be specified')
+    if len(exchanges) != 1:
+      parser.error('-t/--transform requires one -x/--exchange to be specified')
+    if args.events or args.report or args.stream:
+      parser.error('--events, --report and --stream cannot be used with -t/--transform')
 
     # Generate default output filename if not provided
     output_file = args.output
@@ -149,12 +165,15 @@ Examples:
       output_file = generate_default_output_filename(args.files[0])
       logger.info(f"No output file specified, using default: {output_file}")
 
-    transform_logs(args.files, args.exchange, output_file)
+    transform_logs(args.files, exchanges[0], output_file)
+  elif inputs:
+    # One-shot mode: exchange logs transformed in memory straight into the CGT report
+    transform_and_report(inputs, args.output, args.files, args.events, args.report, args.stream)
   else:
     # Default mode: CGT report generation
     if args.exchange or args.output:
-      parser.error('-x/--exchange and -o/--output can only be used with -t/--transform')
-    process_cgt_report(args.files)
+      parser.error('-x/--exchange and -o/--output can only be used with -t/--transform or EXCHANGE=FILE inputs')
+    process_cgt_report(args.files, args.events, args.report, args.stream)
 
 
 if __name__ == '__main__':
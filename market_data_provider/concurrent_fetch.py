@@ -0,0 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, TypeVar
+from shared_def import HTTP_MAX_CONCURRENCY
+
+T = TypeVar('T')
+
+
+def fetch_all(calls: List[Callable[[], T]]) -> List[T]:
+    """
+    Run fetches concurrently in threads and return their results in the order of calls.
+
+    Calls may fetch concurrently themselves, e.g. a pair query fetching its chunks, as threads
+    are cheap while waiting on round trips. What's capped is the number of requests in flight,
+    at HTTP_MAX_CONCURRENCY for all fetches together by the shared HttpSession.
+
+    Args:
+        calls: Functions taking no argument, each doing one fetch
+
+    Returns:
+        List of the results of calls, in the same order
+
+    Raises:
+        Exception: The exception of the first call failing in the order of calls,
+            calls not started yet are cancelled
+    """
+    if len(calls) <= 1:
+        return [call() for call in calls]
+    executor = ThreadPoolExecutor(max_workers=min(len(calls), HTTP_MAX_CONCURRENCY))
+    try:
+        futures = [executor.submit(call) for call in calls]
+        return [future.result() for future in futures]
+    except BaseException:
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown(wait=True)
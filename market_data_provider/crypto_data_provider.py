@@ -1,9 +1,13 @@
 from datetime import date, timedelta, datetime
-from typing import Dict, Optional
+from functools import partial
+from typing import Optional
 import requests
-from shared_def import REQUESTS_TIMEOUT
+from shared_def import CRYPTO_API_URL
 from logger import logger
 from .market_data_provider import MarketDataProvider
+from .http_session import HttpSession
+from .concurrent_fetch import fetch_all
+from .rate_series import RateSeries, MAX_FILL_DAYS
 from transaction import float_parser
 
 
@@ -17,16 +21,18 @@ class CryptoDataProvider(MarketDataProvider):
     Caller should convert USD to AUD using forex rates.
     """
 
-    BASE_URL = "https://www.bitstamp.net/api/v2"
+    BASE_URL = CRYPTO_API_URL
     MAX_LIMIT = 1000  # Bitstamp allows up to 1000 candles per request
 
     def __init__(self):
         """Initialize crypto data provider."""
+        self.http = HttpSession.shared()
         logger.info("Initialized CryptoDataProvider (Bitstamp API)")
 
-    def _query_chunked(self, pair: str, start_date: date, end_date: date) -> Dict[str, float]:
+    def _query_chunked(self, pair: str, start_date: date, end_date: date) -> RateSeries:
         """
-        Query crypto prices in chunks to handle date ranges > 1000 days.
+        Query crypto prices in chunks to handle date ranges > 1000 days,
+        all chunks fetched concurrently (see fetch_all) and combined in date order.
 
         Args:
             pair: Crypto pair (lowercase, e.g., 'btcusd')
@@ -34,32 +40,29 @@ class CryptoDataProvider(MarketDataProvider):
             end_date: End date
 
         Returns:
-            Dictionary with date strings as keys and rates as values
+            RateSeries of all chunks combined
         """
-        all_results = {}
+        chunks = []
         current_start = start_date
-        chunk_count = 0
 
         while current_start <= end_date:
-            # Calculate chunk end (999 days from start, or end_date if sooner)
-            chunk_end = current_start + timedelta(days=999)
+            # Calculate chunk end (MAX_LIMIT candles with the lookback of each chunk, or end_date if sooner)
+            chunk_end = current_start + timedelta(days=self.MAX_LIMIT - 1 - MAX_FILL_DAYS)
             if chunk_end > end_date:
                 chunk_end = end_date
 
-            chunk_count += 1
-            logger.info(f"Querying chunk {chunk_count}: {current_start} to {chunk_end}")
-
-            # Query this chunk
-            chunk_results = self._query_single_range(pair, current_start, chunk_end)
-            all_results.update(chunk_results)
+            logger.info(f"Querying chunk {len(chunks) + 1}: {current_start} to {chunk_end}")
+            chunks.append(partial(self._query_single_range, pair, current_start, chunk_end))
 
             # Move to next chunk
             current_start = chunk_end + timedelta(days=1)
 
-        logger.info(f"Retrieved {len(all_results)} total prices from {chunk_count} chunk(s) for {pair}")
+        all_results = RateSeries.combine(fetch_all(chunks))
+
+        logger.info(f"Retrieved {len(all_results)} total prices from {len(chunks)} chunk(s) for {pair}")
         return all_results
 
-    def _query_single_range(self, pair: str, start_date: date, end_date: date) -> Dict[str, float]:
+    def _query_single_range(self, pair: str, start_date: date, end_date: date) -> RateSeries:
         """
         Query a single date range from Bitstamp API.
 
@@ -69,11 +72,16 @@ class CryptoDataProvider(MarketDataProvider):
             end_date: End date
 
         Returns:
-            Dictionary with date strings as keys and rates as values
+            RateSeries from start_date to end_date, gaps filled, days at the start too
+            from the price of up to MAX_FILL_DAYS days before start_date
         """
         try:
+            # prices from MAX_FILL_DAYS days earlier, so a range starting on days with no candle
+            # gets them filled as a range starting earlier would, e.g. as the rate cache queries sub-ranges
+            fetch_start = start_date - timedelta(days=MAX_FILL_DAYS)
+
             # Convert dates to Unix timestamps
-            start_timestamp = int(datetime.combine(start_date, datetime.min.time()).timestamp())
+            start_timestamp = int(datetime.combine(fetch_start, datetime.min.time()).timestamp())
             end_timestamp = int(datetime.combine(end_date, datetime.max.time()).timestamp())
 
             # Build URL - Bitstamp uses format like "btcusd" (no separator)
@@ -85,8 +93,7 @@ class CryptoDataProvider(MarketDataProvider):
                 'end': end_timestamp
             }
 
-            response = requests.get(url, params=params, timeout=REQUESTS_TIMEOUT)
-            response.raise_for_status()
+            response = self.http.get(url, params=params)
             data = response.json()
 
             # Extract OHLC data
@@ -97,38 +104,13 @@ class CryptoDataProvider(MarketDataProvider):
             if not ohlc_data:
                 raise ValueError(f"No price data found for {pair} from {start_date} to {end_date}")
 
-            # Convert to date-keyed dictionary using close prices
+            # Close price of each day, missing days filled with the last known price
             results = {}
             for candle in ohlc_data:
                 candle_date = datetime.fromtimestamp(int(candle['timestamp'])).date()
-                date_str = candle_date.isoformat()
-                # Use close price for the day
-                results[date_str] = float_parser(candle['close'])
-
-            # Fill in any missing dates with last known price
-            last_price = None
-            current_date = start_date
-            last_price_reusing_count = 0
-            filled_results = {}
-
-            while current_date <= end_date:
-                date_str = current_date.isoformat()
-                if date_str in results:
-                    filled_results[date_str] = results[date_str]
-                    last_price = results[date_str]
-                    last_price_reusing_count = 0
-                elif last_price is not None:
-                    filled_results[date_str] = last_price
-                    last_price_reusing_count += 1
-
-                    if last_price_reusing_count > 4:
-                        raise ValueError(f"{last_price_reusing_count} consecutive days without {pair} price data (up to {date_str}). Check data source.")
-                    if last_price_reusing_count > 3:
-                        logger.warning(f"Reusing last known {pair} price for {last_price_reusing_count} consecutive days up to {date_str}.")
-
-                current_date += timedelta(days=1)
-
-            return filled_results
+                results[candle_date] = float_parser(candle['close'])
+            filled = RateSeries.from_observations(results, fetch_start, end_date).forward_fill(MAX_FILL_DAYS, pair)
+            return RateSeries(start_date.toordinal(), filled.values[MAX_FILL_DAYS:])
 
         except requests.RequestException as e:
             logger.error(f"Failed to fetch crypto data from Bitstamp API: {e}")
@@ -137,7 +119,7 @@ class CryptoDataProvider(MarketDataProvider):
             logger.error(f"Failed to parse crypto data response: {e}")
             raise
 
-    def query(self, pair: str, start_date: date, end_date: Optional[date] = None) -> Dict[str, float]:
+    def query(self, pair: str, start_date: date, end_date: Optional[date] = None) -> RateSeries:
         """
         Query crypto exchange rates for a given pair and date/date range.
 
@@ -150,7 +132,7 @@ class CryptoDataProvider(MarketDataProvider):
             end_date: End date for query (optional). If None, queries single date.
 
         Returns:
-            Dictionary with date strings as keys and rates as values
+            RateSeries of the date range, also a mapping of date strings to rates
 
         Raises:
             ValueError: If pair format is invalid
@@ -1,9 +1,13 @@
 from datetime import date, timedelta
-from typing import Dict, Optional
+from functools import partial
+from typing import Optional
 import requests
-from shared_def import REQUESTS_TIMEOUT, FOREX_QUERY_CHUNK_DAYS
+from shared_def import FOREX_QUERY_CHUNK_DAYS, FOREX_API_URL
 from logger import logger
 from .market_data_provider import MarketDataProvider
+from .http_session import HttpSession
+from .concurrent_fetch import fetch_all
+from .rate_series import RateSeries, MAX_FILL_DAYS
 from transaction import float_parser
 
 class ForexDataProvider(MarketDataProvider):
@@ -15,13 +19,14 @@ class ForexDataProvider(MarketDataProvider):
     Data source: European Central Bank
     """
 
-    BASE_URL = "https://api.frankfurter.app"
+    BASE_URL = FOREX_API_URL
 
     def __init__(self):
         """Initialize forex data provider."""
+        self.http = HttpSession.shared()
         logger.info("Initialized ForexDataProvider (Frankfurter API)")
 
-    def _query_single_range(self, pair: str, base_currency: str, target_currency: str, start_date: date, end_date: date) -> Dict[str, float]:
+    def _query_single_range(self, pair: str, base_currency: str, target_currency: str, start_date: date, end_date: date) -> RateSeries:
         """
         Query a single date range from Frankfurter API.
 
@@ -33,7 +38,8 @@ class ForexDataProvider(MarketDataProvider):
             end_date: End date
 
         Returns:
-            Dictionary with date strings as keys and rates as values
+            RateSeries from start_date to end_date, gaps filled, days at the start too
+            from the rate of the last business day before start_date
         """
         try:
             if start_date == end_date:
@@ -46,43 +52,25 @@ class ForexDataProvider(MarketDataProvider):
                 'to': target_currency
             }
 
-            response = requests.get(url, params=params, timeout=REQUESTS_TIMEOUT)
-            response.raise_for_status()
+            response = self.http.get(url, params=params)
             data = response.json()
 
-            results = {}
-
             if start_date == end_date:
                 rate = data.get('rates', {}).get(target_currency)
                 if rate:
-                    results[start_date.isoformat()] = float_parser(rate)
-                else:
-                    raise ValueError(f"No rate found for {pair} on {start_date}")
-            else:
-                res_start_date = date.fromisoformat(data.get('start_date', start_date.isoformat()))
-                rates_by_date = data.get('rates', {})
-
-                last_rate = rates_by_date.get(res_start_date.isoformat(), {}).get(target_currency, 0)
-                if last_rate == 0:
-                    raise ValueError(f"No rate found for {pair} on the start date: {res_start_date}")
-                current_date = res_start_date
-                last_rate_reusing_count = 0
-                while current_date <= end_date:
-                    date_str = current_date.isoformat()
-                    if date_str in rates_by_date:
-                        last_rate = rates_by_date[date_str].get(target_currency, last_rate)
-                        results[date_str] = float_parser(last_rate)
-                        last_rate_reusing_count = 0
-                    else:
-                        results[date_str] = float_parser(last_rate)
-                        last_rate_reusing_count += 1
-                    if last_rate_reusing_count > 4:
-                        raise ValueError(f"{last_rate_reusing_count} consecutive days without {pair} rate data (up to {date_str}). Check date source.")
-                    if last_rate_reusing_count > 3:
-                        logger.warning(f"Reusing last known {pair} rate for {last_rate_reusing_count} consecutive days up to {date_str}.")
-                    current_date += timedelta(days=1)
-
-            return results
+                    return RateSeries.from_observations({start_date: float_parser(rate)})
+                raise ValueError(f"No rate found for {pair} on {start_date}")
+
+            res_start_date = date.fromisoformat(data.get('start_date', start_date.isoformat()))
+            rates_by_date = data.get('rates', {})
+
+            if not rates_by_date.get(res_start_date.isoformat(), {}).get(target_currency, 0):
+                raise ValueError(f"No rate found for {pair} on the start date: {res_start_date}")
+            observations = {day: float_parser(rates[target_currency])
+                            for day, rates in rates_by_date.items() if target_currency in rates}
+            filled = RateSeries.from_observations(observations, res_start_date, end_date).forward_fill(MAX_FILL_DAYS, pair)
+            first_date = max(start_date, res_start_date)
+            return RateSeries(first_date.toordinal(), filled.values[(first_date - res_start_date).days:])
 
         except requests.RequestException as e:
             logger.error(f"Failed to fetch forex data from Frankfurter API: {e}")
@@ -91,9 +79,10 @@ class ForexDataProvider(MarketDataProvider):
             logger.error(f"Failed to parse forex data response: {e}")
             raise
 
-    def _query_chunked(self, pair: str, base_currency: str, target_currency: str, start_date: date, end_date: date) -> Dict[str, float]:
+    def _query_chunked(self, pair: str, base_currency: str, target_currency: str, start_date: date, end_date: date) -> RateSeries:
         """
-        Query forex rates in yearly chunks to avoid Frankfurter API weekly sampling.
+        Query forex rates in chunks to avoid Frankfurter API weekly sampling,
+        all chunks fetched concurrently (see fetch_all) and combined in date order.
 
         Args:
             pair: Forex pair (lowercase)
@@ -103,11 +92,10 @@ class ForexDataProvider(MarketDataProvider):
             end_date: End date
 
         Returns:
-            Dictionary with all dates' rates combined from chunks
+            RateSeries of all chunks combined
         """
-        all_results = {}
+        chunks = []
         current_start = start_date
-        chunk_count = 0
 
         while current_start <= end_date:
             # Calculate chunk end date (FOREX_QUERY_CHUNK_DAYS from current_start, or end_date if sooner)
@@ -115,20 +103,18 @@ class ForexDataProvider(MarketDataProvider):
             if chunk_end > end_date:
                 chunk_end = end_date
 
-            chunk_count += 1
-            logger.info(f"Querying chunk {chunk_count}: {current_start} to {chunk_end}")
-
-            # Query this chunk
-            chunk_results = self._query_single_range(pair, base_currency, target_currency, current_start, chunk_end)
-            all_results.update(chunk_results)
+            logger.info(f"Querying chunk {len(chunks) + 1}: {current_start} to {chunk_end}")
+            chunks.append(partial(self._query_single_range, pair, base_currency, target_currency, current_start, chunk_end))
 
             # Move to next chunk
             current_start = chunk_end + timedelta(days=1)
 
-        logger.info(f"Retrieved {len(all_results)} total rates from {chunk_count} chunk(s) for {pair}")
+        all_results = RateSeries.combine(fetch_all(chunks))
+
+        logger.info(f"Retrieved {len(all_results)} total rates from {len(chunks)} chunk(s) for {pair}")
         return all_results
 
-    def query(self, pair: str, start_date: date, end_date: Optional[date] = None) -> Dict[str, float]:
+    def query(self, pair: str, start_date: date, end_date: Optional[date] = None) -> RateSeries:
         """
         Query forex rates for a given pair and date/date range.
 
@@ -138,7 +124,7 @@ class ForexDataProvider(MarketDataProvider):
             end_date: End date for query (optional). If None, queries single date.
 
         Returns:
-            Dictionary with date strings as keys and rates as values
+            RateSeries of the date range, also a mapping of date strings to rates
 
         Raises:
             ValueError: If pair format is invalid
@@ -0,0 +1,186 @@
+import time
+import random
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from shared_def import (
+    REQUESTS_TIMEOUT, HTTP_MAX_RETRIES, HTTP_BACKOFF_SECONDS, HTTP_BACKOFF_MAX_SECONDS,
+    HTTP_REQUESTS_PER_SECOND, HTTP_POOL_SIZE, HTTP_MAX_CONCURRENCY
+)
+from logger import logger
+
+# responses worth another try, the request itself was fine
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """
+    Client-side rate limiter spacing requests to one host evenly, at most rate per second.
+    Thread-safe, callers wait in turn for their slot.
+    """
+
+    def __init__(self, rate: float):
+        """
+        Initialize rate limiter.
+
+        Args:
+            rate: Requests per second allowed, 0 or less for no limit
+        """
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Wait until the next request is allowed."""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def retry_after_seconds(response: requests.Response) -> Optional[float]:
+    """
+    Delay a response asks for in its Retry-After header.
+
+    Args:
+        response: Response, e.g. 429 or 503
+
+    Returns:
+        Seconds to wait, None if the header is missing or invalid
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_seconds(attempt: int) -> float:
+    """
+    Exponential backoff with full jitter before retry number attempt (from 1).
+
+    Args:
+        attempt: Number of the retry
+
+    Returns:
+        Seconds to wait, random up to HTTP_BACKOFF_SECONDS doubling every retry, capped at HTTP_BACKOFF_MAX_SECONDS
+    """
+    return random.uniform(0, min(HTTP_BACKOFF_MAX_SECONDS, HTTP_BACKOFF_SECONDS * 2 ** (attempt - 1)))
+
+
+class HttpSession:
+    """
+    Pooled HTTP session shared by market data providers.
+
+    Connections are kept alive and reused per host. GET requests are spaced by a rate limiter
+    per host, and retried with exponential backoff and jitter on connection errors, timeouts
+    and responses in RETRY_STATUSES, waiting as long as Retry-After asks for when given.
+    Safe to use from many threads, with at most max_concurrency requests in flight at a time.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_retries: int = HTTP_MAX_RETRIES, requests_per_second: float = HTTP_REQUESTS_PER_SECOND,
+                 pool_size: int = HTTP_POOL_SIZE, timeout: float = REQUESTS_TIMEOUT,
+                 max_concurrency: int = HTTP_MAX_CONCURRENCY):
+        """
+        Initialize HTTP session.
+
+        Args:
+            max_retries: Retries after the first attempt of a request
+            requests_per_second: Requests per second allowed to each host, 0 for no limit
+            pool_size: Connections kept alive per host
+            timeout: Timeout of each attempt in seconds
+            max_concurrency: Requests in flight at a time, to all hosts together
+        """
+        self.max_retries = max_retries
+        self.requests_per_second = requests_per_second
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._limiters_lock = threading.Lock()
+        # held only while a request is in flight, not while backing off
+        self._in_flight = threading.BoundedSemaphore(max(1, max_concurrency))
+
+    @classmethod
+    def shared(cls) -> 'HttpSession':
+        """
+        Create or return the HTTP session shared by all providers.
+
+        Returns:
+            HttpSession singleton instance
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _limiter(self, url: str) -> RateLimiter:
+        host = urlsplit(url).netloc
+        with self._limiters_lock:
+            if host not in self._limiters:
+                self._limiters[host] = RateLimiter(self.requests_per_second)
+            return self._limiters[host]
+
+    def get(self, url: str, params: Optional[Dict] = None) -> requests.Response:
+        """
+        GET a URL, retrying transient failures.
+
+        Args:
+            url: URL to get
+            params: Query parameters
+
+        Returns:
+            Successful response
+
+        Raises:
+            requests.RequestException: If the request still fails after all retries,
+                or fails with a status not worth retrying
+        """
+        limiter = self._limiter(url)
+        attempt = 0
+        while True:
+            try:
+                with self._in_flight:
+                    limiter.acquire()
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                delay = backoff_seconds(attempt)
+                logger.warning(f"Request to {url} failed ({e}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+                continue
+
+            if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                response.raise_for_status()
+                return response
+            attempt += 1
+            delay = retry_after_seconds(response)
+            if delay is None:
+                delay = backoff_seconds(attempt)
+            logger.warning(f"Request to {url} got HTTP {response.status_code}, retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            response.close()
+            time.sleep(delay)
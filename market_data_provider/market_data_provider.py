@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
 from datetime import datetime, date
-from typing import Dict, Optional
+from typing import Optional
 from logger import logger
+from .rate_series import RateSeries
 
 
 class MarketDataProvider(ABC):
@@ -11,7 +12,7 @@ class MarketDataProvider(ABC):
     """
 
     @abstractmethod
-    def query(self, pair: str, start_date: date, end_date: Optional[date] = None) -> Dict[str, float]:
+    def query(self, pair: str, start_date: date, end_date: Optional[date] = None) -> RateSeries:
         """
         Query market data for a given pair and date/date range.
 
@@ -21,12 +22,12 @@ class MarketDataProvider(ABC):
             end_date: End date for query (optional). If None, queries single date.
 
         Returns:
-            Dictionary with date strings as keys and rates as values:
+            RateSeries of the date range, also a mapping of date strings to rates:
             {
                 '2024-03-14': 65432.10,
                 '2024-03-15': 65890.50,
                 ...
             }
-            Returns one entry per day in the date range.
+            Has a rate for every day in the date range.
         """
         pass
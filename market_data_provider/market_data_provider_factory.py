@@ -1,36 +1,117 @@
-from .forex_data_provider import ForexDataProvider
-from .crypto_data_provider import CryptoDataProvider
+from typing import TYPE_CHECKING
+from shared_def import RATE_CACHE_PATH, MARKET_DATA_SOURCE, RATE_BUNDLE_DIR
+from utils import import_object
+from .market_data_provider import MarketDataProvider
+
+if TYPE_CHECKING:
+    from .rate_cache import RateCache
+    from .rate_bundle import RateBundleProvider
+
+# Registry of providers, each imported when first created: the online ones pull in requests
+PROVIDERS = {
+    'forex': 'market_data_provider.forex_data_provider:ForexDataProvider',
+    'crypto': 'market_data_provider.crypto_data_provider:CryptoDataProvider',
+    'bundle': 'market_data_provider.rate_bundle:RateBundleProvider',
+}
 
 
 class MarketDataProviderFactory:
     """
     Factory class for creating market data provider instances.
     Implements singleton pattern for providers.
+    Providers are wrapped to serve rates from the persistent rate cache
+    when RATE_CACHE_PATH is configured. With MARKET_DATA_SOURCE "bundle",
+    both forex and crypto rates come from the offline rate bundle at RATE_BUNDLE_DIR instead.
     """
 
     _forex_instance = None
     _crypto_instance = None
+    _rate_cache = None
+    _bundle_instance = None
+
+    @staticmethod
+    def create_bundle_provider() -> 'RateBundleProvider':
+        """
+        Create or return the singleton rate bundle provider instance.
+
+        Returns:
+            RateBundleProvider singleton instance of RATE_BUNDLE_DIR
+        """
+        if MarketDataProviderFactory._bundle_instance is None:
+            MarketDataProviderFactory._bundle_instance = import_object(PROVIDERS['bundle'])(RATE_BUNDLE_DIR)
+        return MarketDataProviderFactory._bundle_instance
+
+    @staticmethod
+    def _offline() -> bool:
+        """
+        Whether rates come from the rate bundle rather than the online APIs.
+
+        Returns:
+            True for MARKET_DATA_SOURCE "bundle", False for "online"
+
+        Raises:
+            ValueError: If MARKET_DATA_SOURCE is neither
+        """
+        if MARKET_DATA_SOURCE not in ('online', 'bundle'):
+            raise ValueError(f"Unknown market_data_source: {MARKET_DATA_SOURCE}. Expected 'online' or 'bundle'")
+        return MARKET_DATA_SOURCE == 'bundle'
+
+    @staticmethod
+    def get_rate_cache() -> 'RateCache':
+        """
+        Create or return the singleton rate cache instance.
+
+        Returns:
+            RateCache singleton instance, None if no rate cache is configured
+        """
+        if MarketDataProviderFactory._rate_cache is None and RATE_CACHE_PATH:
+            from .rate_cache import RateCache
+            MarketDataProviderFactory._rate_cache = RateCache(RATE_CACHE_PATH)
+        return MarketDataProviderFactory._rate_cache
+
+    @staticmethod
+    def _cached(provider: MarketDataProvider) -> MarketDataProvider:
+        """
+        Wrap a provider to serve rates from the rate cache, if configured.
+
+        Args:
+            provider: Provider with a BASE_URL, which keys its rates in the cache
+
+        Returns:
+            The provider wrapped in a CachedMarketDataProvider, or as is without a rate cache
+        """
+        cache = MarketDataProviderFactory.get_rate_cache()
+        if cache is None:
+            return provider
+        from .rate_cache import CachedMarketDataProvider
+        return CachedMarketDataProvider(provider, cache, provider.BASE_URL)
 
     @staticmethod
-    def create_forex_provider() -> ForexDataProvider:
+    def create_forex_provider() -> MarketDataProvider:
         """
         Create or return the singleton forex data provider instance.
 
         Returns:
-            ForexDataProvider singleton instance
+            ForexDataProvider singleton instance, behind the rate cache if configured,
+            or the rate bundle provider when offline
         """
+        if MarketDataProviderFactory._offline():
+            return MarketDataProviderFactory.create_bundle_provider()
         if MarketDataProviderFactory._forex_instance is None:
-            MarketDataProviderFactory._forex_instance = ForexDataProvider()
+            MarketDataProviderFactory._forex_instance = MarketDataProviderFactory._cached(import_object(PROVIDERS['forex'])())
         return MarketDataProviderFactory._forex_instance
 
     @staticmethod
-    def create_crypto_provider() -> CryptoDataProvider:
+    def create_crypto_provider() -> MarketDataProvider:
         """
         Create or return the singleton crypto data provider instance.
 
         Returns:
-            CryptoDataProvider singleton instance
+            CryptoDataProvider singleton instance, behind the rate cache if configured,
+            or the rate bundle provider when offline
         """
+        if MarketDataProviderFactory._offline():
+            return MarketDataProviderFactory.create_bundle_provider()
         if MarketDataProviderFactory._crypto_instance is None:
-            MarketDataProviderFactory._crypto_instance = CryptoDataProvider()
+            MarketDataProviderFactory._crypto_instance = MarketDataProviderFactory._cached(import_object(PROVIDERS['crypto'])())
         return MarketDataProviderFactory._crypto_instance
@@ -0,0 +1,310 @@
+import os
+import csv
+import sys
+import mmap
+import math
+import struct
+import tempfile
+from array import array
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional
+from logger import logger
+from .market_data_provider import MarketDataProvider
+from .rate_series import RateSeries, MAX_FILL_DAYS
+from transaction import float_parser, datetime_parser
+
+# file of a pair in a bundle: HEADER, then one little-endian float64 rate per slot, NaN where there's none,
+# then one byte per slot, 1 where the rate was observed rather than filled from the one before
+MAGIC = b'PYCGTRB1'
+HEADER = struct.Struct('<8sqqq')  # magic, first slot, number of slots, slots per day
+FILE_SUFFIX = '.rates'
+
+SECONDS_PER_DAY = 86400
+
+
+def slot_of(when, slots_per_day: int) -> int:
+    """
+    Slot of a date or datetime, counted from day ordinal 0 at slots_per_day slots a day.
+
+    Args:
+        when: Date, or datetime (naive ones taken as UTC)
+        slots_per_day: 1 for daily rates, e.g. 24 for hourly
+
+    Returns:
+        Slot index
+    """
+    if not isinstance(when, datetime):
+        return when.toordinal() * slots_per_day
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc)
+    seconds = when.hour * 3600 + when.minute * 60 + when.second
+    return when.toordinal() * slots_per_day + seconds * slots_per_day // SECONDS_PER_DAY
+
+
+class RateBundleFile:
+    """
+    Rates of one pair memory-mapped from a bundle file, looked up by slot with no parsing.
+    """
+
+    def __init__(self, path: str):
+        """
+        Map a bundle file.
+
+        Args:
+            path: Path of the file
+
+        Raises:
+            ValueError: If the file is not a rate bundle file
+        """
+        self.path = path
+        with open(path, 'rb') as bundle_file:
+            self._mmap = mmap.mmap(bundle_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.first_slot, self.count, self.slots_per_day = HEADER.unpack_from(self._mmap)
+        mask_offset = HEADER.size + self.count * 8
+        if magic != MAGIC or len(self._mmap) != mask_offset + self.count:
+            self._mmap.close()
+            raise ValueError(f"Not a rate bundle file: {path}")
+        if sys.byteorder == 'little':
+            self.values = memoryview(self._mmap)[HEADER.size:mask_offset].cast('d')
+        else:
+            # big-endian hosts get a swapped copy rather than a mapping
+            self.values = array('d', self._mmap[HEADER.size:mask_offset])
+            self.values.byteswap()
+        self.observed = memoryview(self._mmap)[mask_offset:]
+
+    def rate_at_slot(self, slot: int) -> Optional[float]:
+        """
+        Rate of a slot.
+
+        Args:
+            slot: Slot index, see slot_of
+
+        Returns:
+            Rate, None if the bundle has none for the slot
+        """
+        index = slot - self.first_slot
+        if index < 0 or index >= self.count:
+            return None
+        value = self.values[index]
+        return None if value != value else value
+
+    def day_rate(self, ordinal: int) -> Optional[float]:
+        """
+        Daily rate of a day with a rate observed: the rate of its last slot in the file, i.e. its last rate observed.
+
+        Args:
+            ordinal: Day ordinal
+
+        Returns:
+            Rate, None if no rate of the day was observed, even if the file fills the day
+        """
+        start = max(ordinal * self.slots_per_day - self.first_slot, 0)
+        end = min((ordinal + 1) * self.slots_per_day - self.first_slot, self.count)
+        if start >= end or not any(self.observed[start:end]):
+            return None
+        return self.values[end - 1]
+
+    def daily_series(self, first_ordinal: int, last_ordinal: int) -> RateSeries:
+        """
+        Daily rates of a range, see day_rate.
+
+        Args:
+            first_ordinal: Day ordinal of the first day
+            last_ordinal: Day ordinal of the last day (inclusive)
+
+        Returns:
+            RateSeries of the days, NaN on days with no rate observed
+        """
+        values = array('d', [math.nan]) * max(0, last_ordinal - first_ordinal + 1)
+        for index in range(len(values)):
+            rate = self.day_rate(first_ordinal + index)
+            if rate is not None:
+                values[index] = rate
+        return RateSeries(first_ordinal, values)
+
+    def observations(self) -> Dict[int, float]:
+        """
+        Rates of the file by slot as observed, without the slots filled from them, e.g. to merge new rates into.
+
+        Returns:
+            Dictionary with slots as keys and rates as values
+        """
+        values = self.values
+        return {self.first_slot + index: values[index] for index, observed in enumerate(self.observed) if observed}
+
+    def close(self):
+        """Unmap the file."""
+        if isinstance(self.values, memoryview):
+            self.values.release()
+        self.observed.release()
+        self._mmap.close()
+
+
+class RateBundleProvider(MarketDataProvider):
+    """
+    Market data provider serving rates from a local rate bundle, for machines with no network.
+
+    A bundle is a directory with one memory-mapped file per pair (e.g. btcusd.rates), built from
+    CSV files by build_rate_bundle. Daily queries give the rate of the last slot of each day,
+    the close as the Bitstamp provider gives it.
+    """
+
+    def __init__(self, bundle_dir: str):
+        """
+        Initialize rate bundle provider.
+
+        Args:
+            bundle_dir: Directory of the bundle
+        """
+        self.bundle_dir = bundle_dir
+        self._files: Dict[str, RateBundleFile] = {}
+        logger.info(f"Initialized RateBundleProvider ({bundle_dir})")
+
+    def _file(self, pair: str) -> RateBundleFile:
+        pair = pair.lower()
+        if pair not in self._files:
+            path = os.path.join(self.bundle_dir, pair + FILE_SUFFIX)
+            if not os.path.exists(path):
+                raise ValueError(f"No rates of {pair} in rate bundle {self.bundle_dir}")
+            self._files[pair] = RateBundleFile(path)
+        return self._files[pair]
+
+    def rate_at(self, pair: str, when) -> Optional[float]:
+        """
+        Rate of a pair at a date or datetime, intraday if the bundle has intraday rates.
+
+        Args:
+            pair: Pair (e.g., 'btcusd', 'audusd')
+            when: Date (its first slot) or datetime
+
+        Returns:
+            Rate, None if the bundle has none then
+        """
+        bundle_file = self._file(pair)
+        return bundle_file.rate_at_slot(slot_of(when, bundle_file.slots_per_day))
+
+    def query(self, pair: str, start_date: date, end_date: Optional[date] = None) -> RateSeries:
+        """
+        Query daily rates for a given pair and date/date range.
+
+        Args:
+            pair: Pair (e.g., 'btcusd', 'audusd')
+            start_date: Start date for query
+            end_date: End date for query (optional). If None, queries single date.
+
+        Returns:
+            RateSeries of the date range, days with no rate filled with the rate before them
+            as the online providers fill them, from up to MAX_FILL_DAYS days before start_date
+
+        Raises:
+            ValueError: If the bundle has no rates of the pair, none in the range,
+                or more than MAX_FILL_DAYS consecutive days without a rate
+        """
+        if end_date is None:
+            end_date = start_date
+        bundle_file = self._file(pair)
+        first_ordinal = start_date.toordinal() - MAX_FILL_DAYS
+        series = bundle_file.daily_series(first_ordinal, end_date.toordinal())
+        if not len(series):
+            raise ValueError(f"No rates of {pair} from {start_date} to {end_date} in rate bundle {self.bundle_dir}")
+        series.forward_fill(MAX_FILL_DAYS, pair)
+        return RateSeries(start_date.toordinal(), series.values[MAX_FILL_DAYS:])
+
+
+def read_rate_csv(csv_file: str) -> Dict[str, list]:
+    """
+    Rates of a CSV file with columns pair, datetime and rate, the datetime a date alone for daily rates.
+
+    Args:
+        csv_file: Path of the CSV file
+
+    Returns:
+        Dictionary of pair (lowercase) to list of (date or datetime, rate), in file order
+    """
+    rates = {}
+    with open(csv_file, newline='') as content:
+        for row in csv.DictReader(content):
+            text = row['datetime'].strip()
+            when = datetime_parser(text)
+            if when is None:
+                raise ValueError(f"Missing datetime in {csv_file}: {row}")
+            if len(text) <= len('YYYY-MM-DD'):
+                when = when.date()
+            rates.setdefault(row['pair'].strip().lower(), []).append((when, float_parser(row['rate'])))
+    return rates
+
+
+def write_rate_bundle_file(path: str, observations: Dict[int, float], slots_per_day: int):
+    """
+    Write the rates of a pair as a bundle file, gaps up to MAX_FILL_DAYS filled with the last rate
+    and the slots observed marked as such.
+
+    Args:
+        path: Path of the file, replaced at once when written
+        observations: Dictionary of slot to rate observed
+        slots_per_day: Slots a day
+    """
+    first_slot = min(observations)
+    last_slot = max(observations)
+    max_fill = MAX_FILL_DAYS * slots_per_day
+    values = array('d', [math.nan]) * (last_slot - first_slot + 1)
+    observed = bytearray(len(values))
+    last_rate = None
+    last_seen = None
+    for index in range(len(values)):
+        rate = observations.get(first_slot + index)
+        if rate is not None:
+            last_rate, last_seen = rate, index
+            values[index] = rate
+            observed[index] = 1
+        elif last_rate is not None and index - last_seen <= max_fill:
+            values[index] = last_rate
+    if sys.byteorder != 'little':
+        values.byteswap()
+
+    directory = os.path.dirname(path) or '.'
+    fd, temp_path = tempfile.mkstemp(prefix='.rates-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            temp_file.write(HEADER.pack(MAGIC, first_slot, len(values), slots_per_day))
+            values.tofile(temp_file)
+            temp_file.write(observed)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def build_rate_bundle(bundle_dir: str, csv_files: List[str], slots_per_day: int = 1) -> List[str]:
+    """
+    Build a rate bundle from CSV files (see read_rate_csv), or update it: rates of the CSV files
+    are merged into the pairs already in the bundle, replacing the rates of the same slots.
+
+    Args:
+        bundle_dir: Directory of the bundle, created if needed
+        csv_files: CSV files to import, later files win
+        slots_per_day: Slots a day of new pairs, 1 for daily rates; pairs already bundled keep theirs
+
+    Returns:
+        Pairs written
+    """
+    os.makedirs(bundle_dir, exist_ok=True)
+    imported = {}
+    for csv_file in csv_files:
+        for pair, rates in read_rate_csv(csv_file).items():
+            imported.setdefault(pair, []).extend(rates)
+
+    for pair, rates in sorted(imported.items()):
+        path = os.path.join(bundle_dir, pair + FILE_SUFFIX)
+        observations = {}
+        pair_slots_per_day = slots_per_day
+        if os.path.exists(path):
+            existing = RateBundleFile(path)
+            pair_slots_per_day = existing.slots_per_day
+            observations = existing.observations()
+            existing.close()
+        for when, rate in rates:
+            observations[slot_of(when, pair_slots_per_day)] = rate
+        write_rate_bundle_file(path, observations, pair_slots_per_day)
+        logger.info(f"Bundled {len(rates)} {pair} rates into {path}")
+    return sorted(imported)
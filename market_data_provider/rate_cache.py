@@ -0,0 +1,206 @@
+import os
+import sqlite3
+import threading
+from datetime import date, timedelta
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+from logger import logger
+from .market_data_provider import MarketDataProvider
+from .concurrent_fetch import fetch_all
+from .rate_series import RateSeries
+
+
+class RateCache:
+    """
+    Persistent cache of daily rates per source and pair in a SQLite database.
+
+    Besides the rates it keeps the date ranges fetched so far (coverage), so a day the source
+    has no rate for is known to be fetched already rather than fetched again every time.
+    Safe to use from many threads, which take turns on the one connection.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS rates (
+            source TEXT NOT NULL,
+            pair TEXT NOT NULL,
+            day TEXT NOT NULL,
+            rate REAL NOT NULL,
+            PRIMARY KEY (source, pair, day)
+        );
+        CREATE TABLE IF NOT EXISTS coverage (
+            source TEXT NOT NULL,
+            pair TEXT NOT NULL,
+            start_day TEXT NOT NULL,
+            end_day TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS coverage_pair ON coverage (source, pair);
+    """
+
+    def __init__(self, path: str):
+        """
+        Open the cache database, creating it if needed.
+
+        Args:
+            path: Path of the SQLite database file
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(self.SCHEMA)
+        self._lock = threading.RLock()
+
+    def coverage(self, source: str, pair: str) -> List[Tuple[date, date]]:
+        """
+        Date ranges fetched so far for a pair.
+
+        Args:
+            source: Where the rates come from, e.g. the API base URL
+            pair: Pair (lowercase)
+
+        Returns:
+            List of (start, end) dates, inclusive, sorted and not overlapping
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT start_day, end_day FROM coverage WHERE source = ? AND pair = ? ORDER BY start_day',
+                (source, pair)).fetchall()
+        return [(date.fromisoformat(start_day), date.fromisoformat(end_day)) for start_day, end_day in rows]
+
+    def missing_ranges(self, source: str, pair: str, start_date: date, end_date: date) -> List[Tuple[date, date]]:
+        """
+        Sub-ranges of a date range not fetched yet.
+
+        Args:
+            source: Where the rates come from
+            pair: Pair (lowercase)
+            start_date: Start date
+            end_date: End date (inclusive)
+
+        Returns:
+            List of (start, end) dates, inclusive, in date order
+        """
+        missing = []
+        current = start_date
+        for covered_start, covered_end in self.coverage(source, pair):
+            if covered_end < current:
+                continue
+            if covered_start > end_date:
+                break
+            if covered_start > current:
+                missing.append((current, covered_start - timedelta(days=1)))
+            current = covered_end + timedelta(days=1)
+            if current > end_date:
+                break
+        if current <= end_date:
+            missing.append((current, end_date))
+        return missing
+
+    def rates(self, source: str, pair: str, start_date: date, end_date: date) -> Dict[str, float]:
+        """
+        Cached rates of a date range.
+
+        Args:
+            source: Where the rates come from
+            pair: Pair (lowercase)
+            start_date: Start date
+            end_date: End date (inclusive)
+
+        Returns:
+            Dictionary with date strings as keys and rates as values, in date order
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT day, rate FROM rates WHERE source = ? AND pair = ? AND day BETWEEN ? AND ? ORDER BY day',
+                (source, pair, start_date.isoformat(), end_date.isoformat()))
+            return dict(rows)
+
+    def store(self, source: str, pair: str, start_date: date, end_date: date, rates: Dict[str, float]):
+        """
+        Save the rates fetched for a date range and mark the range covered, in one transaction.
+
+        Args:
+            source: Where the rates come from
+            pair: Pair (lowercase)
+            start_date: Start date of the range fetched
+            end_date: End date of the range fetched (inclusive), before start_date to save rates without coverage
+            rates: Dictionary with date strings as keys and rates as values
+        """
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO rates (source, pair, day, rate) VALUES (?, ?, ?, ?)',
+                [(source, pair, day, rate) for day, rate in rates.items()])
+            if end_date < start_date:
+                return
+            # merge the new range with the ranges it overlaps or touches
+            merged_start, merged_end = start_date, end_date
+            for covered_start, covered_end in self.coverage(source, pair):
+                if covered_end + timedelta(days=1) >= merged_start and covered_start - timedelta(days=1) <= merged_end:
+                    merged_start = min(merged_start, covered_start)
+                    merged_end = max(merged_end, covered_end)
+            self._connection.execute(
+                'DELETE FROM coverage WHERE source = ? AND pair = ? AND start_day <= ? AND end_day >= ?',
+                (source, pair, merged_end.isoformat(), merged_start.isoformat()))
+            self._connection.execute(
+                'INSERT INTO coverage (source, pair, start_day, end_day) VALUES (?, ?, ?, ?)',
+                (source, pair, merged_start.isoformat(), merged_end.isoformat()))
+
+    def close(self):
+        """Close the cache database."""
+        with self._lock:
+            self._connection.close()
+
+
+class CachedMarketDataProvider(MarketDataProvider):
+    """
+    Market data provider serving rates from a RateCache, querying the provider it wraps
+    only for the sub-ranges not cached yet.
+
+    Rates of today and later may still change, they're returned but never marked covered,
+    so they're fetched again next time. Sub-ranges are stored as the provider fills them, which
+    relies on providers filling the first days of a range from the rate before it (Frankfurter
+    starts a range at the last business day, the Bitstamp provider looks back MAX_FILL_DAYS days),
+    so a sub-range starting on days with no rate isn't cached as days with no rate.
+    """
+
+    def __init__(self, provider: MarketDataProvider, cache: RateCache, source: str):
+        """
+        Initialize cached provider.
+
+        Args:
+            provider: Provider to query for rates not cached
+            cache: Cache to serve rates from and save fetched rates to
+            source: Where the provider gets rates from, e.g. its API base URL, keying its rates in the cache
+        """
+        self.provider = provider
+        self.cache = cache
+        self.source = source
+
+    def query(self, pair: str, start_date: date, end_date: Optional[date] = None) -> RateSeries:
+        """
+        Query rates for a given pair and date/date range, from the cache where covered.
+
+        Args:
+            pair: Pair (e.g., 'btcusd', 'audusd')
+            start_date: Start date for query
+            end_date: End date for query (optional). If None, queries single date.
+
+        Returns:
+            RateSeries of the date range, with rates for the days the provider has rates for
+        """
+        if end_date is None:
+            end_date = start_date
+        pair = pair.lower()
+        last_final_date = date.today() - timedelta(days=1)
+
+        missing = self.cache.missing_ranges(self.source, pair, start_date, end_date)
+        fetched = fetch_all([partial(self.provider.query, pair, missing_start, missing_end)
+                             for missing_start, missing_end in missing])
+        for (missing_start, missing_end), rates in zip(missing, fetched):
+            rates = {day: rate for day, rate in rates.items()
+                     if missing_start.isoformat() <= day <= missing_end.isoformat()}
+            self.cache.store(self.source, pair, missing_start, min(missing_end, last_final_date), rates)
+        if not missing:
+            logger.info(f"Serving {pair} rates from {start_date} to {end_date} from cache {self.cache.path}")
+        return RateSeries.from_observations(self.cache.rates(self.source, pair, start_date, end_date))
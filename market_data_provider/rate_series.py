@@ -0,0 +1,210 @@
+import math
+from array import array
+from collections.abc import Mapping
+from datetime import date, datetime
+from typing import Iterable, Iterator, Optional, Union
+from logger import logger
+
+# days without a rate (weekends, holidays) filled with the last rate before it's an error
+MAX_FILL_DAYS = 4
+
+# day ordinal of 1970-01-01, for POSIX timestamps
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+SECONDS_PER_DAY = 86400
+
+_NAN = math.nan
+
+
+def day_ordinal(when: Union[date, datetime, str, int, float]) -> int:
+    """
+    Day ordinal of a date, a datetime (its own calendar day), an ISO date string,
+    or a POSIX timestamp (its UTC day).
+
+    Args:
+        when: Date, datetime, ISO date string or POSIX timestamp
+
+    Returns:
+        Day ordinal as date.toordinal gives it
+    """
+    if isinstance(when, date):
+        return when.toordinal()
+    if isinstance(when, str):
+        return date.fromisoformat(when).toordinal()
+    return EPOCH_ORDINAL + int(when // SECONDS_PER_DAY)
+
+
+class RateSeries(Mapping):
+    """
+    Daily rates of a pair in a contiguous float array indexed by day ordinal, NaN on days with no rate.
+
+    Lookups by date are an index into the array, with no ISO strings involved. The series is also
+    a read-only mapping of ISO date strings to rates, for the days with a rate, so it stands in for
+    the dictionaries providers used to return.
+    """
+
+    __slots__ = ('first_ordinal', 'values')
+
+    def __init__(self, first_ordinal: int = 0, values: Optional[array] = None):
+        """
+        Initialize rate series.
+
+        Args:
+            first_ordinal: Day ordinal of values[0]
+            values: array('d') of rates, one per day, NaN on days with no rate
+        """
+        self.first_ordinal = first_ordinal
+        self.values = values if values is not None else array('d')
+
+    @classmethod
+    def from_observations(cls, observations: Mapping, start: Optional[date] = None,
+                          end: Optional[date] = None) -> 'RateSeries':
+        """
+        Series of the rates observed on some days.
+
+        Args:
+            observations: Mapping of dates or ISO date strings to rates
+            start: First day of the series, the first day observed if None
+            end: Last day of the series (inclusive), the last day observed if None
+
+        Returns:
+            RateSeries from start to end, NaN on days not observed; observations outside are dropped
+        """
+        by_ordinal = {day_ordinal(day): rate for day, rate in observations.items()}
+        if not by_ordinal and (start is None or end is None):
+            return cls()
+        first = start.toordinal() if start is not None else min(by_ordinal)
+        last = end.toordinal() if end is not None else max(by_ordinal)
+        values = array('d', [_NAN]) * max(0, last - first + 1)
+        for ordinal, rate in by_ordinal.items():
+            if first <= ordinal <= last:
+                values[ordinal - first] = rate
+        return cls(first, values)
+
+    @classmethod
+    def combine(cls, series_list: Iterable['RateSeries']) -> 'RateSeries':
+        """
+        One series of many, e.g. of the chunks of a query, rates of later series winning on the same days.
+
+        Args:
+            series_list: Series to combine
+
+        Returns:
+            RateSeries spanning all of them
+        """
+        series_list = [series for series in series_list if series.values]
+        if not series_list:
+            return cls()
+        if len(series_list) == 1:
+            return series_list[0]
+        first = min(series.first_ordinal for series in series_list)
+        last = max(series.last_ordinal for series in series_list)
+        values = array('d', [_NAN]) * (last - first + 1)
+        for series in series_list:
+            offset = series.first_ordinal - first
+            for index, rate in enumerate(series.values):
+                if rate == rate:
+                    values[offset + index] = rate
+        return cls(first, values)
+
+    @property
+    def last_ordinal(self) -> int:
+        """Day ordinal of the last day of the series."""
+        return self.first_ordinal + len(self.values) - 1
+
+    def forward_fill(self, max_fill_days: int = MAX_FILL_DAYS, pair: str = '') -> 'RateSeries':
+        """
+        Fill days with no rate with the last rate before them, in place, run by run.
+        Days before the first rate are left empty.
+
+        Args:
+            max_fill_days: Most consecutive days allowed to reuse a rate, a warning is logged reaching it
+            pair: Pair, for messages
+
+        Returns:
+            The series itself
+
+        Raises:
+            ValueError: If more than max_fill_days consecutive days have no rate
+        """
+        values = self.values
+        observed = [index for index, rate in enumerate(values) if rate == rate]
+        if not observed:
+            return self
+        # gaps between the days observed, and after the last one up to the end of the series
+        for index, next_index in zip(observed, observed[1:] + [len(values)]):
+            gap = next_index - index - 1
+            if gap <= 0:
+                continue
+            if gap > max_fill_days:
+                up_to = date.fromordinal(self.first_ordinal + index + max_fill_days + 1)
+                raise ValueError(f"{max_fill_days + 1} consecutive days without {pair} rate data (up to {up_to}). Check data source.")
+            if gap == max_fill_days:
+                up_to = date.fromordinal(self.first_ordinal + index + gap)
+                logger.warning(f"Reusing last known {pair} rate for {gap} consecutive days up to {up_to}.")
+            values[index + 1:next_index] = array('d', [values[index]]) * gap
+        return self
+
+    def at(self, when: Union[date, datetime, str, int, float], default: Optional[float] = None) -> Optional[float]:
+        """
+        Rate of a day.
+
+        Args:
+            when: Day, see day_ordinal
+            default: What to return if the series has no rate that day
+
+        Returns:
+            Rate, or default
+        """
+        index = day_ordinal(when) - self.first_ordinal
+        if 0 <= index < len(self.values):
+            rate = self.values[index]
+            if rate == rate:
+                return rate
+        return default
+
+    def lookup(self, whens: Iterable[Union[date, datetime, int, float]], default: float = _NAN) -> array:
+        """
+        Rates of many days at once, e.g. of the datetimes or POSIX timestamps of all transactions.
+
+        Args:
+            whens: Days, see day_ordinal
+            default: Rate of days the series has no rate for
+
+        Returns:
+            array('d') of rates in the order of whens
+        """
+        values = self.values
+        first = self.first_ordinal
+        count = len(values)
+        rates = array('d')
+        for when in whens:
+            index = day_ordinal(when) - first
+            rate = values[index] if 0 <= index < count else default
+            rates.append(rate if rate == rate else default)
+        return rates
+
+    def __getitem__(self, key) -> float:
+        rate = self.at(key)
+        if rate is None:
+            raise KeyError(key)
+        return rate
+
+    def __contains__(self, key) -> bool:
+        try:
+            return self.at(key) is not None
+        except (TypeError, ValueError):
+            return False
+
+    def __iter__(self) -> Iterator[str]:
+        first = self.first_ordinal
+        for index, rate in enumerate(self.values):
+            if rate == rate:
+                yield date.fromordinal(first + index).isoformat()
+
+    def __len__(self) -> int:
+        return sum(1 for rate in self.values if rate == rate)
+
+    def __repr__(self) -> str:
+        if not self.values:
+            return 'RateSeries()'
+        return f"RateSeries({date.fromordinal(self.first_ordinal)}..{date.fromordinal(self.last_ordinal)}, {len(self)} rates)"
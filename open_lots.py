@@ -0,0 +1,225 @@
+import copy
+import heapq
+from collections import deque
+from shared_def import POSITION_ACCOUNTING
+
+
+class OpenLots(object):
+  """
+  Open (not yet depleted) positions of one asset, kept in disposal order
+  together with running totals, so a disposal only touches the lots it consumes.
+  Depleted positions are dropped as soon as their volume reaches zero.
+  Positions can be shared with copies of the store (see copy), a store only ever
+  changes positions it owns and copies shared ones right before consuming them.
+  """
+  def __init__(self):
+    self._lots = deque()
+    self.acquired = 0 # number of positions ever added, also the id of the last one
+    self.volume = 0 # running total of open volume
+    self.cost = 0 # running total of open cost base in local fiat
+
+  def __len__(self):
+    return len(self._lots)
+
+  def __iter__(self):
+    """ iterate open positions in disposal order """
+    return iter(self._lots)
+
+  def add(self, position):
+    self.acquired += 1
+    position.lot_id = self.acquired
+    position.owner = self
+    self._push(position)
+    self.volume += position.volume
+    self.cost += position.volume * position.price
+
+  def check_disposal(self, tran, crypto):
+    """ check tran can be matched against the open lots of crypto, before its disposal starts """
+    pass
+
+  def head(self, tran=None):
+    """ the position the disposal of tran will match against next, None if nothing is open """
+    return self._lots[0] if self._lots else None
+
+  def consume(self, position, volume):
+    """ reduce the matched position by volume, dropping it once depleted """
+    if position.owner is not self:
+      # shared with another copy of the store, copy it before writing
+      position = self._detach(position)
+    position.volume -= volume
+    self.volume -= volume
+    self.cost -= volume * position.price
+    if position.volume <= 0:
+      self._remove(position)
+
+  def __setstate__(self, state):
+    """ positions unpickled with the store (pickled without owner) aren't shared with any other store """
+    self.__dict__.update(state)
+    for position in self:
+      if position.owner is None:
+        position.owner = self
+
+  def copy(self):
+    """ copy of the store sharing its positions until they are consumed """
+    copied = copy.copy(self)
+    copied._lots = copy.copy(self._lots)
+    return copied
+
+  def _detach(self, position):
+    """ replace a shared position by a copy owned by this store """
+    detached = position.copy()
+    detached.owner = self
+    self._replace(position, detached)
+    return detached
+
+  def volume_sum(self):
+    """
+    Sum of open volumes in disposal order.
+    Unlike the running total it doesn't accumulate rounding from every disposal,
+    it's what a sum over all positions ever acquired would give.
+    """
+    return sum([item.volume for item in self], 0.0 if self.acquired else 0)
+
+  def _push(self, position):
+    self._lots.append(position)
+
+  def _remove(self, position):
+    self._lots.popleft()
+
+  def _replace(self, position, other):
+    self._lots[0] = other
+
+
+class FifoLots(OpenLots):
+  """ First-in-first-out: a queue, oldest position is disposed first """
+  pass
+
+
+class FiloLots(OpenLots):
+  """ First-in-last-out: a stack, newest position is disposed first """
+  def __iter__(self):
+    return reversed(self._lots)
+
+  def head(self, tran=None):
+    return self._lots[-1] if self._lots else None
+
+  def _remove(self, position):
+    self._lots.pop()
+
+  def _replace(self, position, other):
+    self._lots[-1] = other
+
+
+class HeapLots(OpenLots):
+  """
+  Positions in a binary heap keyed on _key(position) then lot id,
+  so both picking and dropping the next position are O(log n)
+  """
+  def __init__(self):
+    super(HeapLots, self).__init__()
+    self._lots = []
+
+  def __iter__(self):
+    return (item[-1] for item in sorted(self._lots))
+
+  def _key(self, position):
+    raise NotImplementedError
+
+  def head(self, tran=None):
+    return self._lots[0][-1] if self._lots else None
+
+  def _push(self, position):
+    heapq.heappush(self._lots, (self._key(position), position.lot_id, position))
+
+  def _remove(self, position):
+    heapq.heappop(self._lots)
+
+  def _replace(self, position, other):
+    # only the head is ever consumed, and other has the same key
+    self._lots[0] = (self._key(other), other.lot_id, other)
+
+
+class HifoLots(HeapLots):
+  """ Highest-in-first-out: position of the highest cost price is disposed first """
+  def _key(self, position):
+    return -position.price
+
+
+class LofoLots(HeapLots):
+  """ Lowest-in-first-out: position of the lowest cost price is disposed first """
+  def _key(self, position):
+    return position.price
+
+
+class SpecificIdLots(OpenLots):
+  """
+  Specific identification: a disposal names the lots it matches in its 'lot' field,
+  e.g. '3;7', lots being numbered from 1 per asset in the order they were acquired.
+  Named lots are looked up by id in O(1), anything left over falls back to the
+  lowest open lot id (FIFO) kept in a heap of ids.
+  A disposal naming a lot that isn't open, never acquired or already depleted, is an error.
+  """
+  def __init__(self):
+    super(SpecificIdLots, self).__init__()
+    self._lots = {}
+    self._ids = []
+
+  def __iter__(self):
+    return (self._lots[lot_id] for lot_id in sorted(self._lots))
+
+  @staticmethod
+  def requested_ids(tran):
+    """ lot ids named by the transaction, in the order given """
+    lot = tran.get('lot', '') if tran is not None else ''
+    if not lot:
+      return []
+    try:
+      return [int(item) for item in lot.replace(';', ' ').replace(',', ' ').split()]
+    except ValueError:
+      raise Exception('Unexpected lot ids: {}'.format(lot))
+
+  def check_disposal(self, tran, crypto):
+    for lot_id in SpecificIdLots.requested_ids(tran):
+      if lot_id not in self._lots:
+        raise Exception('Unexpected lot id {} of {} {} at {}: not an open lot of {}'.format(
+            lot_id, tran.operation, tran.pair, tran.datetime, crypto))
+
+  def head(self, tran=None):
+    for lot_id in SpecificIdLots.requested_ids(tran):
+      if lot_id in self._lots:
+        return self._lots[lot_id]
+    # drop ids of lots already depleted by specific disposals
+    while self._ids and self._ids[0] not in self._lots:
+      heapq.heappop(self._ids)
+    return self._lots[self._ids[0]] if self._ids else None
+
+  def copy(self):
+    copied = super(SpecificIdLots, self).copy()
+    copied._ids = list(self._ids)
+    return copied
+
+  def _push(self, position):
+    self._lots[position.lot_id] = position
+    heapq.heappush(self._ids, position.lot_id)
+
+  def _remove(self, position):
+    del self._lots[position.lot_id]
+
+  def _replace(self, position, other):
+    self._lots[other.lot_id] = other
+
+
+OPEN_LOTS_CLASSES = {
+    'fifo': FifoLots,
+    'filo': FiloLots,
+    'hifo': HifoLots,
+    'lofo': LofoLots,
+    'specific_id': SpecificIdLots,
+}
+
+
+def create_open_lots(accounting=POSITION_ACCOUNTING):
+  """ create the open lots store for the configured position accounting """
+  if accounting not in OPEN_LOTS_CLASSES:
+    raise Exception('Unexpected POSITION_ACCOUNTING: {}'.format(accounting))
+  return OPEN_LOTS_CLASSES[accounting]()
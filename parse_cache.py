@@ -0,0 +1,82 @@
+import os
+import json
+import pickle
+import hashlib
+import tempfile
+from shared_def import (
+    FIELDS, PAIR_SPLIT_MAP, PARSE_DATETIME_FORMATS, OPERATIONS, FY_START_MONTH, PARSE_CACHE_DIR
+)
+from transaction import pack_transactions, unpack_transactions
+from logger import logger
+
+# bump when parsed transactions change shape, so older cache entries are no longer picked up
+CACHE_VERSION = 2
+
+
+def config_digest():
+  """ hash of the config parsing depends on """
+  relevant = {
+      'version': CACHE_VERSION,
+      'fields': FIELDS,
+      'pair_split_map': PAIR_SPLIT_MAP,
+      'parse_datetime_formats': PARSE_DATETIME_FORMATS,
+      'operations': OPERATIONS,
+      'fy_start_month': FY_START_MONTH,
+  }
+  return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def file_digest(path):
+  """ sha256 of the content of a file """
+  digest = hashlib.sha256()
+  with open(path, 'rb') as content:
+    for block in iter(lambda: content.read(1 << 20), b''):
+      digest.update(block)
+  return digest.hexdigest()
+
+
+class ParseCache(object):
+  """
+  Parsed transactions of input files pickled in directory, keyed by the hash of the file content
+  and of the config parsing depends on, so a changed file or config is parsed again.
+  Entries are only ever added, it's safe to delete the directory any time.
+  """
+  def __init__(self, directory=PARSE_CACHE_DIR):
+    self.directory = directory
+    self._config_digest = config_digest()
+
+  def path_of(self, csv_file):
+    return os.path.join(self.directory, '{}-{}.pickle'.format(file_digest(csv_file), self._config_digest[:16]))
+
+  def load(self, cache_path):
+    """ (transactions, ordered) store saved at cache_path, None if nothing is cached there """
+    try:
+      with open(cache_path, 'rb') as cached:
+        packed, ordered = pickle.load(cached)
+      return unpack_transactions(packed), ordered
+    except FileNotFoundError:
+      return None
+    except Exception as exp:
+      logger.warning('Ignored unreadable parse cache {}: {}'.format(cache_path, exp))
+      return None
+
+  def store(self, cache_path, parsed):
+    """
+    save (transactions, ordered) parse_csv_file gives at cache_path, packed by pack_transactions,
+    written to a temp file first so readers never see it half written
+    """
+    transactions, ordered = parsed
+    os.makedirs(self.directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix='.parse-', dir=self.directory)
+    try:
+      with os.fdopen(fd, 'wb') as temp_file:
+        pickle.dump((pack_transactions(transactions), ordered), temp_file, pickle.HIGHEST_PROTOCOL)
+      os.replace(temp_path, cache_path)
+    except BaseException:
+      os.remove(temp_path)
+      raise
+
+
+def create_parse_cache(directory=PARSE_CACHE_DIR):
+  """ ParseCache of directory, None when caching is off (no directory configured) """
+  return ParseCache(directory) if directory else None
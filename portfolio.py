@@ -1,62 +1,98 @@
 import pprint
-from shared_def import LOCALE_FIAT, FIATS, CRYPTOS, POSITION_ACCOUNTING, PRECISION_THRESHOLD
+from shared_def import LOCALE_FIAT, FIATS, CRYPTOS, PRECISION_THRESHOLD
 from gain_loss import GainLoss
 from position import Position
 from transaction import Transaction
+from open_lots import create_open_lots
 from logger import logger
 
 pp = pprint.PrettyPrinter(indent=2, width=100, compact=True)
 
 
 class Portfolio(dict):
-  """ 
-  Portfolio contains all positions of all cryptos
-  It's a dict with key as crypto name, value as list of Position
+  """
+  Portfolio contains all open positions of all cryptos
+  It's a dict with key as crypto name, value as OpenLots of Position in disposal order
   """
   def __init__(self):
     super(Portfolio, self).__init__()
     for item in CRYPTOS:
-      self[item] = []
+      self[item] = create_open_lots()
+    self._shared = set() # cryptos whose open lots are shared with a snapshot
+
+  def snapshot(self):
+    """
+    Copy-on-write copy of the portfolio, e.g. to carry into the next financial year.
+    Both portfolios share open lots until one of them changes a crypto, only then
+    the open lots of that crypto are copied, and each position only once it's consumed.
+    """
+    snapshot = Portfolio.__new__(Portfolio)
+    dict.update(snapshot, self)
+    snapshot._shared = set(self.keys())
+    self._shared = set(self.keys())
+    return snapshot
+
+  def _writable(self, crypto):
+    """ open lots of the crypto to change, copied first if shared with a snapshot """
+    if crypto in self._shared:
+      self[crypto] = self[crypto].copy()
+      self._shared.discard(crypto)
+    return self[crypto]
+
+  def holding(self, crypto):
+    """ volume of the crypto currently held """
+    return self[crypto].volume_sum()
+
+  @classmethod
+  def from_open_lots(cls, base, open_lots):
+    """ portfolio with the open lots of base except those of the cryptos in open_lots, all shared with where they came from """
+    portfolio = cls.__new__(cls)
+    dict.update(portfolio, base)
+    dict.update(portfolio, open_lots)
+    portfolio._shared = set(portfolio.keys())
+    return portfolio
 
   def process_buy_sell_transaction(self, tran):
-    """ Will either generate portfolio or tax capital gain/loss """
+    """ Will either generate portfolio or tax capital gain/loss, returns gain/loss events in the order they happened """
+    self.process_acquisition(tran)
+    return self.process_disposal(tran)
+
+  def process_acquisition(self, tran):
+    """ open a position of the crypto tran buys, if it buys a crypto """
     if tran.left2right[1] in CRYPTOS:
-      # the list of position will be processed from 0 to end
-      # so append will be FIFO, insert will be FILO
-      if POSITION_ACCOUNTING == 'fifo':
-        self[tran.left2right[1]].append(Position(tran))
-      elif POSITION_ACCOUNTING == 'filo':
-        self[tran.left2right[1]].insert(0, Position(tran))
-      else:
-        raise Exception('Unexpected POSITION_ACCOUNTING: {}'.format(POSITION_ACCOUNTING))
+      # open lots of the crypto decide the disposal order, see POSITION_ACCOUNTING
+      self._writable(tran.left2right[1]).add(Position(tran))
 
+  def process_disposal(self, tran):
+    """ gain/loss events of disposing the crypto tran sells, if it sells a crypto, in the order they happened """
     if tran.left2right[0] in CRYPTOS:
       # crypto disposal happened
-      gains = []
-      losses = []
+      events = []
       crypto = tran.left2right[0]
+      lots = self._writable(crypto)
       disposed_volume = tran[crypto]
+      tran_brief = tran.snapshot()
+      lots.check_disposal(tran, crypto)
 
-      # go through positions list of the crypto to dispose, from 0 to end
-      for item in self[crypto]:
-        if item.volume > 0:
-          gl = GainLoss()
-          gl.transaction = tran
-          gl.position = item
-          gl.left_date = item.transaction.datetime
-          gl.right_date = tran.datetime
-          matching = min(item.volume, disposed_volume)
-          item.volume -= matching
-          disposed_volume -= matching
-          gl.matched = matching
-          gl.fiat = (tran.fiat / tran[crypto] - item.price) * matching
-          gains.append(gl) if gl.gain else losses.append(gl)
-          print(gl.brief_csv)
-          if disposed_volume < PRECISION_THRESHOLD:
-            break
+      # go through open positions of the crypto to dispose, in disposal order
+      while lots:
+        item = lots.head(tran)
+        gl = GainLoss()
+        gl.transaction = tran_brief
+        gl.position = item.snapshot()
+        gl.left_date = item.transaction.datetime
+        gl.right_date = tran.datetime
+        matching = min(item.volume, disposed_volume)
+        lots.consume(item, matching)
+        disposed_volume -= matching
+        gl.matched = matching
+        gl.fiat = (tran.fiat / tran[crypto] - item.price) * matching
+        events.append(gl)
+        if disposed_volume < PRECISION_THRESHOLD:
+          break
       if disposed_volume > PRECISION_THRESHOLD:
         raise Exception('Unexpected, disposing position not existing')
-      
+
       if tran.left2right[1] in FIATS:
         # need to deal with fees of disposing crypto for fiat
         # btw, no need to handle crypto to crypto case, because in that case fee would be added to cost base
@@ -67,65 +103,58 @@ class Portfolio(dict):
           volume = tran[crypto_fee_field]
           crypto_fiat_field = '{}{}'.format(tran.left2right[0], LOCALE_FIAT).lower()
           disposing_price = tran[crypto_fiat_field] if crypto_fiat_field in tran and tran[crypto_fiat_field] > 0 else (fee_fiat / volume)
-          # go through positions list of the crypto to dispose, from 0 to end
-          for item in self[crypto]:
-            if item.volume > 0:
-              gl = GainLoss()
-              gl.transaction = tran
-              # make up a sell(crypto_fee) transaction based on original transaction
-              gl.transaction.volume = tran[crypto_fee_field]
-              gl.transaction[crypto] = tran[crypto_fee_field]
-              gl.transaction[LOCALE_FIAT.lower()] = fee_fiat
-              gl.transaction[crypto_fee_field] = gl.transaction[fiat_fee_field] = 0
-
-              gl.position = item
-              gl.left_date = item.transaction.datetime
-              gl.right_date = tran.datetime
-              matching = min(item.volume, volume)
-              item.volume -= matching
-              volume -= matching
-              gl.matched = matching
-              gl.fiat = (disposing_price - item.price) * matching
-              gains.append(gl) if gl.gain else losses.append(gl)
-              print(gl.brief_csv)
-
-              incidental_loss = GainLoss()
-              incidental_loss.description = 'Incidental loss because of fee paid in crypto'
-              incidental_loss.transaction = tran
-              incidental_loss.transaction.volume = tran[crypto_fee_field]
-              # the full market value of crypto paid as fee is deductible as incidental loss
-              incidental_loss.fiat = -abs(disposing_price * matching)
-              incidental_loss.left_date = item.transaction.datetime
-              incidental_loss.right_date = tran.datetime
-              losses.append(incidental_loss)
-              print(incidental_loss.brief_csv)
-              if volume < PRECISION_THRESHOLD:
-                break
+          # make up a sell(crypto_fee) transaction based on original transaction
+          fee_brief = tran.snapshot(volume=tran[crypto_fee_field], fiat=fee_fiat)
+          incidental_brief = tran.snapshot(volume=tran[crypto_fee_field])
+          # go through open positions of the crypto to dispose, in disposal order
+          while lots:
+            item = lots.head(tran)
+            gl = GainLoss()
+            gl.transaction = fee_brief
+            gl.position = item.snapshot()
+            gl.left_date = item.transaction.datetime
+            gl.right_date = tran.datetime
+            matching = min(item.volume, volume)
+            lots.consume(item, matching)
+            volume -= matching
+            gl.matched = matching
+            gl.fiat = (disposing_price - item.price) * matching
+            events.append(gl)
+
+            incidental_loss = GainLoss()
+            incidental_loss.description = 'Incidental loss because of fee paid in crypto'
+            incidental_loss.transaction = incidental_brief
+            # the full market value of crypto paid as fee is deductible as incidental loss
+            incidental_loss.fiat = -abs(disposing_price * matching)
+            incidental_loss.left_date = item.transaction.datetime
+            incidental_loss.right_date = tran.datetime
+            events.append(incidental_loss)
+            if volume < PRECISION_THRESHOLD:
+              break
           if volume > PRECISION_THRESHOLD:
             raise Exception('Unexpected, disposing position not existing')
         elif fee_fiat > 0:
           # simply treat position fee of fiat as incidental loss as no crypto fee information
           incidental_loss = GainLoss()
           incidental_loss.description = 'Incidental loss because of fee paid in fiat'
-          incidental_loss.transaction = tran
+          incidental_loss.transaction = tran.snapshot()
           incidental_loss.left_date = incidental_loss.right_date = tran.datetime
           incidental_loss.fiat = -abs(fee_fiat)
-          losses.append(incidental_loss)
-          print(incidental_loss.brief_csv)
+          events.append(incidental_loss)
 
-      return gains, losses
+      return events
 
     if tran.left2right[1] not in CRYPTOS:
       # neither left nor right is crypto, skip with logging
       logger.warning('Skipped non crypto trading, left2right:{}'.format(tran.left2right))
-    return (None, None)
-  
+    return []
+
   def process_deposit_withdrawal_transaction(self, tran):
     """ Handle fee paid in crypto in non buy/sell transaction
     Regard it as tax event of disposing the crypto as well
     the same as sell, will result in gain or loss
     and cost base value of the fee is regarded as loss
-    return all the (gains, losses) same as process_buy_sell_transaction
+    return gain/loss events the same as process_buy_sell_transaction
     """
     fiat_fee_field = 'fee_{}'.format(LOCALE_FIAT.lower())
     fee_fiat = getattr(tran, fiat_fee_field, 0)
@@ -134,75 +163,77 @@ class Portfolio(dict):
       if crypto_fee_field in tran:
         volume = tran[crypto_fee_field]
         if volume > 0:
-          gains = []
-          losses = []
+          events = []
+          lots = self._writable(crypto)
           crypto_fiat_field = '{}{}'.format(crypto, LOCALE_FIAT).lower()
           disposing_price = tran[crypto_fiat_field] if crypto_fiat_field in tran and tran[crypto_fiat_field] > 0 else (fee_fiat / volume)
-          # go through positions list of the crypto to dispose, from 0 to end
-          for item in self[crypto]:
-            if item.volume > 0:
-              gl = GainLoss()
-              gl.transaction = Transaction.mock_sell_transaction(tran)
-              gl.position = item
-              gl.left_date = item.transaction.datetime
-              gl.right_date = tran.datetime
-              matching = min(item.volume, volume)
-              item.volume -= matching
-              volume -= matching
-              gl.matched = matching
-              gl.fiat = (disposing_price - item.price) * matching
-              gains.append(gl) if gl.gain else losses.append(gl)
-              print(gl.brief_csv)
-
-              incidental_loss = GainLoss()
-              incidental_loss.description = 'Incidental loss because of fee paid in crypto'
-              incidental_loss.transaction = tran
-              incidental_loss.transaction.volume = tran[crypto_fee_field]
-              # the full market value of crypto paid as fee is deductible as incidental loss
-              incidental_loss.fiat = -abs(disposing_price * matching)
-              incidental_loss.left_date = item.transaction.datetime
-              incidental_loss.right_date = tran.datetime
-              losses.append(incidental_loss)
-              print(incidental_loss.brief_csv)
-              if volume < PRECISION_THRESHOLD:
-                break
+          fee_brief = Transaction.mock_sell_transaction(tran).snapshot()
+          incidental_brief = tran.snapshot(volume=tran[crypto_fee_field])
+          lots.check_disposal(tran, crypto)
+          # go through open positions of the crypto to dispose, in disposal order
+          while lots:
+            item = lots.head(tran)
+            gl = GainLoss()
+            gl.transaction = fee_brief
+            gl.position = item.snapshot()
+            gl.left_date = item.transaction.datetime
+            gl.right_date = tran.datetime
+            matching = min(item.volume, volume)
+            lots.consume(item, matching)
+            volume -= matching
+            gl.matched = matching
+            gl.fiat = (disposing_price - item.price) * matching
+            events.append(gl)
+
+            incidental_loss = GainLoss()
+            incidental_loss.description = 'Incidental loss because of fee paid in crypto'
+            incidental_loss.transaction = incidental_brief
+            # the full market value of crypto paid as fee is deductible as incidental loss
+            incidental_loss.fiat = -abs(disposing_price * matching)
+            incidental_loss.left_date = item.transaction.datetime
+            incidental_loss.right_date = tran.datetime
+            events.append(incidental_loss)
+            if volume < PRECISION_THRESHOLD:
+              break
           if volume > PRECISION_THRESHOLD:
             raise Exception('Unexpected, disposing position not existing')
-          return gains, losses
-    
+          return events
+
     if fee_fiat > 0:
       # no fee paid in crypto, just create loss based on fee_fiat
       incidental_loss = GainLoss()
       incidental_loss.description = 'Incidental loss because of fee paid in fiat'
-      incidental_loss.transaction = tran
+      incidental_loss.transaction = tran.snapshot()
       incidental_loss.fiat = -abs(fee_fiat)
       incidental_loss.left_date = incidental_loss.right_date = tran.datetime
-      print(incidental_loss.brief_csv)
-      return (None, [incidental_loss])
-    
+      return [incidental_loss]
+
     logger.info('Skipped transaction: {}, as nothing detected to process'.format(tran.brief))
-    return (None, None)
+    return []
 
   def dispose_as_loss(self, crypto, tran):
+    """ dispose the crypto volume of tran at no value, returns the losses """
     losses = []
+    lots = self._writable(crypto)
     disposed_volume = tran[crypto]
+    tran_brief = tran.snapshot()
+    lots.check_disposal(tran, crypto)
 
-    for item in self[crypto]:
-      if item.volume > 0:
-        gl = GainLoss()
-        gl.transaction = tran
-        gl.position = item
-        gl.left_date = item.transaction.datetime
-        gl.right_date = tran.datetime
-        matching = min(item.volume, disposed_volume)
-        item.volume -= matching
-        disposed_volume -= matching
-        gl.matched = matching
-        gl.fiat = -matching * item.price
-        losses.append(gl)
-        print(gl.brief_csv)
-        if disposed_volume < PRECISION_THRESHOLD:
-          break
+    while lots:
+      item = lots.head(tran)
+      gl = GainLoss()
+      gl.transaction = tran_brief
+      gl.position = item.snapshot()
+      gl.left_date = item.transaction.datetime
+      gl.right_date = tran.datetime
+      matching = min(item.volume, disposed_volume)
+      lots.consume(item, matching)
+      disposed_volume -= matching
+      gl.matched = matching
+      gl.fiat = -matching * item.price
+      losses.append(gl)
+      if disposed_volume < PRECISION_THRESHOLD:
+        break
     if disposed_volume > PRECISION_THRESHOLD:
       raise Exception('Unexpected, disposing position not existing')
     return losses
@@ -1,22 +1,24 @@
-import copy
+from collections import namedtuple
 from shared_def import LOCALE_FIAT
 
 
 class Position(dict):
   def __init__(self, transaction):
     super(Position, self).__init__()
-    self.transaction = copy.deepcopy(transaction) # backup initial transaction for brief
-    self.asset = self.transaction.left2right[1]
+    self.transaction = transaction.snapshot() # brief of initial transaction
+    self.asset = transaction.left2right[1]
     # Use LOCALE_FIAT to get fiat field dynamically
     locale_fiat_lower = LOCALE_FIAT.lower()
     fee_field = 'fee_{}'.format(locale_fiat_lower)
-    fiat_amount = self.transaction[locale_fiat_lower] + self.transaction[fee_field] # include fee in cost base
+    fiat_amount = transaction[locale_fiat_lower] + transaction[fee_field] # include fee in cost base
     self.fiat = fiat_amount
-    self.volume = self.transaction[self.asset]
+    self.volume = transaction[self.asset]
     if self.volume == 0:
       raise AssertionError('Zero volume is not valid')
     self['initial_volume'] = self.volume # backup initial volume
     self.price = fiat_amount / self.volume # cost price
+    self.lot_id = None # assigned when added to open lots
+    self.owner = None # the open lots allowed to change it, not part of the position data
 
   @property
   def asset(self):
@@ -32,7 +34,7 @@ class Position(dict):
 
   @transaction.setter
   def transaction(self, value):
-    self['transaction'] = copy.deepcopy(value)
+    self['transaction'] = value
 
   @property
   def fiat(self):
@@ -59,6 +61,14 @@ class Position(dict):
   def price(self, value):
     self['price'] = value
 
+  @property
+  def lot_id(self):
+    return self['lot_id']
+
+  @lot_id.setter
+  def lot_id(self, value):
+    self['lot_id'] = value
+
   @property
   def initial_volume(self):
     return self['initial_volume']
@@ -74,6 +84,27 @@ class Position(dict):
             Position.BRIEF_KEYS
         })
 
+  def __getstate__(self):
+    """ pickled without its owner, the open lots unpickled with it take it over """
+    return dict(self.__dict__, owner=None)
+
+  def copy(self):
+    """ copy of the position, sharing the brief of its transaction """
+    copied = Position.__new__(Position)
+    dict.update(copied, self)
+    copied.owner = None
+    return copied
+
+  def snapshot(self):
+    """ immutable brief of the position as it is now, sharing the brief of its transaction """
+    return PositionBrief(
+        asset=self.asset,
+        fiat=self.fiat,
+        volume=self.volume,
+        price=self.price,
+        initial_volume=self.initial_volume,
+        transaction=self.transaction)
+
   @staticmethod
   def create_na_brief():
     return dict(
@@ -82,3 +113,16 @@ class Position(dict):
             for my_key in
             Position.BRIEF_KEYS
         })
+
+
+class PositionBrief(namedtuple('PositionBrief', ['asset', 'fiat', 'volume', 'price', 'initial_volume', 'transaction'])):
+  """ Compact immutable record of a position at the time it's matched by a disposal """
+  __slots__ = ()
+
+  @property
+  def brief(self):
+    """ same dict as Position.brief gives """
+    result = dict(asset=self.asset)
+    result[LOCALE_FIAT.lower()] = self.fiat
+    result.update(volume=self.volume, price=self.price, initial_volume=self.initial_volume)
+    return result
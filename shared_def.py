@@ -14,7 +14,25 @@ POSITION_ACCOUNTING = config['options']['position_accounting']
 SORT_BY_DATETIME_ASC = config['options']['sort_by_datetime_asc']
 PRECISION_THRESHOLD = config['options']['precision_threshold']
 REQUESTS_TIMEOUT = config['options']['requests_timeout']
+HTTP_MAX_RETRIES = config['options'].get('http_max_retries', 3)
+HTTP_BACKOFF_SECONDS = config['options'].get('http_backoff_seconds', 0.5)
+HTTP_BACKOFF_MAX_SECONDS = config['options'].get('http_backoff_max_seconds', 30)
+HTTP_REQUESTS_PER_SECOND = config['options'].get('http_requests_per_second', 5)
+HTTP_POOL_SIZE = config['options'].get('http_pool_size', 10)
+HTTP_MAX_CONCURRENCY = config['options'].get('http_max_concurrency', 8)
 FOREX_QUERY_CHUNK_DAYS = config['options']['forex_query_chunk_days']
+FOREX_API_URL = config['options'].get('forex_api_url', 'https://api.frankfurter.app')
+CRYPTO_API_URL = config['options'].get('crypto_api_url', 'https://www.bitstamp.net/api/v2')
+INGEST_WORKERS = config['options'].get('ingest_workers', 0)
+SORT_MEMORY_BUDGET_MB = config['options'].get('sort_memory_budget_mb', 512)
+PARSE_CACHE_DIR = config['options'].get('parse_cache_dir', '')
+CHECKPOINT_DIR = config['options'].get('checkpoint_dir', '')
+BATCH_WORKERS = config['options'].get('batch_workers', 0)
+MATCH_WORKERS = config['options'].get('match_workers', 1)
+RATE_CACHE_PATH = config['options'].get('rate_cache_path', '')
+MARKET_DATA_SOURCE = config['options'].get('market_data_source', 'online')
+RATE_BUNDLE_DIR = config['options'].get('rate_bundle_dir', 'rate-bundle')
+RATE_BUNDLE_SLOTS_PER_DAY = config['options'].get('rate_bundle_slots_per_day', 1)
 
 LOCALE_FIAT = config['locale']['fiat']
 FY_START_MONTH = config['locale']['fy_start_month']
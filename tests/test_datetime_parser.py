@@ -0,0 +1,57 @@
+"""
+DatetimeParser gives each value the datetime datetime_parser gives it, whichever strategy it detected first.
+
+  python -m pytest tests
+"""
+import os
+import sys
+import unittest
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT) # config.toml is loaded from the working directory
+sys.path.insert(0, ROOT)
+
+from transaction import DatetimeParser, datetime_parser, _strptime_strategy
+
+# %I and %H hours overlap: '01:30 PM' parses by both, '13:30 PM' only by %H
+OVERLAPPING_FORMATS = ['%b. %d, %Y, %I:%M %p', '%b. %d, %Y, %H:%M %p']
+
+
+class DatetimeParserTest(unittest.TestCase):
+  def test_format_listed_first_wins_over_the_one_detected(self):
+    parser = DatetimeParser(OVERLAPPING_FORMATS)
+    self.assertEqual(parser('Jan. 06, 2024, 13:30 PM'), datetime(2024, 1, 6, 13, 30, tzinfo=timezone.utc))
+    self.assertEqual(parser('Jan. 06, 2024, 01:30 PM'), datetime(2024, 1, 6, 13, 30, tzinfo=timezone.utc))
+    self.assertEqual(parser('Jan. 06, 2024, 01:30 AM'), datetime(2024, 1, 6, 1, 30, tzinfo=timezone.utc))
+
+  def test_later_strategy_detected_when_the_one_detected_fails(self):
+    parser = DatetimeParser(OVERLAPPING_FORMATS)
+    self.assertEqual(parser('Jan. 06, 2024, 01:30 PM'), datetime(2024, 1, 6, 13, 30, tzinfo=timezone.utc))
+    self.assertEqual(parser('2024-1-6T13:30:00.000Z'), datetime(2024, 1, 6, 13, 30, tzinfo=timezone.utc))
+    self.assertEqual(parser('Jan. 07, 2024, 01:30 PM'), datetime(2024, 1, 7, 13, 30, tzinfo=timezone.utc))
+
+  def test_mixed_values_as_datetime_parser_gives_them(self):
+    values = [
+        'Jan. 06, 2024, 13:30 PM', 'Jan. 06, 2024, 01:30 PM', '03/14/2024 09:11:00', '2024-03-14 09:11:00',
+        '14 Mar 2024 09:11:00 +1000', '2024-03-14T09:11:00+10:00', '2024-3-14T09:11:00.711Z', 'Mar. 14, 2024, 09:11 AM',
+    ]
+    parser = DatetimeParser()
+    for value in values + values[::-1]:
+      expected = datetime_parser(value)
+      parsed = parser(value)
+      self.assertEqual(parsed, expected, value)
+      self.assertEqual(parsed.utcoffset(), expected.utcoffset(), value)
+
+  def test_strptime_shape_skips_only_values_strptime_rejects(self):
+    values = ['Jan. 06, 2024, 01:30 PM', 'jan.  6, 2024,  1:30 pm', '06 Jan 2024 13:30:00 +0000', '2024-01-06T13:30:00Z', '']
+    for fmt in OVERLAPPING_FORMATS + ['%d %b %Y %H:%M:%S %z', '%Y-%m-%d %H:%M:%S', '100%% %Y']:
+      strategy = _strptime_strategy(fmt)
+      for value in values:
+        if not strategy.shape(value):
+          with self.assertRaises(ValueError, msg='{} by {}'.format(value, fmt)):
+            datetime.strptime(value, fmt)
+
+
+if __name__ == '__main__':
+  unittest.main()
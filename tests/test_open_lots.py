@@ -0,0 +1,111 @@
+"""
+Lot selection of HIFO, LOFO and specific identification disposals, through Portfolio.
+
+  python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT) # config.toml is loaded from the working directory
+sys.path.insert(0, ROOT)
+
+from transaction import Transaction
+from portfolio import Portfolio
+from open_lots import create_open_lots
+from shared_def import LOCALE_FIAT
+
+FIAT = LOCALE_FIAT.lower()
+
+
+def btc_transaction(operation, day, volume, fiat, lot='', fee_btc=0):
+  """ a btc buy or sell for fiat on day of January 2024, each lot bought on its own day """
+  return Transaction.createFrom(
+      ['datetime', 'operation', 'pair', 'btc', FIAT, 'lot', 'fee_btc'],
+      ['2024-01-{:02d} 00:00:00'.format(day), operation, 'btc' + FIAT, str(volume), str(fiat), lot, str(fee_btc)])
+
+
+def portfolio_of(accounting, prices):
+  """ portfolio matching btc by accounting, holding one btc bought on day 1, 2... at each price """
+  portfolio = Portfolio()
+  portfolio['btc'] = create_open_lots(accounting)
+  for day, price in enumerate(prices, 1):
+    portfolio.process_buy_sell_transaction(btc_transaction('buy', day, 1, price))
+  return portfolio
+
+
+def matched(events):
+  """ (day the lot was bought, volume matched) of the disposal events """
+  return [(event.left_date.day, event.matched) for event in events if event.position is not None]
+
+
+class HeapLotsTest(unittest.TestCase):
+  def test_hifo_disposes_highest_price_first_ties_oldest_first(self):
+    portfolio = portfolio_of('hifo', [100, 300, 200, 300])
+    events = portfolio.process_buy_sell_transaction(btc_transaction('sell', 10, 2.5, 1000))
+    self.assertEqual(matched(events), [(2, 1.0), (4, 1.0), (3, 0.5)])
+    self.assertEqual([position.price for position in portfolio['btc']], [200, 100])
+
+  def test_lofo_disposes_lowest_price_first_ties_oldest_first(self):
+    portfolio = portfolio_of('lofo', [200, 100, 300, 100])
+    events = portfolio.process_buy_sell_transaction(btc_transaction('sell', 10, 2.5, 1000))
+    self.assertEqual(matched(events), [(2, 1.0), (4, 1.0), (1, 0.5)])
+    self.assertEqual([position.price for position in portfolio['btc']], [200, 300])
+
+  def test_partly_disposed_lot_stays_next(self):
+    portfolio = portfolio_of('hifo', [100, 300, 300])
+    portfolio.process_buy_sell_transaction(btc_transaction('sell', 10, 0.5, 200))
+    events = portfolio.process_buy_sell_transaction(btc_transaction('sell', 11, 1.0, 400))
+    self.assertEqual(matched(events), [(2, 0.5), (3, 0.5)])
+
+
+class SpecificIdLotsTest(unittest.TestCase):
+  PRICES = [100, 200, 300, 400, 500, 600, 700, 800]
+
+  def test_named_lots_in_the_order_given(self):
+    portfolio = portfolio_of('specific_id', self.PRICES)
+    events = portfolio.process_buy_sell_transaction(btc_transaction('sell', 10, 1.5, 1000, lot='7;3'))
+    self.assertEqual(matched(events), [(7, 1.0), (3, 0.5)])
+
+  def test_lot_ids_separated_by_semicolons_commas_or_spaces(self):
+    portfolio = portfolio_of('specific_id', self.PRICES)
+    events = portfolio.process_buy_sell_transaction(btc_transaction('sell', 10, 3, 1000, lot='3, 7 5'))
+    self.assertEqual(matched(events), [(3, 1.0), (7, 1.0), (5, 1.0)])
+
+  def test_rest_not_covered_by_named_lots_falls_back_to_fifo(self):
+    portfolio = portfolio_of('specific_id', self.PRICES)
+    events = portfolio.process_buy_sell_transaction(btc_transaction('sell', 10, 3.5, 1000, lot='3;7'))
+    self.assertEqual(matched(events), [(3, 1.0), (7, 1.0), (1, 1.0), (2, 0.5)])
+
+  def test_named_lot_partly_disposed_before(self):
+    portfolio = portfolio_of('specific_id', self.PRICES)
+    portfolio.process_buy_sell_transaction(btc_transaction('sell', 10, 0.25, 1000, lot='3'))
+    events = portfolio.process_buy_sell_transaction(btc_transaction('sell', 11, 1, 1000, lot='3'))
+    self.assertEqual(matched(events), [(3, 0.75), (1, 0.25)])
+
+  def test_crypto_fee_after_named_lot_used_up(self):
+    portfolio = portfolio_of('specific_id', self.PRICES)
+    events = portfolio.process_buy_sell_transaction(btc_transaction('sell', 10, 1, 1000, lot='3', fee_btc=0.1))
+    self.assertEqual(matched(events), [(3, 1.0), (1, 0.1)])
+
+  def test_rejects_lot_never_acquired(self):
+    portfolio = portfolio_of('specific_id', self.PRICES)
+    with self.assertRaisesRegex(Exception, 'lot id 9 of sell btc{} at 2024-01-10'.format(FIAT)):
+      portfolio.process_buy_sell_transaction(btc_transaction('sell', 10, 1, 1000, lot='3;9'))
+    self.assertEqual(portfolio['btc'].volume, len(self.PRICES))
+
+  def test_rejects_lot_already_depleted(self):
+    portfolio = portfolio_of('specific_id', self.PRICES)
+    portfolio.process_buy_sell_transaction(btc_transaction('sell', 10, 1, 1000, lot='7'))
+    with self.assertRaisesRegex(Exception, 'lot id 7 of sell btc{} at 2024-01-11'.format(FIAT)):
+      portfolio.process_buy_sell_transaction(btc_transaction('sell', 11, 1, 1000, lot='7'))
+
+  def test_rejects_unexpected_lot_ids(self):
+    portfolio = portfolio_of('specific_id', self.PRICES)
+    with self.assertRaisesRegex(Exception, 'Unexpected lot ids: 3;x'):
+      portfolio.process_buy_sell_transaction(btc_transaction('sell', 10, 1, 1000, lot='3;x'))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -1,8 +1,12 @@
+import gc
 import re
+import zlib
 import pprint
 import copy
-from datetime import datetime, timezone
-from dateutil import parser
+from array import array
+from collections import namedtuple, deque as collections_deque
+from collections.abc import Mapping
+from datetime import datetime, timedelta, timezone
 from shared_def import (
     FY_START_MONTH, FIATS, CRYPTOS, PAIR_SPLIT_MAP,
     LOCALE_FIAT, PARSE_DATETIME_FORMATS, FIELDS
@@ -43,6 +47,8 @@ def datetime_parser(x):
     except BaseException as _:
       continue
 
+  # dateutil is only needed for formats none of the above parse, imported then
+  from dateutil import parser
   try:
     result = parser.parse(x)
     # If timezone-naive, assume UTC
@@ -54,6 +60,182 @@ def datetime_parser(x):
     raise
 
 
+# ISO 8601 like datetimes, also with month/day/hour not zero padded, e.g. 2024-3-14T09:11:00.711Z
+ISO_DATETIME_RE = re.compile(
+    r'(\d{4})-(\d{1,2})-(\d{1,2})[T ](\d{1,2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?'
+    r'(Z|[+-]\d{2}(?::?\d{2})?)?$')
+
+
+def iso_datetime_parser(x):
+  """ parse an ISO 8601 like datetime matching ISO_DATETIME_RE, None if it doesn't match """
+  matched = ISO_DATETIME_RE.match(x)
+  if not matched:
+    return None
+  year, month, day, hour, minute, second, fraction, offset = matched.groups()
+  tzinfo = timezone.utc
+  if offset and offset != 'Z':
+    minutes = int(offset[1:3]) * 60 + (int(offset[-2:]) if len(offset) > 3 else 0)
+    if minutes:
+      tzinfo = timezone(timedelta(minutes=-minutes if offset[0] == '-' else minutes))
+  return datetime(int(year), int(month), int(day), int(hour), int(minute),
+                  int(second) if second else 0,
+                  int(fraction.ljust(6, '0')) if fraction else 0,
+                  tzinfo=tzinfo)
+
+
+_NUMERIC_DIRECTIVES = {
+    'Y': ('year', r'(\d{4})'),
+    'm': ('month', r'(\d{1,2})'),
+    'd': ('day', r'(\d{1,2})'),
+    'H': ('hour', r'(\d{1,2})'),
+    'M': ('minute', r'(\d{1,2})'),
+    'S': ('second', r'(\d{1,2})'),
+}
+
+
+def _strptime_shape(fmt):
+  """ regex of fmt with any text for each directive, matching at least the values strptime parses by fmt """
+  pattern = []
+  index = 0
+  while index < len(fmt):
+    char = fmt[index]
+    if char == '%' and index + 1 < len(fmt):
+      pattern.append('%' if fmt[index + 1] == '%' else '.*?')
+      index += 2
+    elif char.isspace():
+      while index < len(fmt) and fmt[index].isspace():
+        index += 1
+      pattern.append(r'\s+')
+    else:
+      pattern.append(re.escape(char))
+      index += 1
+  return ''.join(pattern) + '$'
+
+
+def _strptime_strategy(fmt):
+  """
+  parse by fmt, formats of only numeric date/time directives are turned into a regex
+  which gives the same result as strptime without its per call overhead
+  """
+  pattern = []
+  names = []
+  index = 0
+  while index < len(fmt):
+    char = fmt[index]
+    if char == '%' and index + 1 < len(fmt):
+      directive = _NUMERIC_DIRECTIVES.get(fmt[index + 1])
+      if directive is None or directive[0] in names:
+        pattern = None
+        break
+      names.append(directive[0])
+      pattern.append(directive[1])
+      index += 2
+    else:
+      pattern.append(r'\s+' if char.isspace() else re.escape(char))
+      index += 1
+  if pattern is not None and 'year' in names:
+    compiled = re.compile(''.join(pattern) + '$')
+    def parse_numeric(x):
+      matched = compiled.match(x)
+      if not matched:
+        raise ValueError('{} does not match format {}'.format(x, fmt))
+      values = dict(zip(names, map(int, matched.groups())))
+      return datetime(values['year'], values.get('month', 1), values.get('day', 1),
+                      values.get('hour', 0), values.get('minute', 0), values.get('second', 0),
+                      tzinfo=timezone.utc)
+    parse_numeric.shape = compiled.match
+    return parse_numeric
+
+  def parse(x):
+    result = datetime.strptime(x, fmt)
+    # If timezone-naive, assume UTC
+    if result.tzinfo is None:
+      result = result.replace(tzinfo=timezone.utc)
+    return result
+  # the literal text of fmt around its directives, as strptime matches it: values without it
+  # are skipped without going through strptime, see DatetimeParser
+  parse.shape = re.compile(_strptime_shape(fmt), re.IGNORECASE | re.DOTALL).match
+  return parse
+
+
+def _fromisoformat_strategy(x):
+  result = datetime.fromisoformat(x)
+  if result.tzinfo is None:
+    result = result.replace(tzinfo=timezone.utc)
+  return result
+
+
+def _iso_regex_strategy(x):
+  result = iso_datetime_parser(x)
+  if result is None:
+    raise ValueError('Not an ISO datetime: {}'.format(x))
+  return result
+
+
+class DatetimeParser(object):
+  """
+  datetime_parser for the values of one column, e.g. the Datetime column of a file.
+  The first strategy to parse a value (PARSE_DATETIME_FORMATS in order, datetime.fromisoformat,
+  ISO_DATETIME_RE, then dateutil) is detected once, the following values skip the strategies after it.
+  Strategies listed before it still come first, formats can overlap (e.g. %I and %H hours with %p),
+  so each value gets the first strategy in order that parses it, as datetime_parser gives it.
+  Results of recent strings are memoized.
+  """
+  def __init__(self, formats=None, memo_size=4096):
+    formats = PARSE_DATETIME_FORMATS if formats is None else formats
+    self._strategies = [_strptime_strategy(fmt) for fmt in formats] + [_fromisoformat_strategy, _iso_regex_strategy]
+    self._shapes = [getattr(strategy, 'shape', None) for strategy in self._strategies]
+    self._detected = None # index of the strategy detected
+    self._memo = {}
+    self._memo_size = memo_size
+
+  def __call__(self, x):
+    if not x:
+      return None
+    memo = self._memo
+    result = memo.get(x)
+    if result is None:
+      result = self._parse(x)
+      if len(memo) >= self._memo_size:
+        memo.clear() # bounded, values repeat close to each other in a sorted log
+      memo[x] = result
+    return result
+
+  def _first_parsing(self, x, start, stop):
+    """ (index, datetime) of the first strategy from start to stop to parse x, (None, None) if none does """
+    strategies = self._strategies
+    shapes = self._shapes
+    for index in range(start, stop):
+      shape = shapes[index]
+      if shape is not None and not shape(x):
+        continue
+      try:
+        return index, strategies[index](x)
+      except ValueError:
+        continue
+    return None, None
+
+  def _parse(self, x):
+    detected = self._detected
+    if detected is not None:
+      # up to the one detected, the later ones only when none of them parse it
+      index, result = self._first_parsing(x, 0, detected + 1)
+      if index is not None:
+        return result
+    index, result = self._first_parsing(x, 0 if detected is None else detected + 1, len(self._strategies))
+    self._detected = index
+    if index is not None:
+      return result
+    return datetime_parser(x)
+
+
+def financial_year_of(value):
+  """ financial year a datetime falls in, named after the calendar year it ends in """
+  if value is None:
+    return None
+  return value.year if value.month < FY_START_MONTH else value.year + 1
+
+
 # [data.fields] configured fields parsers
 PARSER_MAP = {
     '_type': no_parser,
@@ -62,6 +244,7 @@ PARSER_MAP = {
     'operation': lambda x: str(x).lower(),
     'pair': lambda x: str(x).lower(),
     'comments': no_parser,
+    'lot': no_parser,
 }
 
 def _add_crypto_fiat_parsers():
@@ -76,43 +259,166 @@ def _add_crypto_fiat_parsers():
 _add_crypto_fiat_parsers()
 
 
-class Transaction(dict):
+# slot holding each non numeric field, the ones derived values depend on sit behind properties
+TEXT_SLOTS = {
+    '_type': '_type',
+    'exchange': 'exchange',
+    'datetime': '_datetime',
+    'operation': '_operation',
+    'pair': '_pair',
+    'comments': 'comments',
+    'lot': 'lot',
+    'volume': 'volume',
+}
+
+# every other field is numeric, stored in one array per transaction at a precomputed column
+NUMERIC_FIELDS = tuple(key for key in PARSER_MAP if key not in TEXT_SLOTS)
+COLUMN_INDEX = {name: index for index, name in enumerate(NUMERIC_FIELDS)}
+_ZERO_ROW = array('d', [0.0] * len(NUMERIC_FIELDS))
+
+
+class Transaction(Mapping):
+  """
+  A transaction record: text fields in slots, numeric fields in an array('d') indexed by COLUMN_INDEX,
+  left2right and financial_year derived once when pair, operation or datetime is set.
+  Fields are available as attributes and through a read/write dict-like view keyed by field name.
+  """
+  __slots__ = tuple(TEXT_SLOTS.values()) + ('_values', '_left2right', '_financial_year')
+
+  KEYS = tuple(PARSER_MAP) + ('volume',)
+
   def __init__(self):
-    super(Transaction, self).__init__()
-    for key, value in PARSER_MAP.items():
-      self[key] = value('')
-    self['volume'] = None
+    for key, slot in TEXT_SLOTS.items():
+      setattr(self, slot, PARSER_MAP[key]('') if key in PARSER_MAP else None)
+    self._values = array('d', _ZERO_ROW)
+    self._derive()
 
   @classmethod
-  def createFrom(cls, attrs, values):
-    """ create """
+  def createFrom(cls, attrs, values, parse_datetime=None):
+    """ create, parse_datetime e.g. a DatetimeParser of the file replaces datetime_parser """
     trans = Transaction()
-    zipped = zip(attrs, values)
-    for item in zipped:
-      if item[0] in PARSER_MAP:
-        trans[item[0]] = PARSER_MAP[item[0]](item[1])
+    row = trans._values
+    for name, value in zip(attrs, values):
+      index = COLUMN_INDEX.get(name)
+      if index is not None:
+        row[index] = float_parser(value)
+      elif name == 'datetime' and parse_datetime is not None:
+        trans._datetime = parse_datetime(value)
+      elif name in PARSER_MAP:
+        setattr(trans, TEXT_SLOTS[name], PARSER_MAP[name](value))
+    trans._derive()
 
     if trans.datetime is None:
-      raise Exception('Missing datetime in transaction: {}'.format(pp.pformat(trans)))
+      raise Exception('Missing datetime in transaction: {}'.format(pp.pformat(dict(trans))))
     return trans
 
-  def __getattr__(self, name):
+  def toRow(self, attrs):
     """
-    Dynamically provide property access to all fields.
+    values of attrs as pycgt CSV text, the reverse of createFrom: numbers as their shortest
+    round-tripping text with zero left empty, the datetime in ISO 8601
     """
-    if name in FIELDS.values() or name == 'volume':
-      return self[name]
-    
-    raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+    row = []
+    values = self._values
+    for name in attrs:
+      index = COLUMN_INDEX.get(name)
+      if index is not None:
+        value = values[index]
+        row.append(repr(value) if value else '')
+      elif name == 'datetime':
+        row.append(self._datetime.isoformat() if self._datetime is not None else '')
+      else:
+        value = getattr(self, TEXT_SLOTS[name]) if name in TEXT_SLOTS else None
+        row.append('' if value is None else value)
+    return row
 
-  def __setattr__(self, name, value):
-    """
-    Dynamically provide property setters for all fields.
-    """
-    if name in FIELDS.values() or name == 'volume':
-      self[name] = value
+  def _derive(self):
+    """ compute values derived from pair, operation and datetime """
+    pair = self._pair
+    if pair and not pair in PAIR_SPLIT_MAP:
+      self._left2right = None # unexpected pair, raised when left2right is asked for
+    elif not self._operation in ['buy', 'sell']:
+      self._left2right = ('', '')
+    else:
+      splitted = tuple(PAIR_SPLIT_MAP[pair]) if pair else ('', '')
+      self._left2right = (splitted[1], splitted[0]) if self._operation == 'buy' else splitted
+
+    self._financial_year = financial_year_of(self._datetime)
+
+  def __getitem__(self, key):
+    index = COLUMN_INDEX.get(key)
+    if index is not None:
+      return self._values[index]
+    slot = TEXT_SLOTS.get(key)
+    if slot is None:
+      raise KeyError(key)
+    return getattr(self, slot)
+
+  def __setitem__(self, key, value):
+    index = COLUMN_INDEX.get(key)
+    if index is not None:
+      self._values[index] = value
+    elif key in TEXT_SLOTS:
+      setattr(self, key, value)
     else:
-      super().__setattr__(name, value)
+      raise KeyError(key)
+
+  def __contains__(self, key):
+    return key in COLUMN_INDEX or key in TEXT_SLOTS
+
+  def __iter__(self):
+    return iter(Transaction.KEYS)
+
+  def __len__(self):
+    return len(Transaction.KEYS)
+
+  def __repr__(self):
+    return '{}({!r})'.format(type(self).__name__, dict(self))
+
+  _STATE_SLOTS = tuple(slot for slot in __slots__ if slot != '_values')
+
+  def __getstate__(self):
+    """ compact pickled form, the numeric columns as raw bytes """
+    return tuple(getattr(self, slot) for slot in Transaction._STATE_SLOTS) + (self._values.tobytes(),)
+
+  def __setstate__(self, state):
+    for slot, value in zip(Transaction._STATE_SLOTS, state):
+      setattr(self, slot, value)
+    self._values = array('d')
+    self._values.frombytes(state[-1])
+
+  def __copy__(self):
+    copied = Transaction.__new__(Transaction)
+    for slot in Transaction.__slots__:
+      setattr(copied, slot, getattr(self, slot))
+    copied._values = array('d', self._values)
+    return copied
+
+  @property
+  def datetime(self):
+    return self._datetime
+
+  @datetime.setter
+  def datetime(self, value):
+    self._datetime = value
+    self._derive()
+
+  @property
+  def operation(self):
+    return self._operation
+
+  @operation.setter
+  def operation(self, value):
+    self._operation = value
+    self._derive()
+
+  @property
+  def pair(self):
+    return self._pair
+
+  @pair.setter
+  def pair(self, value):
+    self._pair = value
+    self._derive()
 
   @property
   def fiat(self):
@@ -126,20 +432,13 @@ class Transaction(dict):
   @property
   def left2right(self):
     """ return a tuple which indicates the transaction is from which(left) to which(right) """
-    if self.pair and not self.pair in PAIR_SPLIT_MAP:
+    if self._left2right is None:
       raise Exception('Unexpected pair: {}'.format(self.pair))
-    if not self.operation in ['buy', 'sell']:
-      return ('', '')
-
-    splitted = tuple(PAIR_SPLIT_MAP[self.pair]) if self.pair else ('', '')
-    return (splitted[1], splitted[0]) if self.operation == 'buy' else splitted
+    return self._left2right
 
   @property
   def financial_year(self):
-    if self.datetime.month < FY_START_MONTH:
-      return self.datetime.year
-    else:
-      return self.datetime.year + 1
+    return self._financial_year
 
   BRIEF_KEYS = ['datetime', 'operation', 'pair', LOCALE_FIAT.lower(), 'usd', 'volume']
 
@@ -148,31 +447,47 @@ class Transaction(dict):
     """ return a dict which contains brief information of this transaction """
     brief_keys = Transaction.BRIEF_KEYS[:-1] # exclude volume
     result = dict(**{my_key: self[my_key] for my_key in brief_keys})
+    result.update(volume=self.brief_volume)
+    return result
+
+  @property
+  def brief_volume(self):
+    """ volume shown in brief, from the traded crypto or first non-zero currency when not set """
     if self.volume is not None:
-      result.update(volume=self.volume)
+      return self.volume
+    volume_key = None
+    left2right = self.left2right
+    if self.operation == 'buy':
+      volume_key = left2right[1]
+    elif self.operation == 'sell':
+      volume_key = left2right[0]
     else:
-      volume_key = None
-      left2right = self.left2right
-      if self.operation == 'buy':
-        volume_key = left2right[1]
-      elif self.operation == 'sell':
-        volume_key = left2right[0]
-      else:
-        for item in CRYPTOS:
+      for item in CRYPTOS:
+        if self[item] > 0:
+          volume_key = item
+          break
+      if volume_key is None:
+        for item in FIATS:
           if self[item] > 0:
             volume_key = item
             break
-        if volume_key is None:
-          for item in FIATS:
-            if self[item] > 0:
-              volume_key = item
-              break
-      if volume_key:
-        result.update(volume=self[volume_key])
-      else:
-        logger.warning('Cannot find volume for transaction: {}'.format(pp.pformat(self)))
-        result.update(volume='N/A')
-    return result
+    if volume_key:
+      return self[volume_key]
+    logger.warning('Cannot find volume for transaction: {}'.format(pp.pformat(dict(self))))
+    return 'N/A'
+
+  def snapshot(self, volume=None, fiat=None):
+    """
+    Immutable brief of this transaction for positions and gains/losses to hold on to,
+    volume and fiat override what the brief would show, e.g. for the fee leg of a disposal
+    """
+    return TransactionBrief(
+        datetime=self['datetime'],
+        operation=self['operation'],
+        pair=self['pair'],
+        fiat=self.fiat if fiat is None else fiat,
+        usd=self['usd'],
+        volume=self.brief_volume if volume is None else volume)
 
   @staticmethod
   def create_na_brief():
@@ -188,7 +503,7 @@ class Transaction(dict):
     """ create mock sell transaction from a non buy/sell transaction crypto fee """
     if tran.operation in ['buy', 'sell']:
       raise Exception('Cannot mock sell transaction from buy/sell transaction')
-    mocked = copy.deepcopy(tran)
+    mocked = copy.copy(tran) # values are all immutable, a shallow copy is enough
     mocked.operation = 'sell'
     fee_crypto = None
     for crypto in CRYPTOS:
@@ -208,3 +523,90 @@ class Transaction(dict):
     mocked[LOCALE_FIAT.lower()] = tran[fiat_fee_field] if fiat_fee_field in tran else 0
     mocked[fiat_fee_field]
     return mocked
+
+
+def _column_property(index):
+  """ attribute access to a numeric column of Transaction """
+  def getter(self):
+    return self._values[index]
+
+  def setter(self, value):
+    self._values[index] = value
+
+  return property(getter, setter)
+
+
+def _add_column_properties():
+  for name, index in COLUMN_INDEX.items():
+    if hasattr(Transaction, name):
+      raise Exception('Field {} clashes with an attribute of Transaction'.format(name))
+    setattr(Transaction, name, _column_property(index))
+
+_add_column_properties()
+
+
+def pack_transactions(transactions):
+  """
+  Compact, picklable form of a list of transactions, e.g. to cache them.
+  Every slot becomes a column of indexes into its distinct values, and the numeric
+  columns one zlib compressed array of all transactions row after row, mostly zeros.
+  """
+  slots = Transaction._STATE_SLOTS
+  columns = []
+  for slot in slots:
+    distinct = {}
+    values = []
+    indexes = array('I')
+    for tran in transactions:
+      value = getattr(tran, slot)
+      # equal datetimes of different offsets print differently, keep both
+      key = (value, value.utcoffset()) if slot == '_datetime' and value is not None else value
+      index = distinct.get(key)
+      if index is None:
+        index = distinct[key] = len(values)
+        values.append(value)
+      indexes.append(index)
+    columns.append((values, indexes))
+  rows = b''.join(tran._values.tobytes() for tran in transactions)
+  return (len(transactions), slots, NUMERIC_FIELDS, columns, zlib.compress(rows, 1))
+
+
+def unpack_transactions(packed):
+  """ transactions packed by pack_transactions """
+  count, slots, numeric_fields, columns, rows = packed
+  if slots != Transaction._STATE_SLOTS or numeric_fields != NUMERIC_FIELDS:
+    raise Exception('Packed transactions of a different layout')
+  # nothing created here can be garbage, don't let the collector walk it again and again meanwhile
+  gc_enabled = gc.isenabled()
+  gc.disable()
+  try:
+    transactions = [Transaction.__new__(Transaction) for _ in range(count)]
+    for slot, (values, indexes) in zip(slots, columns):
+      # set through the slot descriptor, mapping over all transactions at once
+      collections_deque(map(getattr(Transaction, slot).__set__, transactions, map(values.__getitem__, indexes)), maxlen=0)
+    values = array('d')
+    values.frombytes(zlib.decompress(rows))
+    width = len(NUMERIC_FIELDS)
+    set_values = Transaction._values.__set__
+    for number, tran in enumerate(transactions):
+      set_values(tran, values[number * width:(number + 1) * width])
+  finally:
+    if gc_enabled:
+      gc.enable()
+  return transactions
+
+
+class TransactionBrief(namedtuple('TransactionBrief', ['datetime', 'operation', 'pair', 'fiat', 'usd', 'volume'])):
+  """
+  Compact immutable record of the values a brief of a transaction shows.
+  Positions and gains/losses share it instead of holding copies of the whole transaction.
+  """
+  __slots__ = ()
+
+  @property
+  def brief(self):
+    """ same dict as Transaction.brief gives """
+    result = dict(datetime=self.datetime, operation=self.operation, pair=self.pair)
+    result[LOCALE_FIAT.lower()] = self.fiat
+    result.update(usd=self.usd, volume=self.volume)
+    return result
@@ -1,3 +1,3 @@
-from .get_transformer import get_transformer
+from .get_transformer import get_transformer, transform_exchange_logs
 
-__all__ = ['get_transformer']
\ No newline at end of file
+__all__ = ['get_transformer', 'transform_exchange_logs']
\ No newline at end of file
@@ -1,15 +1,41 @@
-
-
 import csv
+from functools import partial
+from operator import attrgetter
 from abc import ABC, abstractmethod
 from shared_def import FIELDS, CRYPTOS, LOCALE_FIAT, STABLECOINS
 from logger import logger
 from market_data_provider import MarketDataProviderFactory
-from transaction import float_parser, datetime_parser
+from market_data_provider.concurrent_fetch import fetch_all
+from transaction import Transaction, DatetimeParser
+
+
+def write_pycgt_file(output_file, transactions):
+    """
+    Write transactions to a pycgt-formatted CSV file
+
+    Args:
+        output_file: Output CSV file path
+        transactions: List of Transaction objects
+    """
+    fieldnames = list(FIELDS.keys())
+    attrs = [FIELDS[fieldname] for fieldname in fieldnames]
+
+    with open(output_file, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+        for transaction in transactions:
+            writer.writerow(transaction.toRow(attrs))
+
+    logger.info(f"Wrote {len(transactions)} transactions to {output_file}")
 
 
 class BaseTransformer(ABC):
-    """Base class for exchange log transformers"""
+    """
+    Base class for exchange log transformers.
+
+    Transformers emit Transaction objects, the typed records the CGT engine works on, with numbers
+    as floats and datetimes parsed; write_pycgt_csv is the adapter to the pycgt CSV format.
+    """
 
     def __init__(self, input_files, output_file):
         """
@@ -17,10 +43,11 @@ class BaseTransformer(ABC):
 
         Args:
             input_files: List of input CSV file paths
-            output_file: Output CSV file path
+            output_file: Output CSV file path, None to keep the transactions in memory only
         """
         self.input_files = input_files
         self.output_file = output_file
+        self.parse_datetime = DatetimeParser()
         self.forex_provider = MarketDataProviderFactory.create_forex_provider()
         self.crypto_provider = MarketDataProviderFactory.create_crypto_provider()
 
@@ -30,175 +57,160 @@ class BaseTransformer(ABC):
         Transform exchange logs to pycgt format
 
         This method should be implemented by each exchange-specific transformer.
+
+        Returns:
+            List of Transaction objects, sorted by datetime
         """
         pass
 
     def write_pycgt_csv(self, transactions):
         """
-        Write transactions to pycgt-formatted CSV file
+        Write transactions to the pycgt-formatted output file, if there is one
 
         Args:
-            transactions: List of transaction dictionaries with pycgt field names
+            transactions: List of Transaction objects
         """
-        # Define pycgt CSV header
-        fieldnames = FIELDS.keys()
+        if self.output_file:
+            write_pycgt_file(self.output_file, transactions)
 
-        with open(self.output_file, 'w', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
-            writer.writeheader()
-            for transaction in transactions:
-                writer.writerow(transaction)
+    def sort_by_datetime(self, transactions):
+        """
+        Sort transactions by datetime in place, stable for transactions at the same datetime.
 
-        logger.info(f"Wrote {len(transactions)} transactions to {self.output_file}")
+        Args:
+            transactions: List of Transaction objects
+        """
+        transactions.sort(key=attrgetter('datetime'))
 
     def autofill_locale_fiat_and_fees(self, transactions):
         """
         Auto-fill locale fiat amounts and fees from USD using forex and crypto market data.
 
         This method:
-        1. Sorts transactions by datetime
-        2. Queries forex rates for LOCALE_FIAT/USD conversion
-        3. Auto-fills locale fiat amounts from USD values
-        4. Auto-fills locale fiat fee amounts from USD fee values
-        5. Auto-fills locale fiat fee amounts from crypto fee values using market prices
+        1. Collects the crypto fees of all transactions, and the dates needing crypto/USD prices
+        2. Queries forex rates for LOCALE_FIAT/USD conversion, and the crypto/USD prices
+        3. In one pass over the transactions, auto-fills:
+           - locale fiat amounts from USD (and USDT) values
+           - locale fiat fee amounts from USD (and USDT) fee values
+           - locale fiat fee amounts from crypto fee values using market prices
 
         Args:
-            transactions: List of transaction dictionaries with pycgt field names
+            transactions: List of Transaction objects, sorted by datetime
 
         Returns:
-            The same transactions list (modified in-place) sorted by datetime
+            The same transactions list (modified in-place)
         """
+        if not transactions:
+            return transactions
+
         locale_fiat_upper = LOCALE_FIAT.upper()
         locale_fiat_lower = LOCALE_FIAT.lower()
         forexpair = f'{locale_fiat_lower}usd'
-        dayrate = dict()
-
-        if locale_fiat_lower != 'usd':
-            # Get date range for forex query
-            start_datetime = datetime_parser(transactions[0]['Datetime'])
-            end_datetime = datetime_parser(transactions[-1]['Datetime'])
-            dayrate = self.forex_provider.query(forexpair, start_datetime.date(), end_datetime.date())
-
-            # Autofill locale fiat amounts from USD
-            for tran in transactions:
-                tran_datetime = datetime_parser(tran['Datetime'])
-                date_key = tran_datetime.date().isoformat()
-                rate = dayrate.get(date_key, 0)
-                if rate > 0:
-                    tran[forexpair.upper()] = str(rate)
-                    usd_value = float_parser(tran['USD'])
-                    locale_fiat_value = float_parser(tran[locale_fiat_upper])
-                    if usd_value > 0 and locale_fiat_value == 0:
-                        tran[locale_fiat_upper] = str(usd_value / rate)
-
-                    fee_usd_value = float_parser(tran['Fee(USD)'])
-                    fee_locale_fiat_value = float_parser(tran[f'Fee({locale_fiat_upper})'])
-                    if fee_usd_value > 0 and fee_locale_fiat_value == 0:
-                        tran[f'Fee({locale_fiat_upper})'] = str(fee_usd_value / rate)
-
-                    if 'usdt' in CRYPTOS:
-                        # Autofill USDT amounts/fees if applicable
-                        usdt_value = float_parser(tran['USDT'])
-                        locale_fiat_value = float_parser(tran[locale_fiat_upper])
-                        if usdt_value > 0 and locale_fiat_value == 0:
-                            tran[locale_fiat_upper] = str(usdt_value / rate)
-
-                        fee_usdt_value = float_parser(tran['Fee(USDT)'])
-                        fee_locale_fiat_value = float_parser(tran[f'Fee({locale_fiat_upper})'])
-                        if fee_usdt_value > 0 and fee_locale_fiat_value == 0:
-                            tran[f'Fee({locale_fiat_upper})'] = str(fee_usdt_value / rate)
-                else:
-                    logger.warning(f"Missing {forexpair} rate for {date_key}, cannot convert USD to {locale_fiat_upper}")
-
-        # Autofill crypto fee amounts to locale fiat
-        # Step 1: Collect cryptos with fees and identify dates needing price queries
-        # We only need to query prices for dates where the rate is NOT available in the transaction
+        fee_locale_fiat = f'fee_{locale_fiat_lower}'
+        has_forexpair = forexpair in Transaction.KEYS
+        has_usdt = 'usdt' in CRYPTOS
+        # crypto/USD pair columns, None for a crypto with none, its price then only queried
+        fee_columns = [(crypto, f'fee_{crypto}', f'{crypto}usd' if f'{crypto}usd' in Transaction.KEYS else None)
+                       for crypto in CRYPTOS]
+
+        # Step 1: Collect crypto fees, and the dates needing crypto/USD price queries:
+        # only where the rate is NOT available in the transaction
+        crypto_fees = {}  # {transaction index: [(crypto, pair, fee_value)]}
         crypto_dates_need_query = {}  # {crypto: set of dates}
-
-        for tran in transactions:
-            for crypto in CRYPTOS:
-                crypto_upper = crypto.upper()
-                fee_field = f'Fee({crypto_upper})'
-                fee_value = float_parser(tran.get(fee_field, ''))
-
+        for index, tran in enumerate(transactions):
+            for crypto, fee_column, pair in fee_columns:
+                fee_value = tran[fee_column]
                 if fee_value > 0:
-                    # Check if this transaction already has the crypto/USD rate
+                    crypto_fees.setdefault(index, []).append((crypto, pair, fee_value))
                     # Market Buy/Sell transactions have Rate field when Amount currency is the crypto
-                    pair_field = f'{crypto_upper}USD'
-                    has_rate = pair_field in tran and float_parser(tran.get(pair_field, '')) > 0
-
-                    if not has_rate:
-                        # Need to query price for this date
-                        tran_datetime = datetime_parser(tran['Datetime'])
-                        date_key = tran_datetime.date()
-
-                        if crypto not in crypto_dates_need_query:
-                            crypto_dates_need_query[crypto] = set()
-                        crypto_dates_need_query[crypto].add(date_key)
+                    if pair is None or tran[pair] <= 0:
+                        crypto_dates_need_query.setdefault(crypto, set()).add(tran.datetime.date())
 
-        # Step 2: Query crypto/USD prices only for dates that need them
-        crypto_usd_prices = {}
+        # Step 2: Query forex rates, and crypto/USD prices only for dates that need them,
+        # all pairs and their chunks concurrently, see fetch_all
+        queries = []
+        if locale_fiat_lower != 'usd':
+            # Get date range for forex query
+            queries.append(partial(self.forex_provider.query, forexpair,
+                                   transactions[0].datetime.date(), transactions[-1].datetime.date()))
+        queried_cryptos = []
         for crypto, dates in crypto_dates_need_query.items():
             if crypto in STABLECOINS:
                 continue
-            if dates:
-                cryptousd_pair = f'{crypto}usd'
-                min_date = min(dates)
-                max_date = max(dates)
-                logger.info(f"Querying {cryptousd_pair} prices for {len(dates)} dates ({min_date} to {max_date})")
-                crypto_usd_prices[crypto] = self.crypto_provider.query(cryptousd_pair, min_date, max_date)
-
-        # Step 3: Convert crypto fees to locale fiat (crypto_usd * usd_to_locale_fiat)
-        for tran in transactions:
-            tran_datetime = datetime_parser(tran['Datetime'])
-            date_key = tran_datetime.date().isoformat()
-
-            for crypto in CRYPTOS:
+            cryptousd_pair = f'{crypto}usd'
+            min_date = min(dates)
+            max_date = max(dates)
+            logger.info(f"Querying {cryptousd_pair} prices for {len(dates)} dates ({min_date} to {max_date})")
+            queries.append(partial(self.crypto_provider.query, cryptousd_pair, min_date, max_date))
+            queried_cryptos.append(crypto)
+        fetched = fetch_all(queries)
+
+        if locale_fiat_lower != 'usd':
+            # rates of all transactions looked up at once, 0 where missing
+            forex_rates = fetched.pop(0).lookup((tran.datetime for tran in transactions), 0)
+        else:
+            forex_rates = None
+        crypto_usd_prices = dict(zip(queried_cryptos, fetched))
+
+        # Step 3: One pass filling each transaction
+        for index, tran in enumerate(transactions):
+            rate = forex_rates[index] if forex_rates is not None else 0
+
+            # Autofill locale fiat amounts and fees from USD (and USDT)
+            if rate > 0:
+                if has_forexpair:
+                    tran[forexpair] = rate
+                if tran['usd'] > 0 and tran[locale_fiat_lower] == 0:
+                    tran[locale_fiat_lower] = tran['usd'] / rate
+                if tran['fee_usd'] > 0 and tran[fee_locale_fiat] == 0:
+                    tran[fee_locale_fiat] = tran['fee_usd'] / rate
+                if has_usdt:
+                    if tran['usdt'] > 0 and tran[locale_fiat_lower] == 0:
+                        tran[locale_fiat_lower] = tran['usdt'] / rate
+                    if tran['fee_usdt'] > 0 and tran[fee_locale_fiat] == 0:
+                        tran[fee_locale_fiat] = tran['fee_usdt'] / rate
+            elif locale_fiat_lower != 'usd':
+                logger.warning(f"Missing {forexpair} rate for {tran.datetime.date()}, cannot convert USD to {locale_fiat_upper}")
+
+            # Convert crypto fees to locale fiat (crypto_usd * usd_to_locale_fiat)
+            for crypto, pair, fee_crypto_value in crypto_fees.get(index, ()):
                 if crypto in STABLECOINS:
                     continue
+                date_key = tran.datetime.date()
                 crypto_upper = crypto.upper()
-                fee_crypto_field = f'Fee({crypto_upper})'
-                fee_locale_fiat_field = f'Fee({locale_fiat_upper})'
-
-                fee_crypto_value = float_parser(tran.get(fee_crypto_field, ''))
-                if fee_crypto_value > 0:
-                    # Try to get crypto/USD price from transaction first
-                    pair_field = f'{crypto_upper}USD'
-                    crypto_usd_price = float_parser(tran.get(pair_field, ''))
-
-                    # If not in transaction, get from queried prices
-                    if crypto_usd_price == 0 and crypto in crypto_usd_prices:
-                        crypto_usd_price = crypto_usd_prices[crypto].get(date_key, 0)
-                        # Store the queried price in the transaction for reference
-                        if crypto_usd_price > 0:
-                            tran[pair_field] = str(crypto_usd_price)
-
-                    if crypto_usd_price > 0:
-                        # Calculate fee in USD
-                        fee_usd_value = fee_crypto_value * crypto_usd_price
-
-                        # Convert USD to locale fiat
-                        if locale_fiat_lower != 'usd':
-                            locale_fiat_usd_rate = dayrate.get(date_key, 0)
-                            if locale_fiat_usd_rate > 0:
-                                fee_locale_fiat_value = fee_usd_value / locale_fiat_usd_rate
-                                # Add to existing Fee(locale_fiat) if it exists
-                                existing_fee = float_parser(tran.get(fee_locale_fiat_field, ''))
-                                if existing_fee == 0:
-                                    tran[fee_locale_fiat_field] = str(fee_locale_fiat_value)
-                                else:
-                                    logger.warning(f"Both {fee_locale_fiat_field} and {fee_crypto_field} having value in transaction on {date_key}, skiped auto-fill for it")
+
+                # Try to get crypto/USD price from transaction first
+                crypto_usd_price = tran[pair] if pair is not None else 0
+
+                # If not in transaction, get from queried prices
+                if crypto_usd_price == 0 and crypto in crypto_usd_prices:
+                    crypto_usd_price = crypto_usd_prices[crypto].at(date_key, 0)
+                    # Store the queried price in the transaction for reference
+                    if crypto_usd_price > 0 and pair is not None:
+                        tran[pair] = crypto_usd_price
+
+                if crypto_usd_price > 0:
+                    # Calculate fee in USD
+                    fee_usd_value = fee_crypto_value * crypto_usd_price
+
+                    # Convert USD to locale fiat
+                    if locale_fiat_lower != 'usd':
+                        if rate > 0:
+                            # Add to existing Fee(locale_fiat) if it exists
+                            if tran[fee_locale_fiat] == 0:
+                                tran[fee_locale_fiat] = fee_usd_value / rate
                             else:
-                                logger.warning(f"Missing {forexpair} rate for {date_key}, cannot convert {crypto_upper} fee to {locale_fiat_upper}")
+                                logger.warning(f"Both Fee({locale_fiat_upper}) and Fee({crypto_upper}) having value in transaction on {date_key}, skiped auto-fill for it")
                         else:
-                            # Locale fiat is USD, use USD value if applicable
-                            existing_fee = float_parser(tran.get(fee_locale_fiat_field, ''))
-                            if existing_fee == 0:
-                                tran[fee_locale_fiat_field] = str(fee_usd_value)
-                            else:
-                                logger.warning(f"Both {fee_locale_fiat_field} and {fee_crypto_field} having value in transaction on {date_key}, skiped auto-fill for it")
+                            logger.warning(f"Missing {forexpair} rate for {date_key}, cannot convert {crypto_upper} fee to {locale_fiat_upper}")
                     else:
-                        logger.warning(f"Missing {crypto}usd price for {date_key}, cannot convert {crypto_upper} fee to {locale_fiat_upper}")
+                        # Locale fiat is USD, use USD value if applicable
+                        if tran[fee_locale_fiat] == 0:
+                            tran[fee_locale_fiat] = fee_usd_value
+                        else:
+                            logger.warning(f"Both Fee({locale_fiat_upper}) and Fee({crypto_upper}) having value in transaction on {date_key}, skiped auto-fill for it")
+                else:
+                    logger.warning(f"Missing {crypto}usd price for {date_key}, cannot convert {crypto_upper} fee to {locale_fiat_upper}")
 
         logger.info(f"Converted {len(transactions)} transactions")
         return transactions
@@ -1,8 +1,8 @@
 import csv
 from logger import logger
-from shared_def import CRYPTOS, FIATS, FIELDS
+from shared_def import CRYPTOS, FIATS
 from .base_transformer import BaseTransformer
-from transaction import float_parser, datetime_parser
+from transaction import Transaction, float_parser
 
 
 class BitstampTransformer(BaseTransformer):
@@ -24,7 +24,7 @@ class BitstampTransformer(BaseTransformer):
                         transactions.append(pycgt_transaction)
 
 
-        transactions.sort(key=lambda x: datetime_parser(x['Datetime']))
+        self.sort_by_datetime(transactions)
 
         self.autofill_locale_fiat_and_fees(transactions)
 
@@ -43,89 +43,84 @@ class BitstampTransformer(BaseTransformer):
             row: Dictionary representing a Bitstamp CSV row
 
         Returns:
-            Dictionary with pycgt field names, or None if row should be skipped
+            Transaction, or None if row should be skipped
         """
         transaction_type = row['Type']
         subtype = row['Subtype']  # Buy/Sell for Market transactions
 
-        # Initialize pycgt transaction with default empty values from FIELDS
-        pycgt_row = {field: '' for field in FIELDS.keys()}
+        # Initialize pycgt transaction, all amounts zero
+        pycgt_row = Transaction()
 
         # Set basic transaction info
-        pycgt_row['Type'] = transaction_type
-        pycgt_row['Exchange'] = 'Bitstamp'
-        pycgt_row['Datetime'] = row['Datetime']
-        pycgt_row['Comments'] = f"Order ID: {row['Order ID']}" if row['Order ID'] else ''
+        pycgt_row['_type'] = transaction_type
+        pycgt_row['exchange'] = 'Bitstamp'
+        pycgt_row.datetime = self.parse_datetime(row['Datetime'])
+        pycgt_row['comments'] = f"Order ID: {row['Order ID']}" if row['Order ID'] else ''
 
         rate = row['Rate']
-        amount = row['Amount']
-        amount_currency = row['Amount currency'].upper()
-        value = row['Value']
+        amount_currency = row['Amount currency'].lower()
         float_rate = float_parser(rate)
-        float_amount = float_parser(amount)
+        float_amount = float_parser(row['Amount'])
+        value = float_parser(row['Value'])
         if float_rate > 0 and float_amount > 0:
-            value = str(float_rate * float_amount)
-        value_currency = row['Value currency'].upper()
+            value = float_rate * float_amount
+        value_currency = row['Value currency'].lower()
         fee = row['Fee']
-        fee_currency = row['Fee currency'].upper()
+        fee_currency = row['Fee currency'].lower()
 
         # Handle Market Buy/Sell transactions
         if transaction_type == 'Market' and subtype in ['Buy', 'Sell']:
-            pycgt_row['Operation'] = subtype.lower()
+            pycgt_row.operation = subtype.lower()
 
-            # Create trading pair (e.g., BTCUSD, ETHUSD)
+            # Create trading pair (e.g., btcusd, ethusd)
             if value_currency:
-                pycgt_row['Pair'] = f"{amount_currency}{value_currency}".lower()
+                pycgt_row.pair = f"{amount_currency}{value_currency}"
 
             # Set crypto amount
-            if amount_currency.lower() in CRYPTOS:
-                pycgt_row[amount_currency] = amount
+            if amount_currency in CRYPTOS:
+                pycgt_row[amount_currency] = float_amount
 
             # Set fiat value
-            if value_currency.lower() in FIATS:
+            if value_currency in FIATS:
                 pycgt_row[value_currency] = value
 
             # Set exchange rate
             if rate and value_currency:
-                rate_pair = f"{amount_currency}{value_currency}".upper()
+                rate_pair = f"{amount_currency}{value_currency}"
                 if rate_pair in pycgt_row:
-                    pycgt_row[rate_pair] = rate
+                    pycgt_row[rate_pair] = float_rate
 
             # Set fee
             if fee and fee_currency:
-                fee_field = f"Fee({fee_currency})"
+                fee_field = f"fee_{fee_currency}"
                 if fee_field in pycgt_row:
-                    pycgt_row[fee_field] = fee
+                    pycgt_row[fee_field] = float_parser(fee)
 
         # Handle Deposit transactions
         elif transaction_type == 'Deposit':
-            pycgt_row['Operation'] = 'deposit'
+            pycgt_row.operation = 'deposit'
 
-            if amount_currency.lower() in CRYPTOS:
-                pycgt_row[amount_currency] = amount
-            elif amount_currency.lower() in FIATS:
-                pycgt_row[amount_currency] = amount
+            if amount_currency in CRYPTOS or amount_currency in FIATS:
+                pycgt_row[amount_currency] = float_amount
 
             # Set fee
             if fee and fee_currency:
-                fee_field = f"Fee({fee_currency})"
+                fee_field = f"fee_{fee_currency}"
                 if fee_field in pycgt_row:
-                    pycgt_row[fee_field] = fee
+                    pycgt_row[fee_field] = float_parser(fee)
 
         # Handle Withdrawal transactions
         elif transaction_type == 'Withdrawal':
-            pycgt_row['Operation'] = 'withdrawal'
+            pycgt_row.operation = 'withdrawal'
 
-            if amount_currency.lower() in CRYPTOS:
-                pycgt_row[amount_currency] = amount
-            elif amount_currency.lower() in FIATS:
-                pycgt_row[amount_currency] = amount
+            if amount_currency in CRYPTOS or amount_currency in FIATS:
+                pycgt_row[amount_currency] = float_amount
 
             # Set fee
             if fee and fee_currency:
-                fee_field = f"Fee({fee_currency})"
+                fee_field = f"fee_{fee_currency}"
                 if fee_field in pycgt_row:
-                    pycgt_row[fee_field] = fee
+                    pycgt_row[fee_field] = float_parser(fee)
 
         else:
             logger.warning(f"Skipping unsupported transaction type: {transaction_type}/{subtype}")
@@ -1,7 +1,7 @@
 import csv
-from datetime import datetime, timezone
 from transformer.base_transformer import BaseTransformer
-from shared_def import CRYPTOS, FIATS, FIELDS
+from shared_def import CRYPTOS, FIATS
+from transaction import Transaction, float_parser
 from logger import logger
 
 
@@ -44,14 +44,14 @@ class ExodusTransformer(BaseTransformer):
                     self._convert_exodus_row(row, transactions)
 
         # Sort by datetime ascending
-        transactions.sort(key=lambda x: x['Datetime'])
+        self.sort_by_datetime(transactions)
 
         # Auto-fill locale fiat and fees
         self.autofill_locale_fiat_and_fees(transactions)
 
         logger.info(f"Converted {len(transactions)} transactions")
         self.write_pycgt_csv(transactions)
-        logger.info(f"Wrote {len(transactions)} transactions to {self.output_file}")
+        return transactions
 
     def _convert_exodus_row(self, row, transactions):
         """Convert a single Exodus row to pycgt format transaction(s)"""
@@ -81,13 +81,13 @@ class ExodusTransformer(BaseTransformer):
 
         # Create deposit transaction
         tran = self._create_base_transaction(datetime_str, 'deposit', row)
-        tran['Type'] = 'Deposit'
-        tran[in_currency.upper()] = in_amount
+        tran['_type'] = 'Deposit'
+        tran[in_currency] = float_parser(in_amount)
 
         # Build comments with additional fields
         comment_parts = [f"Exodus deposit: {in_amount} {in_currency.upper()}"]
         comment_parts.extend(self._build_additional_comments(row))
-        tran['Comments'] = '; '.join(comment_parts)
+        tran['comments'] = '; '.join(comment_parts)
 
         transactions.append(tran)
 
@@ -109,22 +109,22 @@ class ExodusTransformer(BaseTransformer):
 
         # Create withdrawal transaction
         tran = self._create_base_transaction(datetime_str, 'withdrawal', row)
-        tran['Type'] = 'Withdrawal'
+        tran['_type'] = 'Withdrawal'
         # Make amount positive (Exodus uses negative amounts)
-        tran[out_currency.upper()] = out_amount.lstrip('-')
+        tran[out_currency] = float_parser(out_amount.lstrip('-'))
 
         # Add fee if present
         if fee_amount and fee_currency:
             if fee_currency not in [c.lower() for c in CRYPTOS] and fee_currency not in [f.lower() for f in FIATS]:
                 logger.warning(f"Fee currency '{fee_currency}' not in CRYPTOS or FIATS")
             else:
-                fee_field = f'Fee({fee_currency.upper()})'
-                tran[fee_field] = fee_amount.lstrip('-')
+                fee_field = f'fee_{fee_currency}'
+                tran[fee_field] = float_parser(fee_amount.lstrip('-'))
 
         # Build comments with additional fields
         comment_parts = [f"Exodus withdrawal: {out_amount} {out_currency.upper()}"]
         comment_parts.extend(self._build_additional_comments(row))
-        tran['Comments'] = '; '.join(comment_parts)
+        tran['comments'] = '; '.join(comment_parts)
 
         transactions.append(tran)
 
@@ -169,10 +169,10 @@ class ExodusTransformer(BaseTransformer):
         return comment_parts
 
     def _create_base_transaction(self, datetime_str, operation, row):
-        """Create a base transaction dict with common fields"""
-        tran = {field: '' for field in FIELDS.keys()}
-        tran['Exchange'] = 'Exodus'
-        tran['Datetime'] = datetime_str
-        tran['Operation'] = operation
+        """Create a base Transaction with common fields"""
+        tran = Transaction()
+        tran['exchange'] = 'Exodus'
+        tran.datetime = self.parse_datetime(datetime_str)
+        tran.operation = operation
 
         return tran
@@ -5,27 +5,27 @@ This module provides transformers for different cryptocurrency exchanges.
 Each transformer knows how to read the exchange's export format and convert it
 to the standard pycgt CSV format.
 """
-from .bitstamp_transformer import BitstampTransformer
-from .independent_reserve_transformer import IndependentReserveTransformer
-from .nexo_transformer import NexoTransformer
-from .exodus_transformer import ExodusTransformer
+import heapq
+from operator import attrgetter
+from utils import import_object
+from .base_transformer import write_pycgt_file
 
-# Registry of available transformers
+# Registry of available transformers, each imported when first used
 TRANSFORMERS = {
-    'bitstamp': BitstampTransformer,
-    'independentreserve': IndependentReserveTransformer,
-    'nexo': NexoTransformer,
-    'exodus': ExodusTransformer,
+    'bitstamp': 'transformer.bitstamp_transformer:BitstampTransformer',
+    'independentreserve': 'transformer.independent_reserve_transformer:IndependentReserveTransformer',
+    'nexo': 'transformer.nexo_transformer:NexoTransformer',
+    'exodus': 'transformer.exodus_transformer:ExodusTransformer',
 }
 
-def get_transformer(exchange_type, input_files, output_file):
+def get_transformer(exchange_type, input_files, output_file=None):
     """
     Get transformer instance for the specified exchange
 
     Args:
         exchange_type: Name of the exchange (e.g., 'bitstamp')
         input_files: List of input CSV file paths
-        output_file: Output CSV file path
+        output_file: Output CSV file path, None to only return the transactions
 
     Returns:
         Transformer instance
@@ -39,5 +39,37 @@ def get_transformer(exchange_type, input_files, output_file):
         supported = ', '.join(TRANSFORMERS.keys())
         raise ValueError(f"Unsupported exchange type: {exchange_type}. Supported: {supported}")
 
-    transformer_class = TRANSFORMERS[exchange_type]
+    transformer_class = import_object(TRANSFORMERS[exchange_type])
     return transformer_class(input_files, output_file)
+
+
+def transform_exchange_logs(exchange_files, output_file=None):
+    """
+    Transform the logs of one or more exchanges into one list of transactions, in memory
+
+    Files of the same exchange are transformed together, by one transformer. Transactions at
+    the same datetime keep the order the exchanges are first given in.
+
+    Args:
+        exchange_files: List of (exchange_type, input_file) pairs
+        output_file: pycgt CSV file to also write all transactions to, None for no file
+
+    Returns:
+        List of Transaction objects of all exchanges, sorted by datetime
+
+    Raises:
+        ValueError: If an exchange type is not supported
+    """
+    files_by_exchange = {}
+    for exchange_type, input_file in exchange_files:
+        files_by_exchange.setdefault(exchange_type.lower(), []).append(input_file)
+
+    # fail on an unsupported exchange before transforming any
+    transformers = [get_transformer(exchange_type, input_files)
+                    for exchange_type, input_files in files_by_exchange.items()]
+    transactions = list(heapq.merge(*[transformer.transform() for transformer in transformers],
+                                    key=attrgetter('datetime')))
+
+    if output_file:
+        write_pycgt_file(output_file, transactions)
+    return transactions
@@ -1,9 +1,9 @@
 import csv
 from collections import defaultdict
 from logger import logger
-from shared_def import CRYPTOS, FIELDS
+from shared_def import CRYPTOS
 from .base_transformer import BaseTransformer
-from transaction import float_parser, datetime_parser
+from transaction import Transaction, float_parser
 
 
 class IndependentReserveTransformer(BaseTransformer):
@@ -44,7 +44,7 @@ class IndependentReserveTransformer(BaseTransformer):
                     if pycgt_transaction:
                         transactions.append(pycgt_transaction)
 
-        transactions.sort(key=lambda x: datetime_parser(x['Datetime']))
+        self.sort_by_datetime(transactions)
 
         self.autofill_locale_fiat_and_fees(transactions)
 
@@ -112,7 +112,7 @@ class IndependentReserveTransformer(BaseTransformer):
             group: List of related IR row dictionaries
 
         Returns:
-            Dictionary with pycgt field names, or None if group should be skipped
+            Transaction, or None if group should be skipped
         """
         if not group:
             return None
@@ -120,13 +120,13 @@ class IndependentReserveTransformer(BaseTransformer):
         # Analyze the group to determine transaction type
         types = [row['Type'] for row in group]
 
-        # Initialize pycgt transaction with default empty values
-        pycgt_row = {field: '' for field in FIELDS.keys()}
+        # Initialize pycgt transaction, all amounts zero
+        pycgt_row = Transaction()
 
         # Use the first row's date and settlement date
         first_row = group[0]
-        pycgt_row['Datetime'] = first_row['Date']
-        pycgt_row['Exchange'] = 'IndependentReserve'
+        pycgt_row.datetime = self.parse_datetime(first_row['Date'])
+        pycgt_row['exchange'] = 'IndependentReserve'
 
         # Handle different transaction type combinations
         if 'Trade' in types:
@@ -151,10 +151,10 @@ class IndependentReserveTransformer(BaseTransformer):
 
         Args:
             group: List of IR row dictionaries
-            pycgt_row: Partially filled pycgt transaction dictionary
+            pycgt_row: Partially filled Transaction
 
         Returns:
-            Complete pycgt transaction dictionary
+            Complete Transaction
         """
         trade_rows = [r for r in group if r['Type'] == 'Trade']
         brokerage_rows = [r for r in group if r['Type'] == 'Brokerage']
@@ -183,23 +183,26 @@ class IndependentReserveTransformer(BaseTransformer):
 
         credit_currency = credit_row['Currency'].upper()
         debit_currency = debit_row['Currency'].upper()
-        credit_amount = credit_row['Credit']
-        debit_amount = debit_row['Debit']
+        credit_amount = float_parser(credit_row['Credit'])
+        debit_amount = float_parser(debit_row['Debit'])
 
         credit_currency_lower = credit_currency.lower()
         debit_currency_lower = debit_currency.lower()
 
         buy_pair = f"{credit_currency}{debit_currency}".lower()
         sell_pair = f"{debit_currency}{credit_currency}".lower()
-    
-        pycgt_row[debit_currency] = debit_amount
-        pycgt_row[credit_currency] = credit_amount
+
+        # currencies with no pycgt column are left out, as they'd be left out of the CSV
+        if debit_currency_lower in pycgt_row:
+            pycgt_row[debit_currency_lower] = debit_amount
+        if credit_currency_lower in pycgt_row:
+            pycgt_row[credit_currency_lower] = credit_amount
         if credit_currency_lower in CRYPTOS:
-            pycgt_row['Pair'] = buy_pair
-            pycgt_row['Operation'] = 'buy'
+            pycgt_row.pair = buy_pair
+            pycgt_row.operation = 'buy'
         elif debit_currency_lower in CRYPTOS:
-            pycgt_row['Pair'] = sell_pair
-            pycgt_row['Operation'] = 'sell'
+            pycgt_row.pair = sell_pair
+            pycgt_row.operation = 'sell'
         else:
             logger.warning(f"Skipping transaction neither credit nor debit currency is crypto in Trade group: {credit_currency}, {debit_currency}")
             return None
@@ -214,17 +217,17 @@ class IndependentReserveTransformer(BaseTransformer):
 
         # Set fees in pycgt format
         for currency, fee_amount in total_fees.items():
-            fee_field = f"Fee({currency})"
+            fee_field = f"fee_{currency.lower()}"
             if fee_field in pycgt_row:
-                pycgt_row[fee_field] = str(fee_amount)
+                pycgt_row[fee_field] = fee_amount
 
         comments = group[0].get('Comment', '').strip()
-        pycgt_row['Comments'] = comments
+        pycgt_row['comments'] = comments
         order_guid = group[0].get('Order Guid', '').strip()
         if order_guid:
-            pycgt_row['Comments'] = f"{comments + ', ' if comments else ''}Order Guid: {order_guid}"
+            pycgt_row['comments'] = f"{comments + ', ' if comments else ''}Order Guid: {order_guid}"
 
-        pycgt_row['Type'] = 'Market'
+        pycgt_row['_type'] = 'Market'
         return pycgt_row
 
     def _convert_withdrawal_group(self, group, pycgt_row):
@@ -233,10 +236,10 @@ class IndependentReserveTransformer(BaseTransformer):
 
         Args:
             group: List of IR row dictionaries
-            pycgt_row: Partially filled pycgt transaction dictionary
+            pycgt_row: Partially filled Transaction
 
         Returns:
-            Complete pycgt transaction dictionary
+            Complete Transaction
         """        
         if len(group) != 2:
             raise ValueError(f"Expected 2 rows in Withdrawal group, found {len(group)}")
@@ -255,22 +258,19 @@ class IndependentReserveTransformer(BaseTransformer):
             else:
                 raise ValueError(f"Unexpected row type in Withdrawal group: {row_type}")
 
-        pycgt_row['Operation'] = 'withdrawal'
-        pycgt_row['Type'] = 'Withdrawal'
-
-        # Set withdrawal amount
-        debit_amount = withdrawal_row['Debit']
-        pycgt_row[currency] = debit_amount
+        pycgt_row.operation = 'withdrawal'
+        pycgt_row['_type'] = 'Withdrawal'
 
-        # Set withdrawal fee
-        fee_field = f"Fee({currency})"
-        pycgt_row[fee_field] = withdrawal_fee_row['Debit']
+        # Set withdrawal amount, and withdrawal fee
+        if currency.lower() in pycgt_row:
+            pycgt_row[currency.lower()] = float_parser(withdrawal_row['Debit'])
+            pycgt_row[f"fee_{currency.lower()}"] = float_parser(withdrawal_fee_row['Debit'])
 
         comments = group[0].get('Comment', '').strip()
-        pycgt_row['Comments'] = comments
+        pycgt_row['comments'] = comments
         blockchain_tx = withdrawal_row.get('BlockchainTransaction', '').strip()
         if blockchain_tx:
-            pycgt_row['Comments'] = f"{comments + ', ' if comments else ''}BlockchainTransaction: {blockchain_tx}"
+            pycgt_row['comments'] = f"{comments + ', ' if comments else ''}BlockchainTransaction: {blockchain_tx}"
 
         return pycgt_row
 
@@ -280,10 +280,10 @@ class IndependentReserveTransformer(BaseTransformer):
 
         Args:
             group: List of IR row dictionaries (should be a single row)
-            pycgt_row: Partially filled pycgt transaction dictionary
+            pycgt_row: Partially filled Transaction
 
         Returns:
-            Complete pycgt transaction dictionary
+            Complete Transaction
         """
         if len(group) != 1:
             raise ValueError(f"Expected 1 row, found {len(group)}")
@@ -294,14 +294,15 @@ class IndependentReserveTransformer(BaseTransformer):
 
         currency = single_row['Currency'].upper()
 
-        pycgt_row['Operation'] = single_row['Type'].lower()
-        pycgt_row['Type'] = single_row['Type']
-        pycgt_row[currency] = single_row['Credit']
+        pycgt_row.operation = single_row['Type'].lower()
+        pycgt_row['_type'] = single_row['Type']
+        if currency.lower() in pycgt_row:
+            pycgt_row[currency.lower()] = float_parser(single_row['Credit'])
 
         comments = single_row.get('Comment', '').strip()
-        pycgt_row['Comments'] = comments
+        pycgt_row['comments'] = comments
         blockchain_tx = single_row.get('BlockchainTransaction', '').strip()
         if blockchain_tx:
-            pycgt_row['Comments'] = f"{comments + ', ' if comments else ''}BlockchainTransaction: {blockchain_tx}"
+            pycgt_row['comments'] = f"{comments + ', ' if comments else ''}BlockchainTransaction: {blockchain_tx}"
 
         return pycgt_row
@@ -1,8 +1,8 @@
 import csv
 from logger import logger
-from shared_def import CRYPTOS, FIATS, FIELDS
+from shared_def import CRYPTOS, FIATS
 from .base_transformer import BaseTransformer
-from transaction import float_parser, datetime_parser
+from transaction import Transaction, float_parser
 
 
 class NexoTransformer(BaseTransformer):
@@ -30,7 +30,7 @@ class NexoTransformer(BaseTransformer):
                         else:
                             transactions.append(pycgt_transactions)
 
-        transactions.sort(key=lambda x: datetime_parser(x['Datetime']))
+        self.sort_by_datetime(transactions)
 
         self.autofill_locale_fiat_and_fees(transactions)
 
@@ -49,13 +49,13 @@ class NexoTransformer(BaseTransformer):
             row: Dictionary representing a Nexo CSV row
 
         Returns:
-            Dictionary with pycgt field names, list of dictionaries for Interest type,
+            Transaction, list of Transactions for Interest type,
             or None if row should be skipped
         """
         transaction_type = row['Type']
         transaction_id = row['Transaction']
         details = row['Details']
-        datetime = row['Date / Time (UTC)']
+        datetime = self.parse_datetime(row['Date / Time (UTC)'])
 
         input_currency_upper = row['Input Currency'].upper()
         output_currency_upper = row['Output Currency'].upper()
@@ -82,14 +82,14 @@ class NexoTransformer(BaseTransformer):
                 datetime, output_currency_upper, output_amount, usd_equivalent, comments, transactions
             )
 
-        # Initialize pycgt transaction with default empty values from FIELDS
-        pycgt_row = {field: '' for field in FIELDS.keys()}
+        # Initialize pycgt transaction, all amounts zero
+        pycgt_row = Transaction()
 
         # Set basic transaction info
-        pycgt_row['Type'] = transaction_type
-        pycgt_row['Exchange'] = 'Nexo'
-        pycgt_row['Datetime'] = datetime
-        pycgt_row['Comments'] = comments
+        pycgt_row['_type'] = transaction_type
+        pycgt_row['exchange'] = 'Nexo'
+        pycgt_row.datetime = datetime
+        pycgt_row['comments'] = comments
 
         # Handle Top up Crypto (deposits)
         if transaction_type == 'Top up Crypto' or transaction_type == 'Withdrawal':
@@ -97,13 +97,13 @@ class NexoTransformer(BaseTransformer):
                 'Top up Crypto': 'deposit',
                 'Withdrawal': 'withdrawal'
             }
-            pycgt_row['Operation'] = _operationMap[transaction_type]
-            pycgt_row[output_currency_upper] = output_amount
+            pycgt_row.operation = _operationMap[transaction_type]
+            pycgt_row[output_currency_lower] = float_parser(output_amount)
             # Set fee
             if fee and fee != '-' and fee_currency:
-                fee_field = f"Fee({fee_currency})"
+                fee_field = f"fee_{fee_currency.lower()}"
                 if fee_field in pycgt_row:
-                    pycgt_row[fee_field] = fee
+                    pycgt_row[fee_field] = float_parser(fee)
 
         # Skip Locking/Unlocking Term Deposit (internal transfers)
         elif transaction_type in ['Locking Term Deposit', 'Unlocking Term Deposit']:
@@ -138,12 +138,11 @@ class NexoTransformer(BaseTransformer):
         if float_amount <= 0:
             raise ValueError(f"Interest amount must be greater than zero: {comments}")       
         float_usd = float_parser(usd_equivalent)
+        rate_pair = f"{currency.lower()}usd"
         if float_usd <= 0:
             currencyusdrate = 0
             for tran in reversed(transactions):
-                pair = f"{currency}USD"
-                rate_str = tran.get(pair, '')
-                rate = float_parser(rate_str)
+                rate = tran[rate_pair] if rate_pair in tran else 0
                 if rate > 0:
                     currencyusdrate = rate
                     break
@@ -152,33 +151,33 @@ class NexoTransformer(BaseTransformer):
             float_usd = float_amount * currencyusdrate
 
         price_per_unit = float_usd / float_amount
-        rate_pair = f"{currency}USD"
-        usd_value_str = str(float_usd)
 
         # Log 1: "gain" operation for taxable income
-        gain_log = {field: '' for field in FIELDS.keys()}
-        gain_log['Operation'] = 'gain'
-        gain_log['Exchange'] = 'Nexo'
-        gain_log['Datetime'] = datetime
-        gain_log['Type'] = 'Interest'
-        gain_log['Comments'] = f"{comments} [GAIN]"
-        gain_log[currency] = amount
-        gain_log['USD'] = usd_value_str
-        gain_log[rate_pair] = str(price_per_unit)
+        gain_log = Transaction()
+        gain_log.operation = 'gain'
+        gain_log['exchange'] = 'Nexo'
+        gain_log.datetime = datetime
+        gain_log['_type'] = 'Interest'
+        gain_log['comments'] = f"{comments} [GAIN]"
+        gain_log[currency.lower()] = float_amount
+        gain_log['usd'] = float_usd
+        if rate_pair in gain_log:
+            gain_log[rate_pair] = price_per_unit
 
         logs.append(gain_log)
 
         # Log 2: "buy" operation to establish cost base
-        buy_log = {field: '' for field in FIELDS.keys()}
-        buy_log['Operation'] = 'buy'
-        buy_log['Exchange'] = 'Nexo'
-        buy_log['Datetime'] = datetime
-        buy_log['Type'] = 'Interest'
-        buy_log['Pair'] = f"{currency.lower()}usd"
-        buy_log['Comments'] = f"{comments} [BUY]"
-        buy_log[currency] = amount
-        buy_log['USD'] = usd_value_str
-        buy_log[rate_pair] = str(price_per_unit)
+        buy_log = Transaction()
+        buy_log.operation = 'buy'
+        buy_log['exchange'] = 'Nexo'
+        buy_log.datetime = datetime
+        buy_log['_type'] = 'Interest'
+        buy_log.pair = rate_pair
+        buy_log['comments'] = f"{comments} [BUY]"
+        buy_log[currency.lower()] = float_amount
+        buy_log['usd'] = float_usd
+        if rate_pair in buy_log:
+            buy_log[rate_pair] = price_per_unit
 
         logs.append(buy_log)
 
@@ -1,6 +1,16 @@
 import os
 import random
 import string
+import importlib
+
+def import_object(path):
+  """Object at path, 'package.module:Name', importing its module on first use
+
+  Registries keep such paths rather than the objects, so a module and its dependencies
+  are only loaded once something registered in it is actually used.
+  """
+  module_name, _, name = path.partition(':')
+  return getattr(importlib.import_module(module_name), name)
 
 def generate_default_output_filename(input_file):
   """Generate default output filename from input filename